@@ -3,20 +3,45 @@ import socket as s
 import time
 import threading
 import configparser
+import uuid
+from collections import namedtuple
 from datetime import timedelta, datetime as dt
 from helpers import * 
 from led_sign_client import LEDSignClient
 from intercom_client import IntercomClient
+from sign_writer import *
+from display_timeline import DisplayTimeline, TimelineEntry
+from scheduler import default_scheduler, SchedulerFull
 import dcs_data_pb2
 from globals import *
 
+# Current display as sent to clients. 'content' is the encoded drum states for
+# the drums display, otherwise the encoded message. 'version' is incremented 
+# every time the code or content changes.
+DisplaySnapshot = namedtuple('DisplaySnapshot', ['version', 'code', 'content'])
+
+# Versions restart at 0 with the process. Clients keep the last version they
+# were sent across server restarts, so versions are sent prefixed with an id
+# unique to this run.
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def wire_version(snapshot):
+    """Returns snapshot version as sent to clients, '<boot id>.<version>'"""
+    return f'{BOOT_ID}.{snapshot.version}'
+
+# 'timers' (all active timers of a drum) is not in older dcs_data.proto
+# schemas, State then only carries the displayed timer
+HAS_TIMERS = 'timers' in dcs_data_pb2.State.DESCRIPTOR.fields_by_name
+
+
 class Annunciator:
 
     def __init__(self):
         self.bootup = True
         self.current_display = 0
         self.current_msg = "" 
-        self.wait_id = 0
+        self.msg_expiry = None      # TimerHandle of custom message expiry
         self.dcs_down_msg = 'Drum cut cycle stages unknown. ' \
                                 'Link to DCS server down.'
 
@@ -28,7 +53,15 @@ class Annunciator:
         }
 
         self._init_drum_states()
+        self.snapshot_lock = threading.Lock()   # used to publish 'snapshot'
+        self.snapshot = DisplaySnapshot(0, self.current_display, 
+                                        self._get_drums_content_msg())
+        self.subscribers = []   # called with each new snapshot
         self._init_config()
+        self.sign = None
+        self.writer = SignWriter()
+        self.scheduler = default_scheduler()
+        self.timeline = DisplayTimeline(self._revert_display, self.scheduler)
 
         LOGGER.info("Starting IntercomClient...")
         self.intercom = IntercomClient(self.ts_host, self.ts_port, 
@@ -69,16 +102,73 @@ class Annunciator:
         for _ in range(6):
             t = dcs_data_pb2.Timer()
             t.type = NO_TIMER
-            self.drum_states.append({'stage': UNSET_STAGE, 'timer': t})
+            # 'timer' is the displayed timer, 'timers' all active timers
+            self.drum_states.append({'stage': UNSET_STAGE, 'timer': t, 
+                                     'timers': []})
             t = None
 
+    def _get_drums_content_msg(self):
+        """Create encoded message containing drum stages to be sent over 
+        socket."""
+        msg = ""
+        for drum in self.drum_states:
+            if drum['timer'].type != NO_TIMER:
+                msg = msg + str(drum['timer'].type) + \
+                    ','+ str(drum['timer'].start) + \
+                    ',' + str(drum['timer'].duration) + \
+                    ',' + str(drum['timer'].details) + '_'
+            else:
+                msg = msg + str(drum['stage']) + '_'
+
+        return msg[:-1].encode()
+
+    def _publish(self):
+        """Replaces 'snapshot' with the current display and drum states. Must
+        be called whenever current_display, current_msg or drum_states change.
+        Readers take 'snapshot' without locking, it is never modified.
+
+        Subscribers are called with the new snapshot, in version order, while
+        the lock is held so must not block."""
+        with self.snapshot_lock:
+            code = self.current_display
+            if code == DRUMS_DISPLAY:
+                content = self._get_drums_content_msg()
+            else:
+                content = self.current_msg.encode()
+
+            old = self.snapshot
+            if old.code == code and old.content == content:
+                return
+
+            self.snapshot = DisplaySnapshot(old.version + 1, code, content)
+            for callback in self.subscribers:
+                try:
+                    callback(self.snapshot)
+                except Exception as exc:
+                    LOGGER.error(f'Error in snapshot subscriber - {exc}')
+
+    def subscribe(self, callback):
+        """Calls callback(snapshot) every time a new snapshot is published.
+
+        :return: the current snapshot
+        """
+        with self.snapshot_lock:
+            self.subscribers.append(callback)
+            return self.snapshot
+
+    def unsubscribe(self, callback):
+        with self.snapshot_lock:
+            self.subscribers.remove(callback)
+
     def _init_sign(self):
+        """Creates the LEDSignClient on the sign writer thread, which owns the
+        serial port from then on."""
         LOGGER.info("Starting LEDSignClient...")
-        self.sign = None
         while not exit.is_set():
             try:
-                self.sign = LEDSignClient(self.serial_port, self.sign_addr, 
-                                            self.max_send_attempts)
+                self.sign = self.writer.submit(ALERT_PRIORITY, LEDSignClient, 
+                    self.serial_port, self.sign_addr, 
+                    self.max_send_attempts).result()
                 break
 
             except SignError:
@@ -94,22 +184,39 @@ class Annunciator:
         ''' Turns off alarm flags and unsures that all drum cut cycle stages 
         are unset on sign.
         Assumed that drum['timers'] is always a Timer message and never None
+
+        :raises SignError: if LED sign is unreachable
         '''
         self.alarms['H2S'] = False
         self.alarms['LEL'] =  False
         self.alarms['FIRE'] = False
 
-        self.sign.get_sign_lease()
+        self.writer.submit(NOTIFY_PRIORITY, self._write_reset).result()
 
-        for t in self.sign.active_timers:
-            self.sign.clear_timer(t)
-            
-        for idx, drum in enumerate(self.drum_states):
-            drum['stage'] = UNSET_STAGE
-            drum['timer'].type = NO_TIMER
-            self.sign.update_drum_state(idx, get_stage_bmp(UNSET_STAGE))
-            
-        self.sign.return_sign_lease()
+    def _write_reset(self):
+        """Unsets all drum stages on the sign in one batch. 
+        Runs on the sign writer thread."""
+        try:
+            self.sign.start_batch()
+            for idx, drum in enumerate(self.drum_states):
+                drum['stage'] = UNSET_STAGE
+                drum['timer'].type = NO_TIMER
+                drum['timers'] = []
+                self.sign.set_stage(idx, UNSET_STAGE)
+            self.sign.send_batch()
+        finally:
+            self.sign.discard_batch()
+            self._publish()
+
+    def _get_priority(self, code):
+        """Returns sign writer priority of display code"""
+        if code == ALERT_DISPLAY:
+            return ALERT_PRIORITY
+        if code in [NOTIFY_DISPLAY, ERROR_DISPLAY]:
+            return NOTIFY_PRIORITY
+        if code == DRUMS_DISPLAY:
+            return DRUMS_PRIORITY
+        return MSG_PRIORITY
 
     def _has_priority(self, display):
         """Checks if a display type has priority over the current display type
@@ -146,13 +253,9 @@ class Annunciator:
             self._set_display('alert', msg=txt)     
             self.intercom.play_alert(self.current_msg)
 
-        except SignLeaseError:
-            LOGGER.warning('Sign Lease Error in display_alert()')
         except SignError:
             raise SignError()
         except Exception as exc:
-            # since not SignLeaseError can assume lease was not returned
-            self.sign.return_sign_lease()
             LOGGER.error(f'Error in _turn_on_alert - {exc}')             
 
     def _turn_off_alert(self):
@@ -166,7 +269,7 @@ class Annunciator:
                 break
 
             except SignLeaseError:
-                continue    
+                break   # preempted by a new alert
             except SignError:
                 LOGGER.error('Unable to stop displaying alert on sign.')
                 raise SignError()
@@ -174,9 +277,9 @@ class Annunciator:
                 LOGGER.error(f'Unable to stop displaying alert on sign. {exc}')
                 self.power_cycle()  # ensure false alarm does not play
                 
-    def _set_timer_state(self, new_timer, drum):
-        """Updates drum state if timer type has changed. This means either 
-        clearing expired timer from display or
+    def _set_timer_state(self, new_timer, drum, dur):
+        """Records the new timer of a drum and announces it on the intercom.
+        Called once the sign has accepted the timer variable file.
 
         If timer type is NO_TIMER, the data in the rest of the feilds are 
         garbage.
@@ -185,80 +288,99 @@ class Annunciator:
 
         :param new_timer: Timer msg holding current timer data of drum from DCS
         :param drum: drum position in lists
-        :returns: True if active timer, False otherwise.
+        :param dur: timedelta of time left on timer
         """
-        if self.drum_states[drum]['timer'].type != new_timer.type:
+        LOGGER.info(f'{drum_code_to_str(drum)} timer set')      
 
-            dur = timedelta(minutes=new_timer.duration) - (dt.now() - 
-                dt.strptime(new_timer.start, "%Y-%m-%dT%H:%M:%S"))
-            
-            self.sign.set_iso_timer(new_timer.type, drum, dur, new_timer.details)
-            LOGGER.info(f'{drum_code_to_str(drum)} timer set')      
+        time.sleep(.5)  # allow time for other threads to run
+        self.drum_states[drum]['timer'].CopyFrom(new_timer)
+        self.intercom.announce_timer(drum, dur, 
+                                     new_timer.type, new_timer.details)
 
-            time.sleep(.5)  # allow time for other threads to run
-            self.drum_states[drum]['timer'].CopyFrom(new_timer)
-            self.intercom.announce_timer(drum, dur, 
-                                         new_timer.type, new_timer.details)
+    def _set_timers_state(self, new_timers, drum):
+        """Records all active timers of a drum and announces the timers that
+        started since the last update but are not displayed on the sign. The 
+        displayed timer is announced by _set_timer_state().
+
+        :param new_timers: repeated Timer msg of drum from DCS, displayed 
+            timer first
+        :param drum: drum position in lists
+        """
+        old = {(timer.type, timer.start) 
+               for timer in self.drum_states[drum]['timers']}
+        timers = []
+        for idx, new_timer in enumerate(new_timers):
+            timer = dcs_data_pb2.Timer()
+            timer.CopyFrom(new_timer)
+            timers.append(timer)
+
+            if idx > 0 and (timer.type, timer.start) not in old:
+                self.intercom.announce_timer(
+                    drum, self._get_timer_remaining(timer), 
+                    timer.type, timer.details)
+
+        self.drum_states[drum]['timers'] = timers
         
     def _set_stage_state(self, new_stage, drum):
-        """
+        """Records the new stage of a drum, announces it and updates the drum 
+        light on the intercom. Called once the sign has accepted the stage 
+        variable file.
+
         If self.bootup is true, or the new stage is unset, stage change will 
         not be announced. 
         """
-        if self.drum_states[drum]['stage'] != new_stage:
-            
-            self.sign.set_stage(drum, new_stage)
-            drum_name = drum_code_to_str(drum)
+        drum_name = drum_code_to_str(drum)
 
-            if (self.drum_states[drum]['stage'] != UNSET_STAGE and 
-                self.current_display == DRUMS_DISPLAY and
-                not self.bootup):
+        if (self.drum_states[drum]['stage'] != new_stage and
+            self.drum_states[drum]['stage'] != UNSET_STAGE and 
+            self.current_display == DRUMS_DISPLAY and
+            not self.bootup):
 
-                self.intercom.announce_stage(drum_name, new_stage)
+            self.intercom.announce_stage(drum_name, new_stage)
 
-            time.sleep(.5)  # allow time for other threads to run
-            LOGGER.info(f'{drum_name} now in {get_stage_name(new_stage)}'
-                        f' ({new_stage})')
-                    
-            self.drum_states[drum]['stage'] = new_stage
-            self.intercom.update_light(drum, new_stage)
+        time.sleep(.5)  # allow time for other threads to run
+        LOGGER.info(f'{drum_name} now in {get_stage_name(new_stage)}'
+                    f' ({new_stage})')
+                
+        self.drum_states[drum]['stage'] = new_stage
+        self.intercom.update_light(drum, new_stage)
  
     def _set_display(self, display, msg=""):
-        """Changes the current sign display. A sign lease is needed to call 
-        self.sign.set_display()
+        """Changes the current sign display. The change is submitted to the 
+        sign writer with the priority of the display and this method waits 
+        for it to complete.
 
         :param display: interger or string representing a sign display type
         :param msg: variable file content needed for message display types
         :raises SignError: if LED sign is unreachable
-        :raises SignLeaseError: if unable to acquire sign lease to set display
+        :raises SignLeaseError: if display change was preempted by an alert
         """
-
-        def do_script_update(new: int):
-            """Checks if a different script file needs to be played.
-
-            :param new: sign display code of new display
-            :return: False if 'new' is the same as the current display, 
-                otherwise True. 
-            """
-            if new == self.current_display:
-                return False
-            return True
-
-        #----------------------------------------------------------------------
-
-        self.sign.get_sign_lease()      
         code = get_display_code(display)
+        self.writer.submit(self._get_priority(code), self._write_display, 
+                           code, msg, is_display=True).result()
+
+    def _write_display(self, code, msg):
+        """Sets sign display, a different script is only played if the display
+        has changed. Runs on the sign writer thread.
 
+        :param code: sign display code of new display
+        :param msg: variable file content needed for message display types
+        :raises SignError: if LED sign is unreachable
+        """
         self.current_msg = self.sign.set_display(code, msg=msg, 
-            decks=self.alarms['deck'], update_script=do_script_update(code))                           
+            decks=self.alarms['deck'], 
+            update_script=code != self.current_display)                           
 
         self.current_display = code
-        self.sign.return_sign_lease()
+        self._publish()
 
     def stop(self):
         LOGGER.info('Exiting annunciator server.')
+        self.scheduler.stop()
+        self.writer.stop()
         if self.sign is not None:
             self.sign.reset_sign()
+            self.sign.close()
         if self.intercom is not None:
             self.intercom.stop()
 
@@ -274,82 +396,14 @@ class Annunciator:
         :param msg_type: message display type code as string 
         :param duration: time to display message in seconds
         :param msg: message text to be displayed
-        :raises SignLeaseError: if unable to acquire sign lease to set display
+        :raises SignLeaseError: if display change was preempted by an alert
 
         If a notification is being displayed, will wait for it to finish before 
         displaying custom message. 
         Allows display to change to notifications received by DCS. If notification
-        is playing when the end of the message duration is reached, will wait for 
-        the notification to end before changing it to drums.  
+        is playing when the end of the message duration is reached, the 
+        notification will revert to drums instead of the message.  
         """
-        def check_wait_id_reset():
-            """Checks if wait ids needs to be reset, and resets as needed"""
-            if self.wait_id == 30:
-                self.wait_id = 0
-
-        def wait_thread(dur, wid):
-            """ Sleeps/waits for 'dur' amount of time. If wait has NOT been 
-            canceled by the end of the wait, resets display to drums.
-
-            NOTE: We do not need to recover from not being able to obtain a 
-            sign lease to change the display. This is because it means that the 
-            display is being changed thus also canceling the wait.
-
-            :param duration: total time to sleep in seconds
-            :param wid: id of wait thread
-            :raises SignError: if LED sign unreachable
-
-            Wait is cancelled when...
-                CASE 1: display is changed to a different custom message before 
-            the end of its wait time is reached and 'self.wait_id' will NOT 
-            equal 'wid'.
-                CASE 2: display is changed to drums or alert before the 
-            end of its wait time is reached and the current display code will
-            not be 1, 2 or 3. 
-
-            *** Notify (display code 4) reverts to the previous display after
-            10 seconds. If a custom message was playing before the notification, 
-            once the notification is done it will set the display back to the custom 
-            message even if the message wait time was reached while the notification 
-            was playing. Therefore if the display code is 5 at the end of the 
-            wait time we need to wait until it is no longer 5.
-            """
-            try:
-                LOGGER.debug('wait time: ' + str(dur))
-                r = int(dur / 20)
-                for i in range(r):
-                    LOGGER.debug(f'{dur -(i * 20)} secs remaining, id: {wid}')
-
-                    for _ in range(4):  # 4 * 5 = 20
-                        # check if wait cancelled
-                        if (exit.is_set() or 
-                            wid != self.wait_id or 
-                            self.current_display not in [1, 2, 3, 5]):
-                            LOGGER.info('wait canceled: ' + str(id))
-                            return
-                        exit.wait(5)
-
-                # wait for notification to stop playing
-                while self.current_display == NOTIFY_DISPLAY:
-                    time.sleep(2)
-
-                # Check wait was not canceled (CASE 1 and CASE 2)  
-                if (wid == self.wait_id and 
-                    self.current_display in [1, 2, 3]):  # info, danger, warning
-                    try:
-                        self._set_display('drums')  
-                    except SignError:
-                        LOGGER.warning('Sign Error in custom msg wait')
-                    except SignLeaseError:
-                        LOGGER.warning('Sign Lease Error in custom msg wait')
-                
-                else:   # custom message canceled, don't reset display 
-                    LOGGER.info('wait canceled: ' + str(id))
-
-            except Exception as exc:
-                LOGGER.warning(f'Error in wait_thread - {exc}')
-
-        #----------------------------------------------------------------------
         LOGGER.debug(f'dur {duration}, msg_type: {msg_type}, msg: {msg}')
         if self._has_priority(msg_type):
             display_code = int(msg_type)
@@ -362,23 +416,75 @@ class Annunciator:
                 return
             
             LOGGER.info('Displaying custom message...')
+            try:
+                expiry = self.scheduler.call_later(duration, 
+                                                   self._expire_custom_msg)
+            except SchedulerFull as exc:
+                LOGGER.error(f'Unable to schedule custom msg expiry - {exc}')
+                return False
+
             try:
                 self._set_display(display_code, msg) 
-                exit.wait(.5)  # allow time for other threads to run
-
-                # start wait
-                check_wait_id_reset()
-                self.wait_id = self.wait_id + 1
-                tr = threading.Thread(target=wait_thread, 
-                                      args=(duration, self.wait_id))
-                tr.start()
+
+                # replaces expiry of previous message
+                if self.msg_expiry is not None:
+                    self.msg_expiry.cancel()
+                self.msg_expiry = expiry
+
                 self.intercom.announce_message(msg_type, msg)
                 return True
 
             except SignError:
                 LOGGER.info('Sign error in display_custom_msg()')
+                expiry.cancel()
+            except SignLeaseError:
+                expiry.cancel()
+                raise
         return False
 
+    def _expire_custom_msg(self):
+        """Called by the scheduler at the end of a custom message's duration. 
+
+        NOTE: We do not need to recover from the display change being 
+        preempted. This is because it means that an alert is being 
+        displayed thus also canceling the message.
+        """
+        LOGGER.debug('Custom message duration reached')
+        self.writer.submit(MSG_PRIORITY, self._write_custom_msg_expired, 
+                           is_display=True).add_done_callback(
+            lambda f: self._log_display_result(f, 'custom msg expiry'))
+
+    def _write_custom_msg_expired(self):
+        """Changes display to drums if the custom message is still displayed. 
+        Runs on the sign writer thread.
+
+        The expiry is cancelled when a new custom message is displayed, and 
+        the display code will not be 1, 2 or 3 if the display was changed to 
+        drums or alert before the end of the duration.
+
+        *** Notify reverts to the previous display after its display time. If
+        the message is waiting to be reverted to, the notification will revert
+        to drums instead.
+        """
+        if self.current_display in [1, 2, 3]:  # danger, warning, info
+            self._write_display(DRUMS_DISPLAY, '')
+
+        elif self.current_display == NOTIFY_DISPLAY:
+            entry = self.timeline.pending()
+            if entry is not None and entry.revert_code in [1, 2, 3]:
+                self.timeline.set_revert(DRUMS_DISPLAY)
+
+    def _log_display_result(self, future, name):
+        """Done callback of display changes that are not waited on."""
+        try:
+            future.result()
+        except SignLeaseError:
+            LOGGER.warning(f'Preempted by alert in {name}')
+        except SignError:
+            LOGGER.warning(f'Sign Error in {name}')
+        except Exception as exc:
+            LOGGER.error(f'Error in {name} - {exc}')
+
     def check_alarms(self, alarms):
         ''' Creates formated string of active alarm. If no active alarms 
         and alert is being displayed, changes display to drums. 
@@ -421,9 +527,11 @@ class Annunciator:
         return True
 
     def display_notify(self, notify):
-        """Displays notification for a short period of time, then reverts 
-        display when done. Assumed that self.current_display at time fuction 
-        is called is not 'alert'. Thus will never revert to an alert display.
+        """Displays notification for a short period of time. The display 
+        timeline reverts the display when done, so this returns as soon as the
+        notification is on the sign. Assumed that self.current_display at time
+        fuction is called is not 'alert'. Thus will never revert to an alert 
+        display.
 
         If prev_display is ERROR_DISPLAY then the DCS link is not 
         responding. If a notification is recevied then the DCS link has started 
@@ -431,35 +539,61 @@ class Annunciator:
         Before the ERROR_DISPLAY was set the stages were unset so it is 
         safe to revert to DRUMS_DISPLAY.
 
+        If a notification is already being displayed, the new one replaces it
+        and reverts to the display the first one would have reverted to.
+
         :param notify_code: dcs_data_pb2 Notification message
         :raises SignError: if LED sign is unreachable
-        :raises SignLeaseError: if unable to acquire sign lease to set 
-            display
         """
         prev_msg = self.current_msg
         prev_display = self.current_display
 
+        entry = self.timeline.pending()
+        if prev_display == NOTIFY_DISPLAY and entry is not None:
+            prev_display, prev_msg = entry.revert_code, entry.revert_msg
+
+        if prev_display in [DRUMS_DISPLAY, ERROR_DISPLAY]:   
+            prev_display, prev_msg = DRUMS_DISPLAY, ''
+
         try:
             self._set_display('notify', notify.sign_msg)
-            time.sleep(.5)  # allow time for other threads to run
-            self.intercom.announce_message('notify', notify.ts_msg)
 
             # revert after 'display_time' seconds
-            time.sleep(notify.display_time)
-            
-            if prev_display in [DRUMS_DISPLAY, ERROR_DISPLAY]:   
-                self._set_display(DRUMS_DISPLAY)
-            else:
-                self._set_display(prev_display, prev_msg)
+            try:
+                self.timeline.show(NOTIFY_DISPLAY, notify.display_time, 
+                                   prev_display, prev_msg)
+            except SchedulerFull as exc:
+                # can't revert later, don't leave notification on the sign
+                LOGGER.error(f'Unable to time notification - {exc}')
+                self._revert_display(TimelineEntry(
+                    NOTIFY_DISPLAY, time.monotonic(), prev_display, prev_msg))
+                return
+
+            self.intercom.announce_message('notify', notify.ts_msg)
 
         except SignLeaseError:
-            LOGGER.warning('Sign Lease Error in display_notify()')
+            LOGGER.warning('Preempted by alert in display_notify()')
         except SignError:
             raise SignError()
         except Exception as exc:
-            # since not SignLeaseError can assume lease was not returned
-            self.sign.return_sign_lease()
             LOGGER.error(f'Error in display_notify - {exc}')
+
+    def _revert_display(self, entry):
+        """Called by the display timeline when a timed display is done.
+
+        :param entry: expired TimelineEntry
+        """
+        self.writer.submit(self._get_priority(entry.revert_code), 
+                           self._write_revert, entry, 
+                           is_display=True).add_done_callback(
+            lambda f: self._log_display_result(f, 'display revert'))
+
+    def _write_revert(self, entry):
+        """Reverts the sign to the entry's revert display, only if the entry's
+        display is still on the sign, e.g. not replaced by an alert. 
+        Runs on the sign writer thread."""
+        if self.current_display == entry.code:
+            self._write_display(entry.revert_code, entry.revert_msg)
            
     def display_drums(self, override=False):
         try:
@@ -471,12 +605,10 @@ class Annunciator:
                 self._set_display('drums') 
 
         except SignLeaseError:
-            LOGGER.warning('Sign Lease Error in display_drums()')
+            LOGGER.warning('Preempted by alert in display_drums()')
         except SignError:
             raise SignError()
         except Exception as exc:
-            # since not SignLeaseError can assume lease was not returned
-            self.sign.return_sign_lease()
             LOGGER.error(f'Error in display_drums - {exc}')
 
     def display_dcs_down(self):
@@ -484,8 +616,8 @@ class Annunciator:
         displayed.
 
         Does NOT allow _set_display() to throw SignError because there is 
-        try block in dcs_update to handle it. Returns sign lease and leaves
-        SignError to be thrown by different method.
+        try block in dcs_update to handle it. Leaves SignError to be thrown by
+        different method.
 
         _has_priority() will return false if already playing 'error'
         """
@@ -496,23 +628,26 @@ class Annunciator:
                 self._reset()
 
             except SignLeaseError:
-                LOGGER.warning('Sign Lease error in display_dcs_down()')
+                LOGGER.warning('Preempted by alert in display_dcs_down()')
 
             except Exception as exc:
-                # since not SignLeaseError can assume lease was not returned
-                self.sign.return_sign_lease()
-                LOGGER.error(f'Error in display_notify - {exc}')
+                LOGGER.error(f'Error in display_dcs_down - {exc}')
 
     def update_drum_states(self, drums):
         """Updates the current drum state by changing states displayed on 
         sign, saved values in self.drum_statess and the intercom box lights.
 
         Timers have priority over cycle stages. This means that the crum 
-        cycle stage will only be displayed if there is no active timer.
+        cycle stage will only be displayed if there is no active timer. A 
+        drum can have several active timers, only the one in state.timer is 
+        displayed, all of them are recorded in drum_states[drum]['timers']. 
+        If the schema has no State.timers only the displayed timer is 
+        recorded, see HAS_TIMERS. A timer type the sign has no display for is 
+        recorded but the drum's stage stays on the sign.
 
-        A sign lease is acquired for duration of for loop even though it is 
-        only needed to call self.sign.update_drum_state().
-        This is to ensure update is not interupted then unable to complete.
+        All changed drum variable files are sent to the sign in one batch by 
+        the sign writer. Only drums whose update was accepted by the sign are 
+        recorded and announced, the rest are retried on the next update.
 
         :param stages: DrumStages message from dcs_data_pb2
         :raises SignError: if LED sign is unreachable
@@ -520,26 +655,91 @@ class Annunciator:
         new_state = [ drums.D1A, drums.D1B, drums.D2A, 
                       drums.D2B, drums.D3A, drums.D3B ]
         try:    
-            self.sign.get_sign_lease()       
-            for drum, state in enumerate(new_state): 
-                # if no active timer set stage
-                if state.timer.type == NO_TIMER:
+            changed, results = self.writer.submit(DRUMS_PRIORITY, 
+                self._write_drum_states, new_state).result()
+
+            for drum, state, dur in changed:
+                if not results.get(get_drum_state_file(drum)):
+                    continue
+
+                if dur is None:
                     self.drum_states[drum]['timer'].CopyFrom(state.timer)
-                    self._set_stage_state(state.stage, drum) 
+                    self._set_stage_state(state.stage, drum)
                 else:
-                    self._set_timer_state(state.timer, drum)
+                    self._set_timer_state(state.timer, drum, dur)
+
+            for drum, state in enumerate(new_state):
+                try:
+                    self._set_timers_state(self._get_state_timers(state), 
+                                           drum)
+                except Exception as exc:
+                    LOGGER.error(f'Error recording timers of drum {drum} '
+                                 f'- {exc}')
 
             self.bootup = False
-            self.sign.return_sign_lease()
+            self._publish()
         
-        except SignLeaseError:
-            LOGGER.warning('Sign lease error in update_drum_states')
         except SignError:
             raise SignError()       
         except Exception as exc:
-            # since not SignLeaseError can assume lease was not returned
-            self.sign.return_sign_lease()
-            LOGGER.error(f'Error in display_notify - {exc}')
+            LOGGER.error(f'Error in update_drum_states - {exc}')
+
+    def _get_state_timers(self, state):
+        """Returns list of all active timers of State msg, displayed timer 
+        first"""
+        if HAS_TIMERS:
+            return state.timers
+        return [state.timer] if state.timer.type != NO_TIMER else []
+
+    def _get_timer_remaining(self, timer):
+        """Returns timedelta of time left on timer, never negative.
+
+        Timer start is an ISO format datetime, with or without milliseconds.
+        """
+        end = dt.fromisoformat(timer.start).timestamp() + timer.duration * 60
+        return timedelta(seconds=max(0.0, end - time.time()))
+
+    def _write_drum_states(self, new_state):
+        """Sends the stages and timers of drums that have changed to the sign
+        in one batch. Runs on the sign writer thread.
+
+        :param new_state: list of dcs_data_pb2 State messages, one per drum
+        :return: tuple of list of changed drums as (drum, new state, timer 
+            duration or None) and dictionary of sign results per variable file
+        :raises SignError: if LED sign is unreachable
+        """
+        changed = []
+        try:
+            self.sign.start_batch()
+            for drum, state in enumerate(new_state): 
+                old = self.drum_states[drum]
+                new_timer = self._get_sign_timer(state.timer)
+                old_timer = self._get_sign_timer(old['timer'])
+
+                # if no active timer the sign can show set stage
+                if new_timer is None:
+                    if old['stage'] != state.stage or old_timer is not None:
+                        self.sign.set_stage(drum, state.stage)
+                        changed.append((drum, state, None))
+
+                elif old_timer != new_timer:
+                    dur = self._get_timer_remaining(state.timer)
+                    self.sign.set_timer(state.timer.type, drum, dur, 
+                                        state.timer.details)
+                    changed.append((drum, state, dur))
+
+            return changed, self.sign.send_batch()     # one round trip
+        finally:
+            self.sign.discard_batch()
+
+    def _get_sign_timer(self, timer):
+        """Returns (type, start) of timer as shown on the sign, None if 
+        the drum's stage is shown instead because there is no active timer 
+        or the sign has no display for the timer type."""
+        if (timer.type == NO_TIMER or 
+            not self.sign.has_timer_display(timer.type)):
+            return None
+        return (timer.type, timer.start)
 
     def power_cycle(self):
         LOGGER.error('Sign is not responsding. Starting power cycle ...')
@@ -548,16 +748,23 @@ class Annunciator:
             exit.wait(60)  # sign boot up time
 
             if self.sign is not None:
-                if self.current_display == ALERT_DISPLAY:
-                    self.current_display = DRUMS_DISPLAY
+                self.writer.submit(ALERT_PRIORITY, 
+                                   self._write_restore_display).result()
 
-                self.current_msg = self.sign.set_display(self.current_display, 
-                    msg=self.current_msg)
-
-            self.sign.return_sign_lease()   # reset after power cycle
             LOGGER.info('Power cycle successful.')
 
         except Exception as exc:
             LOGGER.error(f'Power cycle failed. {exc}')
             if not exit.is_set():
                 self.power_cycle()  # try until successfull
+
+    def _write_restore_display(self):
+        """Restores the current display after the sign has been power cycled. 
+        Runs on the sign writer thread."""
+        self.sign.clear_shadow()    # sign memory unknown after boot
+        if self.current_display == ALERT_DISPLAY:
+            self.current_display = DRUMS_DISPLAY
+
+        self.current_msg = self.sign.set_display(self.current_display, 
+            msg=self.current_msg)
+        self._publish()
@@ -1,13 +1,17 @@
 import logging
+import select
+import selectors as sel
 import socket as s
 import time
 import threading
 import configparser
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime as dt
 from helpers import * 
 from led_sign_client import LEDSignClient
 from intercom_client import IntercomClient
-from annunciator import Annunciator
+from annunciator import Annunciator, wire_version
 import dcs_data_pb2
 from globals import *
 
@@ -20,14 +24,46 @@ class AnnunciatorServer:
     alert_resp = 'ALERT'.encode()
     no_timer_resp = 'NO-TIMER'.encode()
     done_resp = 'DONE'.encode()
+    unchanged_resp = 'UNCHANGED'.encode()
+
+    MAX_CONNECTIONS = 64    # open client connections, more are sent BUSY
+    MAX_WORKERS = 4         # threads waiting on the sign for client requests
+    MAX_PENDING = 16        # client requests waiting on the sign
+    CONN_TIMEOUT = 30       # secs to receive a complete request
+    HEARTBEAT = 10          # secs between frames sent to idle subscribers
+    MAX_BACKLOG = 100       # unsent frames before a subscriber is dropped
+
+    DCS_POLL_TIME = 3       # secs between requests to DCS link in poll mode
+    DCS_PUSH_IDLE = 30      # secs without a push before checking DCS link
+    DCS_DOWN_TIME = 60      # secs without a response before DCS is down
+    DCS_ACK_TIMEOUT = 10    # secs to send result of processing a response
+    DCS_MIN_BACKOFF = 1     # secs between attempts to connect to DCS link,
+    DCS_MAX_BACKOFF = 60    # doubled after each failed attempt
 
     def __init__(self):
         self.power_cycling = False
         self.processing_custom_msg = False
         self.dcs_sock = None
-        self.lock = threading.Lock()    # used to set 'processing_custom_msg'
+        self.dcs_buf = bytearray(4096)  # reused to receive from DCS link
+        self.dcs_exc = 0
+        self.dcs_last_resp = time.monotonic()
+        self.lock = threading.Lock()    # used to set 'processing_custom_msg',
+                                        # 'pending', 'done' and 'published'
+
+        # listening socket event loop
+        self.selector = sel.DefaultSelector()
+        self.conns = {}         # addr -> _Connection
+        self.workers = ThreadPoolExecutor(self.MAX_WORKERS, 'client-worker')
+        self.pending = 0        # requests submitted to workers
+        self.done = deque()     # (conn, msgs) replies from workers
+        self.subscribers = set()    # connections streaming display changes
+        self.published = deque()    # snapshots to stream to subscribers
+        self.wake_recv, self.wake_send = s.socketpair()
+        self.wake_recv.setblocking(False)
+        self.wake_send.setblocking(False)
         self._init_config()
         self.annunciator = Annunciator()
+        self.annunciator.subscribe(self._on_publish)
 
         if not exit.is_set():
             LOGGER.info("Starting DCS update loop ...")
@@ -53,6 +89,11 @@ class AnnunciatorServer:
             # Communicating with DCS link
             self.dcs_host = config.get("DCS", "HOST")
             self.dcs_port = config.getint("DCS", "PORT")
+            self.dcs_push = config.getboolean("DCS", "PUSH", fallback=False)
+            # poll mode opens a new connection every cycle unless the DCS 
+            # link is known to take repeated requests on one connection
+            self.dcs_keep_open = self.dcs_push or config.getboolean(
+                "DCS", "KEEP_OPEN", fallback=False)
 
             debug = config.getboolean("SETTINGS", "DEBUG")
             if debug:
@@ -92,182 +133,536 @@ class AnnunciatorServer:
                     exit.wait(900)   # wait 15 min
         return None
 
-    def _client_send(self, sock, client_code, msg):
-        """Sends message with appropriate suffix for client over socket.
-        All messages sent to appserver must end with \n as client program is
-        written in java and uses read line 
+    def _dcs_connect(self):
+        """Connects to the DCS link, retrying with exponential backoff.
 
-        :param sock: connected socket object
-        :param client_code: a single character representing the code for 
-            the type of client on the connected socket 
-        :param msg: bytes object of message content to send over socket
-        :raises InvalidParameter: if client code not recongized
+        :return: True if connected, False if exit has been set
         """
-        if client_code == 'A':      # webserver 
-            sock.sendall(msg)
-        elif client_code == 'B':    # appserver
-            sock.sendall(msg + b'\n')
-        else:
-            raise InvalidParameter()
+        backoff = self.DCS_MIN_BACKOFF
+        while not exit.is_set():
+            try:
+                sock = s.create_connection((self.dcs_host, self.dcs_port), 
+                                           timeout=5)
+                sock.setsockopt(s.IPPROTO_TCP, s.TCP_NODELAY, 1)
+                self.dcs_sock = sock
+                log = LOGGER.info if self.dcs_keep_open else LOGGER.debug
+                log(f'Connected to DCS link {self.dcs_host}:{self.dcs_port}')
+                return True
+
+            except OSError as exc:
+                self.dcs_exc += 1
+                if self.dcs_exc == 1 or self.dcs_exc % 20 == 0:
+                    LOGGER.error(f'Unable to connect to DCS link - {exc}')
+                self._check_dcs_down()
+
+            exit.wait(backoff)
+            backoff = min(backoff * 2, self.DCS_MAX_BACKOFF)
+        return False
+
+    def _dcs_close(self):
+        if self.dcs_sock is not None:
+            self.dcs_sock.close()
+            self.dcs_sock = None
+
+    def _check_dcs_down(self):
+        """Displays DCS down message if no valid response has been received 
+        from the DCS link for DCS_DOWN_TIME secs."""
+        if time.monotonic() - self.dcs_last_resp > self.DCS_DOWN_TIME:
+            self.annunciator.display_dcs_down()
 
     def _dcs_send(self, msg):
         """First Sends the number of bytes in msg padded to 4 bytes, then sends
-        provided data across the given socket.
-
-        :param msg:  A string containing the data to send.
-        :return: True if all data successfully sent over sock, otherwise False
+        provided data across the DCS link socket.
 
+        :param msg:  A bytes object containing the data to send.
+        :raises OSError: if unable to send
         """
         assert type(self.dcs_sock) == s.socket
         assert type(msg) == bytes
 
-        msg_len = len(msg).to_bytes(4, 'big') # int to bytes
+        self.dcs_sock.sendall(len(msg).to_bytes(4, 'big') + msg)
 
-        try:
-            self.dcs_sock.sendall(msg_len)
-            self.dcs_sock.sendall(msg)
+    def _dcs_wait(self, timeout):
+        """Waits up to 'timeout' secs for data from the DCS link, checking 
+        exit every second.
 
-        except Exception as exc:
-            LOGGER.error(f'Error sending {msg_len}: {exc}')
-            self.dcs_sock.close()
-            return False
-
-        return True
+        :return: True if data is ready to be received, False if exit is set
+        :raises TimeoutError: if no data within timeout
+        """
+        deadline = time.monotonic() + timeout
+        while not exit.is_set():
+            ready, _, _ = select.select([self.dcs_sock], [], [], 1)
+            if ready:
+                return True
+            if time.monotonic() > deadline:
+                raise TimeoutError('no data from DCS link')
+        return False
+
+    def _recv_exact(self, n):
+        """Receives exactly n bytes from the DCS link socket into the reusable
+        receive buffer.
+
+        :return: memoryview of the n bytes, only valid until the next call
+        :raises ConnectionResetError: if DCS link closes the connection
+        :raises TimeoutError: if no data within the socket timeout
+        """
+        if len(self.dcs_buf) < n:
+            self.dcs_buf = bytearray(n)
+        view = memoryview(self.dcs_buf)[:n]
+
+        got = 0
+        while got < n:
+            received = self.dcs_sock.recv_into(view[got:], n - got)
+            if received == 0:
+                raise ConnectionResetError('DCS link closed connection')
+            got += received
+        return view
 
     def _dcs_receive(self):
         """Receives 4 bytes of data indicating length of incomming message then 
         receives message and parses as Response message.
 
-        :return: A Response message parsed from the received data or 
-        None if an error occured.
+        :return: A Response message parsed from the received data
+        :raises OSError: if unable to receive
         """
         assert type(self.dcs_sock) == s.socket
 
+        content_length = int.from_bytes(self._recv_exact(4), 'big')
+        msg = dcs_data_pb2.Response()
+        msg.ParseFromString(self._recv_exact(content_length))
+        return msg
+
+    def _process_dcs_resp(self, resp, msg):
+        """Updates annunciator with response from DCS link and sets msg to the
+        result to send back.
+
+        :param resp: dcs_data_pb2 Response message
+        :param msg: dcs_data_pb2 ClientMsg to send to DCS link
+        :raises SignError: if LED sign is unreachable
+        """
+        # NAK until proven otherwise
+        msg.msg = dcs_data_pb2.ClientMsg.MsgType.NAK  
+
+        if not resp.is_valid:
+            return
+
         try:
-            content_length = self.dcs_sock.recv(4)
+            self.annunciator.check_alarms(resp.alarms) 
 
-            data = self.dcs_sock.recv(int.from_bytes(content_length, 'big'))
-            msg = dcs_data_pb2.Response()
-            msg.ParseFromString(data)
-            #print(f'DCS Received {msg}')
-            return msg
+            if ( resp.notify.code != 'NNN' and 
+                    self.annunciator._has_priority('notify') ):
+                self.annunciator.display_notify(resp.notify)
+                msg.recieved_notify = resp.notify.code
 
-        except:
-            return None
-
-    def _get_drums_content_msg(self):
-        """Create encoded message containing drum stages to be sent over 
-        socket."""
-        #LOGGER.debug(f'DRUM STAGES: {msg}')
-        msg = ""
-        for drum in self.annunciator.drum_states:
-            if drum['timer'].type != NO_TIMER:
-                msg = msg + str(drum['timer'].type) + \
-                    ','+ str(drum['timer'].start) + \
-                    ',' + str(drum['timer'].duration) + \
-                    ',' + str(drum['timer'].details) + '_'
-            else:
-                msg = msg + str(drum['stage']) + '_'
+            time.sleep(.5)  # allow time for other threads to run
+            self.annunciator.update_drum_states(resp.drums) 
+            self.annunciator.display_drums()
+
+            msg.msg = dcs_data_pb2.ClientMsg.MsgType.ACK 
 
-        #print(f'drums msg: {msg}')
-        return msg[:-1].encode()
+        except InvalidParameter as exc:
+            # invalid/missing values in resp.alarms
+            LOGGER.error(f'invalid param')
+            exit.wait(3)   # total of 5 seconds 
 
     def dcs_update(self):
         """
-        Will display DCS down notification if dcs link is unreachable and the 
-        current display is not a custom message or notification.
-
-        If the response from the DCS link holds a notification and all new 
-        stages for all of the drums, it will take awhile to process it all. 
-        Since the DCS link needs to know if the notification was successfully 
-        displayed a response with the results of processing the data needs to 
-        be sent to the DCS link. Therefore the socket timeout is set to 80.
+        Talks to the DCS link, connecting with exponential backoff when the
+        connection can't be made or is lost. Messages in both directions are
+        a 4 byte big endian length followed by a protobuf message.
+
+        Poll mode (DCS PUSH = false):
+            send DATA_REQUEST, receive Response, send ACK/NAK, every 
+            DCS_POLL_TIME secs. A new connection is opened for every 
+            exchange, unless DCS KEEP_OPEN = true, which keeps one connection
+            open and needs a DCS link that takes repeated DATA_REQUESTs on
+            one connection.
+        Push mode (DCS PUSH = true):
+            send DATA_REQUEST once after connecting, then the DCS link sends a
+            Response whenever its state changes and each is answered with 
+            ACK/NAK. If nothing is received for DCS_PUSH_IDLE secs a 
+            DATA_REQUEST is sent to check the link is still up. The 
+            connection is always kept open.
+
+        Will display DCS down notification if no valid response is received 
+        for DCS_DOWN_TIME secs and the current display is not a custom 
+        message or notification.
+
+        The DCS link needs to know if a notification was successfully 
+        displayed so a response with the results of processing the data is 
+        sent to the DCS link. Notifications are reverted by the annunciator's
+        display timeline, so processing does not wait for the notification to
+        finish and the socket timeout is DCS_ACK_TIMEOUT.
         """
-        dcs_exc = 0
         msg = dcs_data_pb2.ClientMsg()
+        request = True      # send DATA_REQUEST before next receive
+        probed = False      # DATA_REQUEST sent after push mode idle timeout
 
         while not exit.is_set():
             if self.power_cycling:
-                time.sleep(5)
+                exit.wait(5)
                 continue
 
+            if self.dcs_sock is None:
+                if not self._dcs_connect():
+                    break
+                request = True
+
             try:
-                self.dcs_sock = s.socket(s.AF_INET, s.SOCK_STREAM)
+                if request:
+                    msg.Clear()
+                    msg.msg = dcs_data_pb2.ClientMsg.MsgType.DATA_REQUEST
+                    self._dcs_send(msg.SerializeToString())
+                    request = not self.dcs_push
+
+                if self.dcs_push and not self._dcs_wait(self.DCS_PUSH_IDLE):
+                    break
+
                 self.dcs_sock.settimeout(5)
-                self.dcs_sock.connect((self.dcs_host, self.dcs_port))
-                
-                msg.msg = dcs_data_pb2.ClientMsg.MsgType.DATA_REQUEST
+                resp = self._dcs_receive()
+                self.dcs_sock.settimeout(self.DCS_ACK_TIMEOUT) 
+                probed = False
 
-                if self._dcs_send(msg.SerializeToString()):
+                msg.Clear()
+                try:
+                    self._process_dcs_resp(resp, msg)
 
-                    resp = self._dcs_receive()
-                    self.dcs_sock.settimeout(80) 
+                except SignError:
+                    msg.msg = dcs_data_pb2.ClientMsg.MsgType.NAK
+                    self._dcs_send(msg.SerializeToString())
+                    self._dcs_close()
 
-                    # NAK until proven otherwise
-                    msg.msg = dcs_data_pb2.ClientMsg.MsgType.NAK  
-                    
-                    if resp is not None and resp.is_valid:
-                        try:
-                            self.annunciator.check_alarms(resp.alarms) 
+                    self.power_cycling = True
+                    self.annunciator.power_cycle()
+                    self.power_cycling = False
+                    continue
 
-                            if ( resp.notify.code != 'NNN' and 
-                                    self.annunciator._has_priority('notify') ):
-                                self.annunciator.display_notify(resp.notify)
-                                msg.recieved_notify = resp.notify.code
+                self._dcs_send(msg.SerializeToString())
+                if resp.is_valid:
+                    self.dcs_last_resp = time.monotonic()
+                    self.dcs_exc = 0
 
-                            time.sleep(.5)  # allow time for other threads to run
-                            self.annunciator.update_drum_states(resp.drums) 
-                            self.annunciator.display_drums()
+            except TimeoutError:
+                if self.dcs_push and not probed:
+                    request = probed = True  # idle, check link is still up
+                    continue
+                if self.dcs_exc % 15 == 0:
+                    LOGGER.error('Socket to DCS link timeout.'
+                                        ' Check network connection.')
+                self.dcs_exc += 1
+                self._dcs_close()
+                probed = False
 
-                            msg.msg = dcs_data_pb2.ClientMsg.MsgType.ACK 
+            except ConnectionResetError as exc:
+                LOGGER.error(f'Error connection reset by peer. {exc}')
+                self.dcs_exc += 1
+                self._dcs_close()
 
-                        except SignError:
-                            msg.msg = dcs_data_pb2.ClientMsg.MsgType.NAK
-                            self._dcs_send(msg.SerializeToString())
-                            self.dcs_sock.close()
+            except Exception as exc:
+                if self.dcs_exc % 15 == 0:
+                    LOGGER.error(f'Error in dcs_update() - {exc}')   
+                self.dcs_exc += 1
+                self._dcs_close()
 
-                            self.power_cycling = True
-                            self.annunciator.power_cycle()
-                            self.power_cycling = False
-                            continue
+            self._check_dcs_down()
 
-                        except InvalidParameter as exc:
-                            # invalid/missing values in resp.alarms
-                            LOGGER.error(f'invalid param')
-                            exit.wait(3)   # total of 5 seconds 
+            if not self.dcs_keep_open:
+                self._dcs_close()       # new connection every exchange
+            if not self.dcs_push:
+                exit.wait(self.DCS_POLL_TIME)   # time between updates
 
-                    if self._dcs_send(msg.SerializeToString()):
-                        self.dcs_sock.close()
-                    dcs_exc = 0
+        self._dcs_close()
 
-            except TimeoutError:
-                if dcs_exc % 15 == 0:
-                    LOGGER.error('Socket to DCS link timeout.'
-                                        ' Check network connection.')
-                dcs_exc += 1
+    def _client_msg(self, client_code, msg):
+        """Returns message with appropriate suffix for client.
+        All messages sent to appserver must end with \n as client program is
+        written in java and uses read line 
 
-            except ConnectionRefusedError:
-                if dcs_exc == 20 or dcs_exc % 400 == 0: # every 20mins
-                    LOGGER.error('DCS Server is down' 
-                                    ', unable to make connection.')
-                dcs_exc += 1  
+        :param client_code: a single character representing the code for 
+            the type of client on the connection
+        :param msg: bytes object of message content
+        :raises InvalidParameter: if client code not recongized
+        """
+        if client_code == 'A':      # webserver 
+            return msg
+        elif client_code == 'B':    # appserver
+            return msg + b'\n'
+        else:
+            raise InvalidParameter()
 
-            except ConnectionResetError:
-                LOGGER.error('Error connection reset by peer.')
+    def _reply(self, conn, *msgs, close=True):
+        """Queues messages to be sent on connection from the listening thread.
+        Each message is sent with its own send() call, as the clients expect.
+        Must only be called on the listening thread, see _reply_later().
+        """
+        for msg in msgs:
+            conn.out.append(self._client_msg(conn.client_code, msg))
+        conn.close_when_sent = close
+        self._flush(conn)
+
+    def _reply_later(self, conn, *msgs):
+        """Queues reply from a worker thread and wakes the listening thread."""
+        with self.lock:
+            self.done.append((conn, msgs))
+        try:
+            self.wake_send.send(b'\0')
+        except BlockingIOError:
+            pass    # listening thread already has wake ups to read
+
+    def _on_publish(self, snapshot):
+        """Annunciator subscriber, queues snapshot to be streamed to 
+        subscribed clients and wakes the listening thread."""
+        with self.lock:
+            self.published.append(snapshot)
+        try:
+            self.wake_send.send(b'\0')
+        except BlockingIOError:
+            pass
+
+    def _frame(self, snapshot):
+        """Returns snapshot as a subscription frame, the payload length as 4 
+        big endian bytes followed by '<version>,<display code>,<content>'. A 
+        frame with no payload is a heartbeat."""
+        if snapshot is None:
+            return bytes(4)
+        payload = f'{wire_version(snapshot)},{snapshot.code},'.encode() + \
+                  snapshot.content
+        return len(payload).to_bytes(4, 'big') + payload
+
+    def _stream(self, conn, frame):
+        """Queues frame to subscriber. Drops subscribers that are not 
+        reading fast enough to keep up."""
+        if len(conn.out) >= self.MAX_BACKLOG:
+            LOGGER.warning(f'Dropping subscriber {conn.addr}, '
+                           f'{len(conn.out)} frames unsent')
+            self._close(conn)
+            return
+        conn.out.append(frame)
+        conn.last_sent = time.monotonic()
+        self._flush(conn)
+
+    def _stream_published(self):
+        """Streams new snapshots to subscribers, heartbeats when idle"""
+        while self.published:
+            with self.lock:
+                snapshot = self.published.popleft()
+            frame = self._frame(snapshot)
+            for conn in list(self.subscribers):
+                # skip versions older than the one sent when subscribing
+                if snapshot.version > conn.version:
+                    conn.version = snapshot.version
+                    self._stream(conn, frame)
+
+        now = time.monotonic()
+        for conn in list(self.subscribers):
+            if now - conn.last_sent >= self.HEARTBEAT:
+                self._stream(conn, self._frame(None))
+
+    def _flush(self, conn):
+        """Sends as much of the queued output as the socket will take without
+        blocking, then closes connection if there is nothing left to send."""
+        try:
+            while conn.out:
+                sent = conn.sock.send(conn.out[0])
+                if sent < len(conn.out[0]):
+                    conn.out[0] = conn.out[0][sent:]
+                    break
+                conn.out.popleft()
+        except BlockingIOError:
+            pass
+        except OSError as exc:
+            LOGGER.debug(f'Error sending to {conn.addr} - {exc}')
+            self._close(conn)
+            return
+
+        if conn.out:
+            self.selector.modify(conn.sock, sel.EVENT_WRITE, conn)
+        elif conn.close_when_sent:
+            self._close(conn)
+        else:
+            self.selector.modify(conn.sock, sel.EVENT_READ, conn)
+
+    def _close(self, conn):
+        """Closes connection. Releases 'processing_custom_msg' if the client
+        went away part way through sending a custom message."""
+        if conn.sock.fileno() < 0:
+            return
+        if (conn.cmd_code == '1' and 
+                conn.state in [_Connection.MSG_LEN, _Connection.MSG]):
+            with self.lock:
+                self.processing_custom_msg = False
+        self.selector.unregister(conn.sock)
+        conn.sock.close()
+        self.conns.pop(conn.addr, None)
+        self.subscribers.discard(conn)
+
+    def _accept(self, sock):
+        try:
+            client, addr = sock.accept()
+        except BlockingIOError:
+            return
+
+        if len(self.conns) >= self.MAX_CONNECTIONS:
+            LOGGER.warning(f'BUSY - {len(self.conns)} open connections, '
+                           f'refusing {addr}')
+            try:
+                client.send(self.busy_resp)
+            except OSError:
+                pass
+            client.close()
+            return
+
+        client.setblocking(False)
+        conn = _Connection(client, addr)
+        self.conns[addr] = conn
+        self.selector.register(client, sel.EVENT_READ, conn)
+
+    def _read(self, conn):
+        """Reads available data from connection and handles each part of the
+        request once it has been received in full."""
+        try:
+            data = conn.sock.recv(1024)
+        except BlockingIOError:
+            return
+        except OSError as exc:
+            LOGGER.debug(f'Error receiving from {conn.addr} - {exc}')
+            data = b''
+
+        if not data:
+            self._close(conn)
+            return
+
+        if conn.state == _Connection.SUBSCRIBED:
+            return      # nothing expected from subscribers
+
+        conn.buf += data
+        conn.last_active = time.monotonic()
+
+        try:
+            if conn.state == _Connection.CMD and len(conn.buf) >= 2:
+                cmd = conn.buf[:2].decode()
+                del conn.buf[:2]
+                conn.client_code = cmd[0]
+                conn.cmd_code = cmd[1]
+                self.handle_command(conn, cmd[1])
+
+            if conn.state == _Connection.MSG_LEN and len(conn.buf) >= 3:
+                conn.msg_len = int(conn.buf[:3].decode())
+                del conn.buf[:3]
+                conn.state = _Connection.MSG
+
+            if conn.state == _Connection.MSG and len(conn.buf) >= conn.msg_len:
+                cmd = conn.buf[:conn.msg_len].decode()
+                del conn.buf[:conn.msg_len]
+                conn.state = _Connection.WORKING
+                if conn.cmd_code == '4':
+                    self._send_display_if_changed(conn, cmd)
+                else:
+                    self._submit(conn, self._handle_custom_msg, cmd)
+
+        except Exception as exc:
+            LOGGER.error(f'Error receiving data from {conn.addr} - {exc}')
+            self._close(conn)
+
+    def _submit(self, conn, func, *args):
+        """Runs func(*args) on the worker pool. Its return value is sent to the
+        client. Replies BUSY if too many requests are already waiting on the 
+        sign."""
+        with self.lock:
+            if self.pending >= self.MAX_PENDING:
+                LOGGER.warning(f'BUSY - {self.pending} requests waiting on sign')
+                busy = True
+            else:
+                self.pending += 1
+                busy = False
 
+        if busy:
+            if func == self._handle_custom_msg:
+                with self.lock:
+                    self.processing_custom_msg = False
+            self._reply(conn, self.busy_resp)
+            return
+
+        def work():
+            resp = None
+            try:
+                resp = func(*args)
             except Exception as exc:
-                if dcs_exc % 15 == 0:
-                    LOGGER.error(f'Error in dcs_update() - {exc}')   
-                dcs_exc += 1
+                LOGGER.error(f'Error handling request from {conn.addr} - {exc}')
+            finally:
+                with self.lock:
+                    self.pending -= 1
+                self._reply_later(conn, *([resp] if resp else []))
+
+        self.workers.submit(work)
+
+    def _handle_custom_msg(self, cmd):
+        """Runs on worker pool. 
+
+        :param cmd: <msg_type><dur_code><msg_text>
+        :return: response to send to client, or None
+        """
+        try:
+            LOGGER.debug(f'cmd: {cmd}') 
+            try: 
+                if self.annunciator.display_custom_msg(
+                    cmd[0], 
+                    dur_code_to_wait_time(cmd[1]), 
+                    cmd[2:]
+                ):
+                    return self.ack_resp
+                return self.nak_resp
+
+            except SignLeaseError:
+                LOGGER.warning('BUSY - preempted by alert in ' 
+                                'display_custom_msg()')
+                return self.busy_resp
+
+        except Exception as exc:
+            LOGGER.warning(f'Error handling custom msg request {exc}')
 
-            msg.Clear() 
-            
-            if dcs_exc > 20:
-                self.annunciator.display_dcs_down()
+        finally:
+            with self.lock:
+                self.processing_custom_msg = False
 
-            exit.wait(3)   # time between updates
+    def _handle_display_drums(self):
+        """Runs on worker pool. Returns response to send to client."""
+        try:
+            self.annunciator.display_drums(override=True)
+            return self.ack_resp
+
+        except SignLeaseError:
+            LOGGER.warning('BUSY - preempted by alert in set_display drums')
+            return self.busy_resp
+
+        except SignError:
+            return self.nak_resp
+
+    def _send_current_display(self, conn):
+        """Sends current display code and content from the annunciator's 
+        published snapshot."""
+        snap = self.annunciator.snapshot
+        msgs = [str(snap.code).encode(), snap.content]
+        if snap.code != DRUMS_DISPLAY and conn.client_code == 'B':
+            msgs.append(self.done_resp)
+        self._reply(conn, *msgs)
+
+    def _send_display_if_changed(self, conn, version):
+        """Sends 'UNCHANGED' if the client's last seen snapshot version is 
+        the current one, otherwise sends '<version>,<code>,<content>' as one 
+        message.
+
+        :param version: string of client's last snapshot version, may be empty.
+            Versions from before a server restart never match.
+        """
+        snap = self.annunciator.snapshot
+        if version.strip() == wire_version(snap):
+            self._reply(conn, self.unchanged_resp)
+        else:
+            self._reply(conn, 
+                f'{wire_version(snap)},{snap.code},'.encode() + snap.content)
 
-    def handle_connection(self, s, a):
+    def handle_command(self, conn, cmd_code):
         """ SOCKET COMMUNICATION PROTOCOL
             -----------------------------
             CASE 1
@@ -287,140 +682,188 @@ class AnnunciatorServer:
                 receive: client code + 3          (request current display cmd)
                 send: current display code
                 send: [drum_stage, current_msg]
+            CASE 4b
+                receive: client code + 4          (request display if changed)
+                receive: version length
+                receive: last display version seen by client
+                send: ['UNCHANGED', '<version>,<display code>,<content>']
+                version: '<boot id>.<n>', compared as a whole string
+            CASE 4c
+                receive: client code + 5          (subscribe to display)
+                send: frame of current display
+                send: frame of each display change, until client disconnects
+                      or empty frame every HEARTBEAT secs when unchanged
+                frame: 4 byte big endian length + 
+                       '<version>,<display code>,<content>'
             CASE 5 
                 receive: any
                 send: 'POWERCYCLE'
             CASE 6
-                receive: anything other than 1 or 2
+                receive: anything other than 1, 2, 3, 4 or 5
                 send: 'NAK'
         
-        Will only allow for one thread at a time to process a display custom 
-        message request. The thread that is able to set 'processing_custom_msg'
-        to True is allowed to process request. 
+        Runs on the listening thread so must not block. Requests that change
+        the sign are handed to the worker pool, which waits on the sign 
+        writer, and their response is sent when they finish. Requests for the
+        current display are answered straight away from the annunciator's
+        published snapshot, which is never modified in place.
+
+        Will only allow for one display custom message request at a time. The
+        connection that is able to set 'processing_custom_msg' to True is 
+        allowed to process request. 
         This is needed to handle receiving multiple display custom message 
         request at the same time. 
         If a notification is playing self.display_custom_msg waits for it to 
         finish before processing request.        
         """
-        try:
-            cmd = s.recv(2).decode()
-            c = cmd[0]  # client code (A or B)
-            cmd_code = cmd[1]
-            
-            if self.power_cycling:
-                self._client_send(s, c, self.power_cycle_resp)
-                LOGGER.debug(f'Sent POWERCYCLE to {c}-conn: {a}')
-                return
-
-            # display custom message
-            if '1' in cmd_code:
-                with self.lock:
-                    if not self.processing_custom_msg:
-                        self.processing_custom_msg = True
-                    else:
-                        LOGGER.info('BUSY')
-                        self._client_send(s, c, self.busy_resp)
-                        return
-                try:
-                    LOGGER.info('Update custom message command from webserver')
-                    self._client_send(s, c, self.ack_resp)
-
-                    msg_len = s.recv(3).decode()      
-                    cmd = s.recv(int(msg_len)).decode()
-                    # cmd = <msg_type><dur_code><msg_text>
-                    LOGGER.debug(f'cmd: {cmd}') 
-
-                    # update LED sign
-                    try: 
-                        if self.annunciator.display_custom_msg(
-                            cmd[0], 
-                            dur_code_to_wait_time(cmd[1]), 
-                            cmd[2:]
-                        ):
-                            self._client_send(s, c, self.ack_resp)
-                        else:
-                            self._client_send(s, c, self.nak_resp)
-
-                    except SignLeaseError:
-                        LOGGER.warning('BUSY - SignLeaseError in' 
-                                        'display_custom_msg()')
-                        self._client_send(s, c, self.busy_resp)
-
-                except Exception as exc:
-                    LOGGER.warning(f'Error handling custom msg request {exc}')
-
-                with self.lock:
-                    self.processing_custom_msg = False
-
-            # display drums
-            elif '2' in cmd_code:
-                LOGGER.info('Handling set display to drums request ...')
-                if self.annunciator.current_display == ALERT_DISPLAY:
-                    self._client_send(s, c, self.alert_resp)
+        c = conn.client_code
+        if self.power_cycling:
+            self._reply(conn, self.power_cycle_resp)
+            LOGGER.debug(f'Sent POWERCYCLE to {c}-conn: {conn.addr}')
+            return
+
+        # display custom message
+        if '1' in cmd_code:
+            with self.lock:
+                if not self.processing_custom_msg:
+                    self.processing_custom_msg = True
                 else:
-                    try:
-                        self.annunciator.display_drums(override=True)
-                        self._client_send(s, c, self.ack_resp)
-
-                    except SignLeaseError:
-                        LOGGER.warning('BUSY - SignLeaseError in'
-                                       'set_display drums')
-                        self._client_send(s, c, self.busy_resp)
-
-                    except SignError:
-                        self._client_send(s, c, self.nak_resp)
-
-            # request current display
-            elif '3' in cmd_code:
-                self._client_send(s, c, str(self.annunciator.current_display).encode())
-
-                if self.annunciator.current_display == DRUMS_DISPLAY:
-                    self._client_send(s, c, self._get_drums_content_msg())
-                    
-                else:    # custom message, notify or alert
-                    #LOGGER.debug(f'current_msg: {self.current_msg}')
-                    self._client_send(s, c, self.annunciator.current_msg.encode())
-                    if c == 'B':
-                        self._client_send(s, c, self.done_resp)
-
+                    LOGGER.info('BUSY')
+                    self._reply(conn, self.busy_resp)
+                    return
+
+            LOGGER.info('Update custom message command from webserver')
+            conn.state = _Connection.MSG_LEN
+            self._reply(conn, self.ack_resp, close=False)
+
+        # display drums
+        elif '2' in cmd_code:
+            LOGGER.info('Handling set display to drums request ...')
+            if self.annunciator.current_display == ALERT_DISPLAY:
+                self._reply(conn, self.alert_resp)
             else:
-                LOGGER.error(f'Invalid command code from client: {cmd_code}')
-                self._client_send(s, c, self.nak_resp)
-                return
+                conn.state = _Connection.WORKING
+                self._submit(conn, self._handle_display_drums)
+
+        # request current display
+        elif '3' in cmd_code:
+            self._send_current_display(conn)
+
+        # request current display if changed since version client has
+        elif '4' in cmd_code:
+            conn.state = _Connection.MSG_LEN
+
+        # stream display changes
+        elif '5' in cmd_code:
+            LOGGER.info(f'{c}-conn {conn.addr} subscribed to display changes')
+            conn.state = _Connection.SUBSCRIBED
+            self.subscribers.add(conn)
+            snapshot = self.annunciator.snapshot
+            conn.version = snapshot.version
+            self._stream(conn, self._frame(snapshot))
 
-        except Exception as exc:
-            LOGGER.error(f'Error receiving data in handle_connection - {exc}')
+        else:
+            LOGGER.error(f'Invalid command code from client: {cmd_code}')
+            self._reply(conn, self.nak_resp)
+
+    def _close_idle(self):
+        """Closes connections that have not sent a complete request within
+        CONN_TIMEOUT secs."""
+        now = time.monotonic()
+        for conn in list(self.conns.values()):
+            if (conn.state not in [_Connection.WORKING, 
+                                   _Connection.SUBSCRIBED] and not conn.out and 
+                    now - conn.last_active > self.CONN_TIMEOUT):
+                LOGGER.debug(f'Closing idle connection {conn.addr}')
+                self._close(conn)
 
     def listen_on_socket(self):
         """
+        Event loop serving all client connections on this thread. Sockets are
+        non-blocking and are only read or written when the selector reports 
+        they are ready, so one slow client or sign transaction does not hold
+        up the others.
+
         _create_socket() will only returns if able to create sock or exit is set
         """
         sock = self._create_socket(self.host, self.port)  
+        if sock:
+            sock.setblocking(False)
+            self.selector.register(sock, sel.EVENT_READ)
+        self.selector.register(self.wake_recv, sel.EVENT_READ)
 
         while not exit.is_set():
             try:
-                conn, addr = sock.accept()
-                threading.Thread(target=self.handle_connection, 
-                                    args=(conn, addr), daemon=True).start()
-                
-            except s.timeout:
-                pass
+                for key, mask in self.selector.select(timeout=1):
+                    if key.fileobj is sock:
+                        self._accept(sock)
+                    elif key.fileobj is self.wake_recv:
+                        try:
+                            self.wake_recv.recv(1024)
+                        except BlockingIOError:
+                            pass
+                    elif mask & sel.EVENT_WRITE:
+                        self._flush(key.data)
+                    else:
+                        self._read(key.data)
+
+                # send responses from worker pool
+                while self.done:
+                    with self.lock:
+                        conn, msgs = self.done.popleft()
+                    if conn.sock.fileno() >= 0:
+                        self._reply(conn, *msgs)
+
+                self._stream_published()
+                self._close_idle()
 
             except Exception as exc:
                 LOGGER.error(f'Exc occurred: {exc}. Restarting listening socket')
-                sock.close()
+                if sock:
+                    self.selector.unregister(sock)
+                    sock.close()
                 sock = self._create_socket(self.host, self.port)
-
-            time.sleep(.5)  # allow time for other threads to run
+                if sock:
+                    sock.setblocking(False)
+                    self.selector.register(sock, sel.EVENT_READ)
 
         # END WHILE -----------------------------------------------------------
 
+        for conn in list(self.conns.values()):
+            self._close(conn)
+        self.workers.shutdown(wait=False)
         if sock:
+            self.selector.unregister(sock)
             sock.close()
+        self.selector.close()
         
         LOGGER.info('Exiting website listening method ...')
 
 
+class _Connection:
+    """State of a client connection on the listening socket"""
+    # request parsing states
+    CMD = 0         # waiting for client code + command code
+    MSG_LEN = 1     # waiting for 3 digit length of custom message/version
+    MSG = 2         # waiting for custom message/version
+    WORKING = 3     # request handed to worker pool
+    SUBSCRIBED = 4  # streaming display changes to client
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.client_code = None
+        self.cmd_code = None
+        self.state = self.CMD
+        self.buf = bytearray()
+        self.msg_len = 0
+        self.out = deque()      # messages waiting to be sent
+        self.close_when_sent = False
+        self.last_active = time.monotonic()
+        self.last_sent = self.last_active
+        self.version = -1       # last snapshot version streamed to client
+
+
 # ------------------------------------------------------------------------------
 
 if __name__ == '__main__':
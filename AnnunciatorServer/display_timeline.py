@@ -0,0 +1,90 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from helpers import *
+from globals import *
+from scheduler import default_scheduler
+
+LOGGER = logging.getLogger(__name__)
+
+# Show display 'code' until monotonic time 'until', then revert the sign to
+# 'revert_code' with variable file content 'revert_msg'.
+TimelineEntry = namedtuple('TimelineEntry',
+                           ['code', 'until', 'revert_code', 'revert_msg'])
+
+
+class DisplayTimeline:
+    """
+    Holds the timed display on the sign, e.g. a notification, and reverts the
+    sign when its time is up. Reverts are fired from the scheduler thread, so
+    the caller returns as soon as the display has been scheduled.
+
+    Only one entry is held at a time as the sign only shows one display.
+    Showing a new timed display replaces the pending entry.
+
+    'revert' is called with the expired entry on the scheduler thread. It must
+    not block and must check the entry is still the display on the sign
+    before changing it.
+    """
+    def __init__(self, revert, scheduler=None):
+        self.revert = revert
+        if scheduler is None:
+            scheduler = default_scheduler()
+        self.scheduler = scheduler
+        self.entry = None
+        self.handle = None      # TimerHandle of the pending revert
+        self.lock = threading.Lock()
+
+    def show(self, code, duration, revert_code, revert_msg=''):
+        """Schedules revert of display 'code' after 'duration' secs.
+
+        :return: the scheduled TimelineEntry
+        :raises SchedulerFull: if the revert could not be scheduled
+        """
+        entry = TimelineEntry(code, time.monotonic() + duration,
+                              revert_code, revert_msg)
+        with self.lock:
+            handle = self.scheduler.call_later(duration, self._fire,
+                                               self._entry_id(entry))
+            if self.handle is not None:
+                self.handle.cancel()
+            self.entry = entry
+            self.handle = handle
+        return entry
+
+    def _entry_id(self, entry):
+        """Identifies the show() call that scheduled a revert, entries can be
+        replaced by set_revert() before they fire."""
+        return (entry.code, entry.until)
+
+    def set_revert(self, revert_code, revert_msg=''):
+        """Changes what the pending entry reverts to, if there is one."""
+        with self.lock:
+            if self.entry is not None:
+                self.entry = self.entry._replace(revert_code=revert_code,
+                                                 revert_msg=revert_msg)
+
+    def pending(self):
+        """Returns the pending TimelineEntry or None"""
+        return self.entry
+
+    def cancel(self):
+        with self.lock:
+            if self.handle is not None:
+                self.handle.cancel()
+            self.entry = None
+            self.handle = None
+
+    def _fire(self, entry_id):
+        with self.lock:
+            entry = self.entry
+            if entry is None or self._entry_id(entry) != entry_id:
+                return      # replaced or cancelled after timer was due
+            self.entry = None
+            self.handle = None
+
+        try:
+            self.revert(entry)
+        except Exception as exc:
+            LOGGER.error(f'Error reverting display {entry.code} - {exc}')
@@ -1,7 +1,11 @@
+import hashlib
 import logging
 import time
+import threading
+from types import MappingProxyType
 import serial
 from led_sign_command import LEDSignCommand
+import dcs_data_pb2
 from helpers import * 
 from globals import *
 
@@ -19,23 +23,94 @@ class LEDSignClient:
     timer_var_files and new_stage corresponde the follow drums,
         0 = 1A,     1 = 1B,     2 = 2A,     3 = 2B,     4 = 3A,     5 = 3B
 
+
+    The serial port is held open by the client for the life of the session.
+
+    A shadow of the variable files and script the sign last accepted is kept 
+    so writes that would not change the sign are never sent. The shadow is 
+    cleared by reset_sign(), clear_memory() and clear_shadow().
     """
+    BAUD_RATE = 9600
+    READ_TIMEOUT = 0.05     # secs a single serial read blocks for
+    RESP_TIMEOUT = 3        # secs to wait for sign to finish replying
+    RETRY_DELAY = 2         # secs between attempts when sign does not reply
+    WRITE_CHUNK = 1000
+    RESP_OK = b'ok'
+    RESP_ERROR = b'err'
+
     def __init__(self, serial_port, sign_addr, sent_attempts):
         self.serial_port = serial_port
         self.sent_attempts = sent_attempts
         self.sign_cmd = LEDSignCommand(sign_addr)
+        self.ser = None
+        self.batch = None
+        self.shadow = {}    # variable file name -> digest of last accepted cmd
+        self.playing_script = None
+        self.lock = threading.RLock()   # one transaction on the port at a time
+
+        # timer type -> method writing the timer variable file
+        self.timer_writers = {
+            ISO_TIMER: self.set_iso_timer,
+            #### ADD TIMERS here ####
+        }
+
+        self._init_templates()
 
-        self.sign_busy = True
         self._init_sign()
-        self.sign_busy = False
+
+    def _init_templates(self):
+        """Freezes the commands that are sent most often so they only need 
+        to be copied into the command buffer before sending."""
+        self._init_stage_table()
+
+        # alarm variable file up to the alarm names
+        self.sign_cmd.start_cmd()
+        self.sign_cmd.write_to_var('alarm') 
+        self.sign_cmd.set_color('white')
+        self.alarm_cmd = self.sign_cmd.freeze()
+
+        self.deck_cmds = {}     # deck code -> (deck text, deck variable file)
+        for deck, txt in [(BOTH_DECKS, 'SWITCH & CUT'), 
+                          (SWITCH_DECK, 'SWITCH'), (CUT_DECK, 'CUT')]:
+            self.sign_cmd.start_cmd()
+            self.sign_cmd.write_to_var('deck')
+            self.sign_cmd.set_text(txt)
+            self.sign_cmd.end_cmd()
+            self.deck_cmds[deck] = (txt, self.sign_cmd.freeze())
+
+    def _init_stage_table(self):
+        """Renders the stage variable file command of every drum and stage 
+        once. The commands are stored back to back in 'self.stage_table' and
+        'self.stage_index' maps (drum, stage) to the (start, end) of the 
+        command in the table and the digest of the command."""
+        stages = set(dcs_data_pb2.State.Stage.values())
+        stages.add(UNSET_STAGE)
+
+        table = bytearray()
+        index = {}
+        for drum in range(6):
+            for stage in sorted(stages):
+                cmd = self._build_stage_cmd(drum, stage)
+                index[(drum, stage)] = (len(table), len(table) + len(cmd), 
+                                        self._get_digest(cmd))
+                table += cmd
+
+        self.stage_table = bytes(table)
+        self.stage_index = MappingProxyType(index)
+
+    def dump_stage_table(self):
+        """Returns list of 'drum stage: command' lines of the stage table, to
+        check against the variable files on the sign."""
+        return [f'{drum_code_to_str(drum)} {stage}: ' 
+                f'{self.stage_table[start:end].decode()}' 
+                for (drum, stage), (start, end, _) in self.stage_index.items()]
 
     def _init_sign(self):
-        self.set_stage(0, UNSET_STAGE)
-        self.set_stage(1, UNSET_STAGE)
-        self.set_stage(2, UNSET_STAGE)
-        self.set_stage(3, UNSET_STAGE)
-        self.set_stage(4, UNSET_STAGE)
-        self.set_stage(5, UNSET_STAGE)
+        self.start_batch()
+        for drum in range(6):
+            self.set_stage(drum, UNSET_STAGE)
+        if not all(self.send_batch().values()):
+            raise SignError('Sign rejected drum stage variable files')
         self.set_display('drums')
 
     def _get_sign_datetime(self):
@@ -47,90 +122,255 @@ class LEDSignClient:
 
         return d+t
 
-    def send_to_sign(self, cmd=None, read_dt=False):
-        """ Sends command to Led sign over serial port. Command format outlined
-        in MCS Protocol v3.2.doc
-
-        PARAM
-        cmd     optional command string. If this parameter is unset command
-                in 'self.sign_cmd.cmd' is sent to sign.
+    def _open_port(self):
+        """Opens the serial session to the sign if it is not already open. The
+        session is kept open between commands and is only reopened after an
+        I/O fault.
 
-        A thearding lock is required
-
-        Returns true if message was successfully sent to sign and sign response
-        was "ok". If "ok" is not received after command is sent, resends command
-        up to four times. If after four attempts none were successful then false
-        is returned.
-
-        The multiple attempts to send the command is to identify if the sign
-        requires a power cycle. Every once and in while the sign will not
-        respond to the odd command or two. In which case the command will get
-        through in the four attempts. If this is not the case the sign will not
-        respond to any commands until it has been power cycled.
+        :return: open serial.Serial object
+        :raises SignError: if unable to open serial port
         """
-        received = False
-        attempts = 1
-        dt = ""
+        if self.ser is not None and self.ser.is_open:
+            return self.ser
 
-        if cmd is None:
-            cmd = self.sign_cmd.cmd.encode()
+        try:
+            self.ser = serial.Serial(self.serial_port, self.BAUD_RATE, 
+                                     timeout=self.READ_TIMEOUT)
+        except Exception as exc:
+            self.ser = None
+            LOGGER.error('error opening serial port.\n' +str(exc))
+            raise SignError('Unable to open serial port')
 
-        while not received and attempts < self.sent_attempts:
+        return self.ser
+
+    def _close_port(self):
+        if self.ser is not None:
             try:
-                ser = serial.Serial(self.serial_port, 9600, timeout=3)
+                self.ser.close()
             except Exception as exc:
-                LOGGER.error('error opening serial port.\n' +str(exc))
-                raise SignError('Unable to open serial port')
+                LOGGER.warning(f'error closing serial port. {exc}')
+            self.ser = None
+
+    def close(self):
+        with self.lock:
+            self._close_port()
+
+    def _get_status(self, line):
+        """Returns True if line is an 'ok' reply, False if it is an error reply
+        and None if it is not a status line (e.g. the echoed command)."""
+        token = line.rsplit(b'^C', 1)[-1].strip()
+        if token == self.RESP_OK:
+            return True
+        if token.lower().startswith(self.RESP_ERROR):
+            return False
+        return None
+
+    def _read_response(self, expected=1):
+        """Reads the sign reply incrementally. Returns as soon as 'expected'
+        status lines ('ok' or error), including their line terminator, have 
+        been received or RESP_TIMEOUT seconds have passed without them. A 
+        status line is only parsed once its newline has arrived, so the data 
+        before it is complete. If the reply times out with a status line 
+        missing its newline, that status is still returned.
+
+        :param expected: number of status lines to wait for
+        :return: tuple of raw reply bytes and list of received statuses, 
+            True for 'ok' and False for error
+        """
+        buf = bytearray()
+        statuses = []
+        parsed = 0      # index in buf of first unparsed line
+        deadline = time.monotonic() + self.RESP_TIMEOUT
+
+        while len(statuses) < expected and time.monotonic() < deadline:
+            chunk = self.ser.read(self.ser.in_waiting or 1)
+            if not chunk:
+                continue
+            buf += chunk
+
+            eol = buf.rfind(b'\n')
+            if eol >= parsed:
+                for line in bytes(buf[parsed:eol]).split(b'\n'):
+                    status = self._get_status(line)
+                    if status is not None:
+                        statuses.append(status)
+                parsed = eol + 1
+
+        # last status line may not be followed by a newline
+        if len(statuses) == expected - 1:
+            status = self._get_status(bytes(buf[parsed:]))
+            if status is not None:
+                statuses.append(status)
+
+        return bytes(buf), statuses
+
+    def _transact(self, cmd, expected=1):
+        """ Sends command to Led sign over serial port and reads the reply. 
+        Command format outlined in MCS Protocol v3.2.doc
+
+        The serial session stays open between commands. The reply is parsed as
+        it arrives and the method returns as soon as the sign's 'ok' or error 
+        terminator has been read for each of the 'expected' commands. The port
+        is only closed and reopened when a serial I/O error occurs, a missing 
+        reply just causes the command to be resent.
+
+        If a complete reply is not received, resends command up to 
+        'sent_attempts' - 1 times. The multiple attempts to send the command is
+        to identify if the sign requires a power cycle. Every once and in while
+        the sign will not respond to the odd command or two. In which case the
+        command will get through in the four attempts. If this is not the case
+        the sign will not respond to any commands until it has been power 
+        cycled.
+
+        :param cmd: encoded command 
+        :param expected: number of commands batched in 'cmd'
+        :return: tuple of decoded reply and list of statuses, one per command,
+            True if command was accepted by sign
+        :raises SignError: if no complete reply was received
+        """
+        attempts = 1
 
-            try:
-                while len(cmd) > 1000:
-                    ser.write(cmd[:1000])
-                    cmd = cmd[1000:]
+        with self.lock:
+            while attempts < self.sent_attempts:
+                ser = self._open_port()     # raises SignError on fail
 
-                if len(cmd) <= 1000:
+                try:
+                    ser.reset_input_buffer()    # drop late replies
                     LOGGER.debug(fill(str(cmd.decode()), 80))
-                    ser.write(cmd)
 
-                r = ser.read(2000)
-                r = r.decode()
+                    view = memoryview(cmd)
+                    for i in range(0, len(view), self.WRITE_CHUNK):
+                        ser.write(view[i:i + self.WRITE_CHUNK])
 
-                time.sleep(1)
+                    r, statuses = self._read_response(expected)
+                    r = r.decode()
 
-                if 'ok' in r:
-                    received = True
+                    if len(statuses) == expected and any(statuses):
+                        return r, statuses
 
-                if read_dt:
-                    prefix = len(cmd.decode()[:-2])
-                    dt = r[prefix: -8]
-                    #dt_str = dt[:2] + "-" + dt[2:4] + "-" +dt[4:8] #+ " ["+ dt[9:11] + ":"+ dt[11:13] + ":"+ dt[13:15] + "]"
-                    #print(dt_str)
-
-                ser.close()
-
-                if not received:
-                    time.sleep(2)
                     LOGGER.debug('response: ' + r)
-                    if r is None or r == '':
+                    if r == '':
                         LOGGER.warning('Sign did not respond on attempt' +
                                     str(attempts)+ '. Trying again..')
-                        attempts = attempts + 1
+                    attempts = attempts + 1
+                    time.sleep(self.RETRY_DELAY)
 
-            except Exception as exc:
-                LOGGER.error('error sending ' +str(self.sign_cmd.cmd)+
-                             ' over serial port.\n ' +str(exc))
-                if ser:
-                    ser.close()
+                except Exception as exc:
+                    LOGGER.error('error sending ' +str(cmd)+
+                                 ' over serial port.\n ' +str(exc))
+                    self._close_port()  # reopen on next attempt
+                    attempts = attempts + 1
+
+        raise SignError()
+
+    def send_to_sign(self, cmd=None, read_dt=False):
+        """ Sends command to Led sign and waits for the sign to reply "ok".
+
+        PARAM
+        cmd     optional command string. If this parameter is unset command
+                in 'self.sign_cmd' is sent to sign.
+        read_dt if True returns the data part of the sign reply
+
+        raises SignError() if sign does not accept command
+        """
+        if cmd is None:
+            cmd = self.sign_cmd.cmd_bytes
+
+        r, _ = self._transact(cmd)
 
-        if not received:
-            raise SignError()
-        
         if read_dt:
-            return dt
+            # data is between the echoed command and the ^C before the status
+            prefix = len(cmd.decode()[:-2])
+            end = r.rfind('^C')
+            return r[prefix: end if end >= prefix else len(r)]
+
+    def start_batch(self):
+        """Starts collecting variable file commands. Until send_batch() is 
+        called, set_stage(), set_iso_timer(), update_variable_file() and 
+        update_alert_msg() add their commands to the batch instead of sending 
+        them."""
+        self.batch = []
+
+    def discard_batch(self):
+        """Drops any commands collected since start_batch()"""
+        self.batch = None
+
+    def send_batch(self):
+        """Sends all commands collected since start_batch() to the sign in one
+        transmission and waits for a single reply covering all of them.
+        Commands that would not change the sign's variable files are not sent
+        and are reported as accepted.
+
+        :return: dictionary of variable file name to True if the sign accepted
+            the command writing that file, False otherwise.
+        :raises SignError: if sign does not respond
+        """
+        batch, self.batch = self.batch, None
+        results = {name: True for name, cmd, _ in batch or [] if cmd is None}
+        batch = [entry for entry in batch or [] if entry[1] is not None]
+        if not batch:
+            return results
+
+        for name, _, _ in batch:
+            self.shadow.pop(name, None)     # unknown until sign replies
+
+        self.sign_cmd.batch_cmds([cmd for _, cmd, _ in batch])
+        _, statuses = self._transact(self.sign_cmd.cmd_bytes, len(batch))
+
+        for (name, _, digest), ok in zip(batch, statuses):
+            results[name] = ok
+            if ok:
+                self.shadow[name] = digest
+            else:
+                LOGGER.warning(f'Sign rejected update of {name} in batch')
+        return results
+
+    def _get_digest(self, cmd):
+        return hashlib.blake2b(cmd, digest_size=16).digest()
+
+    def _send_cmd(self, name, digest=None):
+        """Sends command in 'self.sign_cmd' to sign, or adds it to the 
+        current batch if one has been started.
+
+        The command is dropped if the sign last accepted the exact same 
+        content for the variable file.
+
+        :param name: name of variable file written by command
+        :param digest: digest of command if already known
+        :raise SignError: if unable to reach sign 
+        """
+        cmd = self.sign_cmd.cmd_bytes
+        if digest is None:
+            digest = self._get_digest(cmd)
+
+        if self.shadow.get(name) == digest:
+            LOGGER.debug(f'{name} unchanged on sign, not sent')
+            cmd = None
+        elif self.batch is None:
+            self.shadow.pop(name, None)
+            self.send_to_sign()
+            self.shadow[name] = digest
+
+        if self.batch is not None:
+            self.batch.append((name, cmd, digest))
+
+    def clear_shadow(self):
+        """Forgets the variable files and script the sign last accepted. Must
+        be called whenever the sign's memory may have changed without this 
+        client, e.g. after a power cycle."""
+        self.shadow = {}
+        self.playing_script = None
 
     def reset_sign(self):
+        self.clear_shadow()
         self.sign_cmd.reset_sign()
         self.send_to_sign()     
 
+    def clear_memory(self):
+        self.clear_shadow()
+        self.sign_cmd.clear_memory()
+        self.send_to_sign()
+
     def set_iso_timer(self, drum, dur, iso_valve):
         """
         Must get dt_str first as it is needed for command that sets the the
@@ -158,15 +398,20 @@ class LEDSignClient:
         self.sign_cmd.set_color('red')
         self.sign_cmd.add_countdown(dt_str=dt_str, secs=dur.seconds)
         self.sign_cmd.end_cmd()
-        self.send_to_sign() 
+        self._send_cmd(get_drum_state_file(drum))
+
+    def has_timer_display(self, name):
+        """True if the sign has a display for timer type 'name'"""
+        return name in self.timer_writers
 
     def set_timer(self, name, drum, dur, details):
-        if name == ISO_TIMER:
-            self.set_iso_timer(drum, dur, details)
-        else:
-            pass    #### ADD TIMERS here ####    
+        writer = self.timer_writers.get(name)
+        if writer is None:
+            LOGGER.warning(f'No sign display for timer type {name}')
+            return
+        writer(drum, dur, details)
 
-    def set_stage(self, drum, stage):
+    def _build_stage_cmd(self, drum, stage):
         self.sign_cmd.start_cmd()
         self.sign_cmd.write_to_var(get_drum_state_file(drum))
         self.sign_cmd.set_font(STAGE_FONT)
@@ -174,7 +419,20 @@ class LEDSignClient:
         self.sign_cmd.set_color(get_stage_color(stage))
         self.sign_cmd.set_text(get_stage_name(stage))   
         self.sign_cmd.end_cmd()
-        self.send_to_sign()
+        return self.sign_cmd.freeze()
+
+    def set_stage(self, drum, stage):
+        """Sends the pre-rendered command of the drum and stage from the stage 
+        table. Stages missing from the table are rendered on the fly."""
+        entry = self.stage_index.get((drum, stage))
+        if entry is None:
+            self._build_stage_cmd(drum, stage)
+            self._send_cmd(get_drum_state_file(drum))
+            return
+
+        start, end, digest = entry
+        self.sign_cmd.load(memoryview(self.stage_table)[start:end])
+        self._send_cmd(get_drum_state_file(drum), digest)
 
     def update_variable_file(self, msg, file_name):
         """Updates the message variable file that is embeded in notify.txt, 
@@ -201,7 +459,7 @@ class LEDSignClient:
             self.sign_cmd.set_text(lines[i])
 
         self.sign_cmd.end_cmd()
-        self.send_to_sign() 
+        self._send_cmd(file_name)
 
     def update_alert_msg(self, txt, deck):
         '''Updates signs alarm and deck variable files.
@@ -219,6 +477,10 @@ class LEDSignClient:
         deck: A string containing the deck code for the locations of the 
                 alarms in txt.
 
+        Both variable files are sent to the sign in one batch. If a batch is 
+        already open they are added to it and sent by the caller's 
+        send_batch().
+
         RETURNS
         =======      
         If update successful, returns the string of the alert message being 
@@ -229,33 +491,34 @@ class LEDSignClient:
             LOGGER.error(f'Invalid deck recevied in update_alert_msg() {deck}')
             return ""
         
-        self.sign_cmd.start_cmd()
-        self.sign_cmd.write_to_var('alarm') 
-        self.sign_cmd.set_color('white')
-        self.sign_cmd.set_text(txt)
-        self.sign_cmd.end_cmd()
-        self.send_to_sign()
-
-        msg = txt + 'detected on '
-        if deck == BOTH_DECKS:
-            txt = 'SWITCH & CUT'
-        elif deck == SWITCH_DECK:
-            txt = 'SWITCH'
-        elif deck == CUT_DECK:
-            txt = 'CUT'
-
-        self.sign_cmd.start_cmd()
-        self.sign_cmd.write_to_var('deck')
-        self.sign_cmd.set_text(txt)
-        self.sign_cmd.end_cmd()
-        self.send_to_sign()
-
-        return msg + txt + ' deck'
+        own_batch = self.batch is None
+        if own_batch:
+            self.start_batch()
+        try:
+            self.sign_cmd.load(self.alarm_cmd)
+            self.sign_cmd.set_text(txt)
+            self.sign_cmd.end_cmd()
+            self._send_cmd('alarm')
+
+            deck_txt, template = self.deck_cmds[deck]
+            self.sign_cmd.load(template)
+            self._send_cmd('deck')
+
+            if own_batch:
+                results = self.send_batch()
+                if not all(results.values()):
+                    raise SignError('Sign rejected alert variable files')
+        finally:
+            if own_batch:
+                self.discard_batch()
+
+        return txt + 'detected on ' + deck_txt + ' deck'
 
     def set_display(self, display_, msg="", decks="", update_script=True):
         """ Updates the necessary variable files and script file playing on 
         the sign. An error display is handled as notify display by sign.
         If display is 'drums and update_script if False, does nothing.
+        The script is not replayed if the sign is already playing it.
 
         Varibale file name will match display name
 
@@ -274,31 +537,22 @@ class LEDSignClient:
 
         if display == 'error':  # treat error as notify
             display = 'notify'
+
+        # only need to play script if not already playing
+        if display == self.playing_script:
+            update_script = False
+
+        if update_script:
+            self.reset_sign()   # stop playing current script
         
         if display in ['info', 'danger', 'warning', 'notify']:
             self.update_variable_file(msg, file_name=display)
         elif display == 'alert':
             msg = self.update_alert_msg(msg, decks)
 
-        # only need to play script if not already playing
         if update_script:
-            self.reset_sign()   # stop playing current script
             self.sign_cmd.play_script(display)
             self.send_to_sign()  # raises SignError() on fail
+            self.playing_script = display
 
         return msg
-    
-    def get_sign_lease(self):
-        """Return true is successful obtained sign lease, otherwise false"""
-        # wait for sign not to be busy
-        for _ in range(5):
-            if not self.sign_busy:
-                self.sign_busy = True 
-                return True
-            time.sleep(4)
-
-        raise SignLeaseError()    
-
-    def return_sign_lease(self):
-        self.sign_busy = False
-
@@ -1,14 +1,84 @@
 from datetime import datetime as dt, timedelta
 from helpers import int_to_bytes
 
+# Lookup tables of command codes. Where a method matched its argument with
+# substring checks, the table order is the order of those checks.
+FONTS = {
+    0: b'$AR12$',   1: b'$AR16$',   2: b'$AR24$',   3: b'$ARN9$',
+    4: b'$SS4$',    # old timer font -> only has [1 - 9, :]
+    5: b'$SS5$',
+    6: b'$SS7$',    # old timer font
+    7: b'$SS8$',    # iso timer font
+    8: b'$SS15$',   9: b'$SS16$',   10: b'$SS24$',  11: b'$SF7$',
+    12: b'$SF8$',   13: b'$SF10$',  14: b'$SF15$',  15: b'$SF16$',
+    16: b'$SF24$',  17: b'$SMA$',   18: b'$FX7$',   19: b'$FX15$',
+    20: b'$FXC$',   # Drum Label -> only Has [1, 2, 3, A, B]
+    21: b'$TM12$',  22: b'$TM16$',  23: b'$TM24$',
+    24: b'$TT$',    # Alert msg font
+    25: b'$ISO7$',  # Timer font
+    26: b'$CS15$',  # Stage font
+    27: b'$IM15$',  # Custom msg Label font
+}
+
+COLORS = {
+    'red': b'0',        'green': b'1',      'yellow': b'2',
+    'rain': b'3',       'blue': b'$BLU$',   'purple': b'$PUR$',
+    'white': b'$WHT$',  'pink': b'$F:rgb(159,43,104)$',
+}
+
+EFFECTS = {
+    'explode': b'$EXP$',    'pac': b'$PAC$',    'scroll': b'$SCU$',
+    'sleft': b'$SCL$',      'flash': b'F',      'slide': b'C',
+}
+
+POSITIONS = { 'mid': b'M', 'top': b'T', 'right': b'R', 'left': b'L' }
+
+ALIGNMENTS = {
+    'lt': b'0',     # left, top
+    'ct': b'1',     # center, top
+    'rt': b'2',     # right, top
+    'lm': b'3',     # left, middle
+    'rm': b'5',     # right, middle
+    'lb': b'6',     # left, bottom
+    'cb': b'7',     # center, bottom
+    'rb': b'8',     # right, bottom
+}
+
+DATE_TIME = {
+    'time24': b'^K19',  'time': b'^K19',    'time12': b'^K18',
+    # needs to be tested, not sure if text ('/') will work in between ^K
+    'num_date': b'^K10/^K11/^K12',          'date': b'^K10/^K11/^K12',
+    # needs to be tested, not sure if text will work in between ^K
+    'full_txt_date': b'^K77, ^K75 ^K00^K6E, ^k03',
+    'txt_data': b'^K77, ^K75 ^K00^K6E, ^k03',
+}
+
+# script files played for each sign display
+SCRIPTS = ('drums', 'danger', 'warning', 'info', 'notify', 'alert')
+
+
+def _lookup(table, key, default=None):
+    """Returns the code in 'table' for 'key'. Falls back to the code of the
+    first table entry whose name is in 'key', e.g. 'light red' -> red."""
+    code = table.get(key) if type(key) == str else None
+    if code is not None:
+        return code
+
+    for name, code in table.items():
+        if name in key:
+            return code
+    return default
+
+
 class LEDSignCommand:
     """Holds all the codes needed for the LED sign commands as outlined in
     MCS Protocol v3.2
 
-    Calls to functions set or append to self.cmd. When command is complete it
-    can send 'self.cmd' to the LED sign.
+    Calls to functions set or append to the command buffer 'self.buf'. When
+    command is complete 'self.cmd_bytes' can be sent to the LED sign.
+    'self.cmd' holds the same command as a string.
 
-    Partial command codes append to 'self.cmd'.
+    Partial command codes append to 'self.buf'.
 
     METHODS THAT CREATE PARTIAL COMMANDS:
         start_cmd()                 end_cmd()                   write_to_txt()
@@ -26,15 +96,21 @@ class LEDSignCommand:
         read_date()                 set_time()                  read_time()
         set_sign_address()          turn_off_sign()             turn_on_sign()
         get_free_memory()           list_files()                read_file()
+        batch_cmds()
 
 
     User can create a command by calling one of the complete command methods
     or by calling start_cmd() followed by one or more partial command methods,
-    followed by end_cmd(). """
+    followed by end_cmd().
+
+    Commands that are sent often can be frozen with freeze() and later
+    restored into the buffer with load(). The play_script() commands for each
+    display are frozen when the object is created. """
 
     def __init__(self, sign_addr):
         self.sign_addr = sign_addr
-        self.cmd = None
+        self.buf = bytearray()
+        self.header = b'^B' + sign_addr.encode()
         self.font = 4
         self.timer_font = 2
         self.stage_font = 1
@@ -42,204 +118,127 @@ class LEDSignCommand:
         self.drum_color = 'white'
         self.pause = 6        # secs between page flip for multi-line msgs
 
+        self.scripts = {}
+        for display in SCRIPTS:
+            self.play_script(display)
+            self.scripts[display] = self.freeze()
+        self.buf.clear()
+
+    @property
+    def cmd(self):
+        return self.buf.decode()
+
+    @property
+    def cmd_bytes(self):
+        return bytes(self.buf)
+
+    def freeze(self):
+        """Returns immutable copy of the command in the buffer"""
+        return bytes(self.buf)
+
+    def load(self, template):
+        """Replaces command in the buffer with a frozen command"""
+        self.buf[:] = template
+
     #--- PARTIAL COMMAND METHODS -----------------------------------------------
 
     def start_cmd(self):
-        self.cmd = '^B' + self.sign_addr+ '^A'
+        self.buf[:] = self.header
+        self.buf += b'^A'
 
     def end_cmd(self):
-        self.cmd = self.cmd + '^C'
+        self.buf += b'^C'
 
     def append_cmd(self):
-        self.cmd = '^A'
+        self.buf += b'^A'
 
     def write_to_txt(self, filename):
-        self.cmd = self.cmd + 'A$' + filename + '$'
+        self.buf += b'A$' + filename.encode() + b'$'
 
     def write_to_var(self, filename):
-        self.cmd = self.cmd + 'B$' + filename + '$'
+        self.buf += b'B$' + filename.encode() + b'$'
 
     def set_effect(self, effect='H'):
-        self.cmd = self.cmd + '^E'
-        if 'explode' in effect:
-            self.cmd = self.cmd + '$EXP$'
-        elif 'pac' in effect:
-            self.cmd = self.cmd + '$PAC$'
-        elif 'scroll' in effect:
-            self.cmd = self.cmd + '$SCU$'
-        elif 'sleft' in effect:
-            self.cmd = self.cmd + '$SCL$'
-        elif 'flash' in effect:
-            self.cmd = self.cmd + 'F'
-        elif 'slide' in effect:
-            self.cmd = self.cmd + 'C'
-        else:
-            self.cmd = self.cmd + 'H'
+        self.buf += b'^E'
+        self.buf += _lookup(EFFECTS, effect, b'H')
 
     def set_position(self, pos=None, x=0, y=0, w=256, h=32, a=4):
-        self.cmd = self.cmd + '^P'
+        self.buf += b'^P'
         if pos is not None:
-            if 'mid' in pos:
-                self.cmd = self.cmd + 'M'
-            elif 'top' in pos:
-                self.cmd = self.cmd + 'T'
-            elif 'right' in pos:
-                self.cmd = self.cmd + 'R'
-            elif 'left' in pos:
-                self.cmd = self.cmd + 'L'
-            else:   #fill
-                self.cmd = self.cmd + 'F'
+            self.buf += _lookup(POSITIONS, pos, b'F')   # default fill
         else:
-            self.cmd = self.cmd + '$' + str(x) + ',' + str(y) + ',' + str(w) \
-                + ',' + str(h) + ',' + str(a) + '$'
+            self.buf += f'${x},{y},{w},{h},{a}$'.encode()
 
     def set_character_attribute(self, attribute):
-        self.cmd = self.cmd + '^H'
+        self.buf += b'^H'
         if 'flashOFF' in attribute:
-            self.cmd = self.cmd + '0'
+            self.buf += b'0'
         elif 'flashON' in attribute:
-            self.cmd = self.cmd + '1'
+            self.buf += b'1'
 
         if 'wideOFF' in attribute:
-            self.cmd = self.cmd + '2'
+            self.buf += b'2'
         elif 'wideON' in attribute:
-            self.cmd = self.cmd + '3'
+            self.buf += b'3'
 
         if 'boldOFF' in attribute:
-            self.cmd = self.cmd + '4'
+            self.buf += b'4'
         elif 'boldON' in attribute:
-            self.cmd = self.cmd + '5'
+            self.buf += b'5'
 
     def set_font(self, font):
-        self.cmd = self.cmd + '^F'
-        if font == 0:
-            self.cmd = self.cmd + '$AR12$'
-        elif font == 1:
-            self.cmd = self.cmd + '$AR16$'
-        elif font == 2:
-            self.cmd = self.cmd + '$AR24$'
-        elif font == 3:
-            self.cmd = self.cmd + '$ARN9$'
-        # old timer font -> only has [1 - 9, :]
-        elif font == 4:
-            self.cmd = self.cmd + '$SS4$'
-        elif font == 5:
-            self.cmd = self.cmd + '$SS5$'
-        # old timer font
-        elif font == 6:
-            self.cmd = self.cmd + '$SS7$'
-        # iso timer font
-        elif font == 7:
-            self.cmd = self.cmd + '$SS8$'
-        elif font == 8:
-            self.cmd = self.cmd + '$SS15$'
-        elif font == 9:
-            self.cmd = self.cmd + '$SS16$'
-        elif font == 10:
-            self.cmd = self.cmd + '$SS24$'
-        elif font == 11:
-            self.cmd = self.cmd + '$SF7$'
-        elif font == 12:
-            self.cmd = self.cmd + '$SF8$'
-        elif font == 13:
-            self.cmd = self.cmd + '$SF10$'
-        elif font == 14:
-            self.cmd = self.cmd + '$SF15$'
-        elif font == 15:
-            self.cmd = self.cmd + '$SF16$'
-        elif font == 16:
-            self.cmd = self.cmd + '$SF24$'
-        elif font == 17:
-            self.cmd = self.cmd + '$SMA$'
-        elif font == 18:
-            self.cmd = self.cmd + '$FX7$'
-        elif font == 19:
-            self.cmd = self.cmd + '$FX15$'
-        # Drum Label -> only Has [1, 2, 3, A, B]
-        elif font == 20:
-            self.cmd = self.cmd + '$FXC$'
-        elif font == 21:
-            self.cmd = self.cmd + '$TM12$'
-        elif font == 22:
-            self.cmd = self.cmd + '$TM16$'
-        elif font == 23:
-            self.cmd = self.cmd + '$TM24$'
-        # Alert msg font
-        elif font == 24:
-            self.cmd = self.cmd + '$TT$'
-        # Timer font
-        elif font == 25:
-            self.cmd = self.cmd + '$ISO7$'
-        # Stage font
-        elif font == 26:
-            self.cmd = self.cmd + '$CS15$'
-        # Custom msg Label font
-        elif font == 27:
-            self.cmd = self.cmd + '$IM15$'
-        else:
-            self.cmd = self.cmd + '$' + str(font) + '$'
+        self.buf += b'^F'
+        code = FONTS.get(font)
+        if code is None:
+            code = b'$' + str(font).encode() + b'$'
+        self.buf += code
 
     def set_color(self, color):
-        self.cmd = self.cmd + '^O'
-        if 'red' in color:
-            self.cmd = self.cmd + '0'
-        elif 'green' in color:
-            self.cmd = self.cmd + '1'
-        elif 'yellow' in color:
-            self.cmd = self.cmd + '2'
-        elif 'rain' in color:
-            self.cmd = self.cmd + '3'
-        elif 'blue' in color:
-            self.cmd = self.cmd + '$BLU$'
-        elif 'purple' in color:
-            self.cmd = self.cmd + '$PUR$'
-        elif 'white' in color:
-            self.cmd = self.cmd + '$WHT$'
-        elif 'pink' in color:
-            self.cmd = self.cmd + '$F:rgb(159,43,104)$'
-        else:
-            self.cmd = self.cmd + '$F:rgb' + str(color) + '$'
+        self.buf += b'^O'
+        code = _lookup(COLORS, color)
+        if code is None:
+            code = b'$F:rgb' + str(color).encode() + b'$'
+        self.buf += code
 
     def set_pause(self, s):
         s_hex = int_to_bytes(s, 1).hex()
-        self.cmd = self.cmd + '^J' + s_hex
+        self.buf += b'^J' + s_hex.encode()
 
     def add_new_line(self):
-        self.cmd = self.cmd + '^M'
+        self.buf += b'^M'
 
     def add_new_page(self):
-        self.cmd = self.cmd + '^L'
+        self.buf += b'^L'
 
     def add_tab_control(self, a, pos=None):
         """ Optional param 'pos' is 1-4 decimal chars which is the absolute
         coord in horizontal """
-        self.cmd = self.cmd + '^T'
+        self.buf += b'^T'
         if pos is not None:
-            self.cmd = self.cmd + '$'
+            self.buf += b'$'
 
         if 'left' in a:
-            self.cmd = self.cmd + '0'
+            self.buf += b'0'
         elif 'right' in a:
-            self.cmd = self.cmd + '1'
+            self.buf += b'1'
         elif 'center' in a:
-            self.cmd = self.cmd + '2'
-        elif 'decimal point':
-            self.cmd = self.cmd + '3'
+            self.buf += b'2'
+        else:                   # decimal point
+            self.buf += b'3'
 
         if pos is not None:
-            self.cmd = self.cmd + ',' + str(pos) + '$'
+            self.buf += b',' + str(pos).encode() + b'$'
 
     def add_countdown(self, dt_str=None, mins=0, secs=0):
         if dt_str is None:
             now = dt.now()
         else:
-            now = dt(int(dt_str[4:8]), int(dt_str[:2]), int(dt_str[2:4]), 
+            now = dt(int(dt_str[4:8]), int(dt_str[:2]), int(dt_str[2:4]),
                      int(dt_str[9:11]), int(dt_str[11:13]), int(dt_str[13:15]))
-            #print(now)
 
         delay = now + timedelta(minutes=mins, seconds=secs)
         countdown = delay.strftime("%m-%d-%Y %H:%M:%S")
-        self.cmd = self.cmd + '^R$16, ' + countdown + '$'
+        self.buf += b'^R$16, ' + countdown.encode() + b'$'
 
     def add_date_time(self, element):
         """ ^K followed by two ASCII characters
@@ -268,69 +267,43 @@ class LEDSignCommand:
                 D   AM/PM as two characters AM/PM
                 E   suffix of the dat like 'st','nd', 'rd', ot 'th'
         """
-        if element in ['time24', 'time']:
-            self.cmd = self.cmd + '^K19'
-        elif element in ['time12']:
-            self.cmd = self.cmd + '^K18'
-        elif element in ['num_date', 'date']:
-            # needs to be tested, not sure if text ('/') will work in between ^K
-            self.cmd = self.cmd + '^K10/^K11/^K12'
-        elif element in ['full_txt_date', 'txt_data']:
-            # needs to be tested, not sure if text will work in between ^K
-            self.cmd = self.cmd + '^K77, ^K75 ^K00^K6E, ^k03'
+        self.buf += DATE_TIME.get(element, b'')
 
     def set_vspace(self, space):
         """ 'space' param is one character '0' to '9' """
-        self.cmd = self.cmd + '^U$3,' + str(space) + '$'
+        self.buf += b'^U$3,' + str(space).encode() + b'$'
 
     def set_hspace(self, space):
         """ 'space' param is one character '0' to '9' """
-        self.cmd = self.cmd + '^U$2,' + str(space) + '$'
+        self.buf += b'^U$2,' + str(space).encode() + b'$'
 
     def set_speed(self, speed):
         """ 'speed' must be a characters between '1' and '8', where 1 is slow
         and 8 is fast. NOTE: default speed is 3"""
         assert type(speed) == str
-        self.cmd = self.cmd + '^I' + speed
+        self.buf += b'^I' + speed.encode()
 
     def set_text_alignment(self, a):
-        self.cmd = self.cmd + '^U'
-        if 'lt' in a:       # left, top
-            self.cmd = self.cmd + '0'
-        elif 'ct' in a:     # center, top
-            self.cmd = self.cmd + '1'
-        elif 'rt' in a:     # right, top
-            self.cmd = self.cmd + '2'
-        elif 'lm' in a:     # left, middle
-            self.cmd = self.cmd + '3'
-        elif 'rm' in a:     # right, middle
-            self.cmd = self.cmd + '5'
-        elif 'lb' in a:     # left, bottom
-            self.cmd = self.cmd + '6'
-        elif 'cb' in a:     # center, bottom
-            self.cmd = self.cmd + '7'
-        elif 'rb' in a:     # right, bottom
-            self.cmd = self.cmd + '8'
-        else:               # center, middle
-            self.cmd = self.cmd + '4'
+        self.buf += b'^U'
+        self.buf += _lookup(ALIGNMENTS, a, b'4')    # default center, middle
 
     def set_text(self, txt):
-        self.cmd = self.cmd + txt
+        self.buf += txt.encode()
 
     def embed_gif_file(self, filename):
         fn = filename.split('.')[0] + '.gif'
-        self.cmd = self.cmd + '^S$' + fn + '$'
+        self.buf += b'^S$' + fn.encode() + b'$'
 
     def embed_bmp_file(self, filename):
         fn = filename.split('.')[0] + '.bmp'
-        self.cmd = self.cmd + '^S$' + fn + '$'
+        self.buf += b'^S$' + fn.encode() + b'$'
 
     def embed_var_file(self, filename):
-        self.cmd = self.cmd + '^N$' + filename + '$'
+        self.buf += b'^N$' + filename.encode() + b'$'
 
     def add_beep(self, b):
         """ b is character between '1' and '4' """
-        self.cmd = self.cmd + '^V' + str(b)
+        self.buf += b'^V' + str(b).encode()
 
     #-- COMPLETE COMMAND METHODS -----------------------------------------------
 
@@ -338,7 +311,7 @@ class LEDSignCommand:
         """filename should not include .EXT"""
         hex_size = int_to_bytes(size, 2).hex()
         self.start_cmd()
-        self.cmd = self.cmd + 'CSM$' + filename + '$V' + hex_size
+        self.buf += b'CSM$' + filename.encode() + b'$V' + hex_size.encode()
         self.end_cmd()
 
     def allocate_memory(self, size, filename):
@@ -347,26 +320,31 @@ class LEDSignCommand:
         file to sign."""
         self.start_cmd()
         hex_size = int_to_bytes(size, 4).hex()
-        self.cmd = self.cmd + 'CFM' + filename + '=' + hex_size
+        self.buf += b'CFM' + filename.encode() + b'=' + hex_size.encode()
         self.end_cmd()
 
     def play_script(self, filename, reset=True):
+        template = self.scripts.get(filename)
+        if template is not None:
+            self.load(template)
+            return
+
         if filename[-3:] != '.sh':
             filename = filename + '.sh'
 
         self.start_cmd()
         #self.cmd = self.cmd + 'E$cmd$play {' + filename + '}
         #from {21/11/2021 14:52} to {21/11/2022 15:0}^C'
-        self.cmd = self.cmd + 'E$cmd$play {' + filename + '}^C'
+        self.buf += b'E$cmd$play {' + filename.encode() + b'}^C'
 
     def reset_sign(self):
         self.start_cmd()
-        self.cmd = self.cmd + 'CQR'
+        self.buf += b'CQR'
         self.end_cmd()
 
     def clear_memory(self):
         self.start_cmd()
-        self.cmd = self.cmd + 'CCM'
+        self.buf += b'CCM'
         self.end_cmd()
 
     def set_date(self, mm, dd, yyyy, x):
@@ -376,7 +354,7 @@ class LEDSignCommand:
             x = day of week, 0=Sunday to 6=Saturday
         """
         self.start_cmd()
-        self.cmd = self.cmd + 'CSD' + mm + dd + yyyy + x
+        self.buf += b'CSD' + (mm + dd + yyyy + x).encode()
         self.end_cmd()
 
     def set_time(self, hh, mm, ss):
@@ -385,50 +363,63 @@ class LEDSignCommand:
             ss = second, '00' to '59'
         """
         self.start_cmd()
-        self.cmd = self.cmd + 'CST' + hh + mm + ss
+        self.buf += b'CST' + (hh + mm + ss).encode()
         self.end_cmd()
 
     def read_date(self):
         self.start_cmd()
-        self.cmd = self.cmd + 'CRD'
+        self.buf += b'CRD'
         self.end_cmd()
 
     def read_time(self):
         self.start_cmd()
-        self.cmd = self.cmd + 'CRT'
+        self.buf += b'CRT'
         self.end_cmd()
 
     def set_brightness(self, b):
         self.start_cmd()
-        self.cmd = self.cmd + 'CWFbrightmode=0\r\nbrightness=' + b + '\r\n^C'
+        self.buf += b'CWFbrightmode=0\r\nbrightness=' + b.encode() + b'\r\n^C'
 
     def set_sign_address(self, addr):
         """ addr param must be a hex string between '0' and 'FF' """
         self.start_cmd()
-        self.cmd = self.cmd + 'CSA' + addr
+        self.buf += b'CSA' + addr.encode()
         self.end_cmd()
 
     def turn_off_sign(self):
         self.start_cmd()
-        self.cmd = self.cmd + 'CPF'
+        self.buf += b'CPF'
         self.end_cmd()
 
     def turn_on_sign(self):
         self.start_cmd()
-        self.cmd = self.cmd + 'CPO'
+        self.buf += b'CPO'
         self.end_cmd()
 
     def get_free_memory(self):
         self.start_cmd()
-        self.cmd = self.cmd + 'CRM'
+        self.buf += b'CRM'
         self.end_cmd()
 
     def list_files(self):
         self.start_cmd()
-        self.cmd = self.cmd + 'CFL*.*'
+        self.buf += b'CFL*.*'
         self.end_cmd()
 
     def read_file(self, filename):
         self.start_cmd()
-        self.cmd = self.cmd + 'CFR' + filename
+        self.buf += b'CFR' + filename.encode()
+        self.end_cmd()
+
+    def batch_cmds(self, cmds):
+        """ Joins complete commands into one transmission,
+            ^B addr ^A cmd_1 ^A cmd_2 ... ^A cmd_n ^C
+        The sign replies to each command in the order they were sent.
+
+        'cmds' is a list of complete encoded commands created by this object
+        """
+        header = len(self.header)
+        self.buf[:] = self.header
+        for cmd in cmds:
+            self.buf += cmd[header:-2]   # keep ^A, drop ^C
         self.end_cmd()
@@ -0,0 +1,200 @@
+import argparse
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+
+LOGGER = logging.getLogger(__name__)
+
+# command code -> name used in report
+COMMANDS = { '1': 'custom_msg', '2': 'drums_display', '3': 'current_display' }
+
+class IntercomSink:
+    """Simulated intercom endpoint. Accepts connections on 'self.port' and
+    discards what is sent, so IntercomClient.send_to_intercom() succeeds.
+    Point the INTERCOM HOST/PORT settings at it."""
+    def __init__(self, host='127.0.0.1', port=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen()
+        self.host, self.port = self.sock.getsockname()
+        self.messages = 0
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                while conn.recv(4096):
+                    pass
+            self.messages += 1
+
+
+class LoadTest:
+    """
+    Runs 'clients' concurrent request loops against a running
+    AnnunciatorServer, each sending a random mix of custom message (1),
+    drums display (2) and current display (3) requests using the same byte
+    protocol as SignController.cs.
+
+    Every request records its latency from connect to the last byte read
+    and its outcome (ACK, NAK, BUSY, POWERCYCLE, ALERT, OK for current
+    display replies, or ERROR for socket errors/timeouts).
+    """
+    def __init__(self, host, port, client_code='A', clients=10, duration=30,
+                 mix=(1, 1, 8), timeout=30, seed=None):
+        self.host = host
+        self.port = port
+        self.client_code = client_code
+        self.clients = clients
+        self.duration = duration
+        self.cmds = random.Random(seed).choices(
+            list(COMMANDS), weights=mix, k=100000)
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.results = defaultdict(list)    # cmd -> [(latency, outcome)]
+
+    def _recv_all(self, sock):
+        """Reads until server closes connection"""
+        data = b''
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                return data
+            data += chunk
+
+    def _request(self, cmd, n):
+        """Sends one request, returns outcome string"""
+        with socket.create_connection((self.host, self.port),
+                                      timeout=self.timeout) as sock:
+            # don't let Nagle's algorithm add to the measured latency
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.sendall((self.client_code + cmd).encode())
+
+            if cmd == '1':
+                resp = sock.recv(1024).decode().strip()
+                if resp != 'ACK':
+                    return resp or 'ERROR'
+
+                # <msg_type><dur_code><msg_text>, 3 = info, 0 = 5 mins
+                msg = f'30Load test message {n}'
+                sock.sendall(f'{len(msg):03d}'.encode())
+                sock.sendall(msg.encode())
+
+            resp = self._recv_all(sock).decode().strip()
+            if cmd == '3':
+                return 'OK' if resp else 'ERROR'
+
+            for outcome in ['POWERCYCLE', 'BUSY', 'ALERT', 'NAK', 'ACK']:
+                if resp.startswith(outcome):
+                    return outcome
+            return resp or 'ERROR'
+
+    def _client(self, idx, deadline):
+        n = idx
+        while time.monotonic() < deadline:
+            cmd = self.cmds[n % len(self.cmds)]
+            start = time.monotonic()
+            try:
+                outcome = self._request(cmd, n)
+            except (OSError, UnicodeDecodeError) as exc:
+                LOGGER.debug(f'client {idx} - {exc}')
+                outcome = 'ERROR'
+
+            with self.lock:
+                self.results[cmd].append((time.monotonic() - start, outcome))
+            n += self.clients
+
+    def run(self):
+        deadline = time.monotonic() + self.duration
+        threads = [threading.Thread(target=self._client, args=(i, deadline))
+                   for i in range(self.clients)]
+        start = time.monotonic()
+        for tr in threads:
+            tr.start()
+        for tr in threads:
+            tr.join()
+        return self.report(time.monotonic() - start)
+
+    def report(self, elapsed):
+        """Returns dictionary of results, overall and per command"""
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+        report = {
+            'host': self.host, 'port': self.port, 'clients': self.clients,
+            'elapsed_s': round(elapsed, 3),
+            'requests': sum(len(r) for r in self.results.values()),
+            'commands': {},
+        }
+        report['throughput_rps'] = round(report['requests'] / elapsed, 2)
+
+        for cmd, results in sorted(self.results.items()):
+            latencies = sorted(lat for lat, _ in results)
+            outcomes = Counter(outcome for _, outcome in results)
+            report['commands'][COMMANDS[cmd]] = {
+                'requests': len(results),
+                'throughput_rps': round(len(results) / elapsed, 2),
+                'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+                'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                'max_ms': round(latencies[-1] * 1000, 2),
+                'outcomes': dict(outcomes),
+                'rates': {o: round(c / len(results), 4)
+                          for o, c in outcomes.items()},
+            }
+        return report
+
+
+# ------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Load test the AnnunciatorServer socket protocol')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--client-code', default='A', choices=['A', 'B'])
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=30, help='secs')
+    parser.add_argument('--mix', default='1,1,8',
+        help='weights of custom msg, drums display, current display requests')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--out', help='write JSON report to file')
+    parser.add_argument('--endpoints', action='store_true',
+        help='start simulated sign and intercom, print settings and wait')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.endpoints:
+        from sign_simulator import SignSimulator
+        sign = SignSimulator()
+        intercom = IntercomSink()
+        print('[LED SIGN]\nSERIAL_PORT = ' + sign.port)
+        print(f'[INTERCOM]\nHOST = {intercom.host}\nPORT = {intercom.port}')
+        print('Start the AnnunciatorServer with these settings, then press '
+              'Enter to start the load test.')
+        input()
+
+    test = LoadTest(args.host, args.port, args.client_code, args.clients,
+                    args.duration, [float(w) for w in args.mix.split(',')],
+                    args.timeout, args.seed)
+    report = test.run()
+
+    if args.endpoints:
+        report['sign'] = sign.stats
+        report['intercom_messages'] = intercom.messages
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(out)
+    print(out)
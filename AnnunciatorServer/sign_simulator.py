@@ -0,0 +1,247 @@
+import argparse
+import logging
+import os
+import pty
+import random
+import select
+import signal
+import threading
+import time
+import tty
+from datetime import datetime as dt
+
+LOGGER = logging.getLogger(__name__)
+
+class SignSimulator:
+    """
+    Simulates the LED sign on a pseudo-terminal so LEDSignClient,
+    LEDSignCommand and Annunciator can be run without the physical sign.
+    Point the LED SIGN SERIAL_PORT setting at 'self.port'.
+
+    Speaks the subset of MCS Protocol v3.2 used by LEDSignCommand,
+        ^B addr ^A cmd_1 [^A cmd_2 ...] ^C
+
+        B$file$...          write variable file
+        A$file$...          write text file
+        E$cmd$play {x.sh}   play script
+        CQR                 reset sign, stops playing script
+        CCM                 clear memory
+        CRD / CRT           read date (MMDDYYYYw) / time (HHMMSS)
+        CFL*.*              list files
+        CSD / CST / CPF / CPO / CSM / CFM     accepted and ignored
+
+    The reply echoes the frame without its ^C, then for each command sends
+    any data it returns followed by '^C\\r\\nok\\r\\n', or '^C\\r\\nerror\\r\\n'
+    for commands the simulator does not recognise.
+
+    Transmission time at 'baud' is modelled for both the command and the
+    reply. The reply is written 'chunk' bytes at a time, like the sign's 
+    UART, so the client sees partial replies as it would on the real port. 
+    Faults can be injected with 'latency' (secs before replying),
+    'drop_rate' (probability a reply is never sent) and 'hang_after' (number
+    of commands after which the sign stops replying until power_cycle() is
+    called).
+    """
+    def __init__(self, addr='01', baud=9600, latency=0.05, drop_rate=0.0,
+                 hang_after=None, boot_time=0, seed=None, chunk=16):
+        self.addr = addr
+        self.baud = baud
+        self.chunk = chunk
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.hang_after = hang_after
+        self.boot_time = boot_time
+        self.random = random.Random(seed)
+
+        self.var_files = {}
+        self.text_files = {}
+        self.playing = None
+        self.hung = False
+        self.stats = {'frames': 0, 'commands': 0, 'errors': 0,
+                      'dropped': 0, 'ignored': 0}
+
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)     # no echo or line processing on the port
+        self.port = os.ttyname(self.slave)
+
+        self.exit_flag = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def _tx_time(self, n):
+        """Secs to transmit n bytes, 10 bits per byte (8N1)"""
+        return n * 10 / self.baud
+
+    def hang(self):
+        with self.lock:
+            self.hung = True
+
+    def power_cycle(self):
+        """Sign reboots, files are kept but no script is playing"""
+        with self.lock:
+            self.hung = True
+        time.sleep(self.boot_time)
+        with self.lock:
+            self.hung = False
+            self.playing = None
+            self.stats['commands'] = 0      # restart hang_after count
+        LOGGER.info('Sign simulator power cycled')
+
+    def stop(self):
+        self.exit_flag = True
+        self.thread.join()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _run_cmd(self, cmd):
+        """Runs one command from a frame.
+
+        :param cmd: command text between ^A and the next ^A or ^C
+        :return: tuple of reply data and True if command was accepted
+        """
+        if cmd.startswith('B$') or cmd.startswith('A$'):
+            name, _, content = cmd[2:].partition('$')
+            files = self.var_files if cmd[0] == 'B' else self.text_files
+            files[name] = content
+            return '', True
+
+        if cmd.startswith('E$cmd$play {'):
+            self.playing = cmd[len('E$cmd$play {'):].split('}')[0]
+            return '', True
+
+        if cmd == 'CQR':
+            self.playing = None
+            return '', True
+
+        if cmd == 'CCM':
+            self.var_files = {}
+            self.text_files = {}
+            self.playing = None
+            return '', True
+
+        if cmd == 'CRD':
+            now = dt.now()
+            return now.strftime('%m%d%Y') + now.strftime('%w'), True
+
+        if cmd == 'CRT':
+            return dt.now().strftime('%H%M%S'), True
+
+        if cmd.startswith('CFL'):
+            files = [f + '.var' for f in self.var_files] + \
+                    [f + '.txt' for f in self.text_files]
+            return ','.join(files), True
+
+        if cmd[:3] in ['CSD', 'CST', 'CPF', 'CPO', 'CSM', 'CFM', 'CWF']:
+            return '', True
+
+        return '', False
+
+    def _handle_frame(self, frame, received):
+        """Parses frame and writes the reply to the port.
+
+        :param frame: decoded frame from ^B to ^C
+        :param received: time.monotonic() the first byte of frame arrived
+        """
+        self.stats['frames'] += 1
+        head, _, body = frame[2:-2].partition('^A')
+        if head != self.addr:
+            self.stats['ignored'] += 1
+            return
+
+        # finish receiving frame at baud rate, then process it
+        time.sleep(max(0, received + self._tx_time(len(frame))
+                          - time.monotonic()) + self.latency)
+
+        reply = frame[:-2]
+        for cmd in body.split('^A'):
+            with self.lock:
+                self.stats['commands'] += 1
+                if (self.hang_after is not None and
+                    self.stats['commands'] > self.hang_after):
+                    self.hung = True
+                if self.hung:
+                    return
+                data, ok = self._run_cmd(cmd)
+
+            if not ok:
+                self.stats['errors'] += 1
+            reply = reply + data + '^C\r\n' + ('ok' if ok else 'error') + '\r\n'
+
+        if self.random.random() < self.drop_rate:
+            self.stats['dropped'] += 1
+            return
+
+        reply = reply.encode()
+        for i in range(0, len(reply), self.chunk):
+            part = reply[i:i + self.chunk]
+            time.sleep(self._tx_time(len(part)))
+            os.write(self.master, part)
+
+    def run(self):
+        buf = b''
+        received = None     # time first byte of current frame arrived
+
+        while not self.exit_flag:
+            ready, _, _ = select.select([self.master], [], [], 0.1)
+            if not ready:
+                continue
+
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                break
+            if received is None:
+                received = time.monotonic()
+            buf += data
+
+            while True:
+                start = buf.find(b'^B')
+                end = buf.find(b'^C', start)
+                if start < 0 or end < 0:
+                    break
+                frame = buf[start:end + 2].decode(errors='replace')
+                buf = buf[end + 2:]
+                self._handle_frame(frame, received)
+                received = time.monotonic() if buf else None
+
+        LOGGER.info('Exiting sign simulator thread.')
+
+
+# ------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MCS v3.2 LED sign simulator')
+    parser.add_argument('--addr', default='01', help='sign address')
+    parser.add_argument('--baud', type=int, default=9600)
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='secs before sign starts replying')
+    parser.add_argument('--drop-rate', type=float, default=0.0,
+                        help='probability a reply is dropped')
+    parser.add_argument('--hang-after', type=int, default=None,
+                        help='commands until sign hangs')
+    parser.add_argument('--boot-time', type=float, default=0,
+                        help='secs a power cycle takes')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--chunk', type=int, default=16,
+                        help='bytes written to the port at a time')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    sim = SignSimulator(args.addr, args.baud, args.latency, args.drop_rate,
+                        args.hang_after, args.boot_time, args.seed, 
+                        args.chunk)
+
+    # kill -USR1 <pid> power cycles the simulated sign
+    signal.signal(signal.SIGUSR1,
+        lambda *_: threading.Thread(target=sim.power_cycle).start())
+
+    print(f'Sign simulator listening on {sim.port} (pid {os.getpid()})')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.exit_flag = True
+        print(sim.stats)
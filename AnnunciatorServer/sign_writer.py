@@ -0,0 +1,122 @@
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import Future
+from helpers import *
+from globals import *
+
+LOGGER = logging.getLogger(__name__)
+
+# Sign command priorities, lower values are sent to the sign first
+ALERT_PRIORITY = 0
+NOTIFY_PRIORITY = 1     # notify and error displays
+MSG_PRIORITY = 2        # custom messages from the webserver
+DRUMS_PRIORITY = 3      # drums display, drum stages and timers
+
+
+class SignWriter:
+    """
+    Owns the LED sign. Commands are submitted with a priority and run one at a
+    time, highest priority first, on a single writer thread. This is the only
+    thread that talks to the sign over the serial port.
+
+    submit() returns a concurrent.futures.Future. Its result() is the return
+    value of the command, or raises the exception the command raised, e.g.
+    SignError if the sign is unreachable.
+
+    When an alert is submitted, queued display changes with a lower priority
+    are dropped as the alert would replace them on the sign. Their futures
+    raise SignLeaseError.
+    """
+    def __init__(self):
+        self.queue = []     # heap of [priority, seq, func, args, kwargs,
+                            #          is_display, future]
+        self.seq = itertools.count()    # keeps FIFO order within a priority
+        self.cond = threading.Condition()
+        self.running = True
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def _preempt(self, priority):
+        """Drops queued display changes with a lower priority than
+        'priority'. Assumes self.cond is held."""
+        kept = []
+        for job in self.queue:
+            if job[5] and job[0] > priority:
+                job[6].set_exception(SignLeaseError('preempted by alert'))
+            else:
+                kept.append(job)
+
+        if len(kept) != len(self.queue):
+            LOGGER.info(f'Alert preempted {len(self.queue) - len(kept)} '
+                        'queued display changes')
+            heapq.heapify(kept)
+            self.queue = kept
+
+    def submit(self, priority, func, *args, is_display=False, **kwargs):
+        """Queues func(*args, **kwargs) to be run on the writer thread.
+
+        :param priority: one of the *_PRIORITY constants
+        :param is_display: True if command changes the display playing on the
+            sign, such commands can be preempted by an alert.
+        :return: Future holding the result of the command
+        """
+        future = Future()
+
+        # commands submitted by a running command are run straight away
+        if threading.current_thread() is self.thread:
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as exc:
+                future.set_exception(exc)
+            return future
+
+        with self.cond:
+            if not self.running:
+                future.set_exception(SignLeaseError('sign writer stopped'))
+                return future
+
+            if priority == ALERT_PRIORITY:
+                self._preempt(priority)
+
+            heapq.heappush(self.queue, [priority, next(self.seq), func, args,
+                                        kwargs, is_display, future])
+            self.cond.notify()
+        return future
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and not self.queue and not exit.is_set():
+                    self.cond.wait(1)
+
+                if not self.running or exit.is_set():
+                    break
+
+                job = heapq.heappop(self.queue)
+                func, args, kwargs, future = job[2], job[3], job[4], job[6]
+                if not future.set_running_or_notify_cancel():
+                    continue
+
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as exc:
+                future.set_exception(exc)
+
+        # END WHILE -----------------------------------------------------------
+
+        with self.cond:
+            self.running = False
+            for job in self.queue:
+                job[6].set_exception(SignLeaseError('sign writer stopped'))
+            self.queue = []
+
+        LOGGER.info('Exiting sign writer thread.')
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
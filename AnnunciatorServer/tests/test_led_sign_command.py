@@ -0,0 +1,194 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from led_sign_command import LEDSignCommand
+
+# Expected commands were built by the LEDSignCommand that joined strings,
+# before the lookup tables replaced it. The sign must receive exactly the
+# same bytes, so a table change that changes a command fails here.
+
+# (method, args, kwargs, code added between start_cmd() and end_cmd())
+PARTIAL_CMDS = [
+    ('set_font', (0,), {}, '^F$AR12$'),
+    ('set_font', (1,), {}, '^F$AR16$'),
+    ('set_font', (2,), {}, '^F$AR24$'),
+    ('set_font', (3,), {}, '^F$ARN9$'),
+    ('set_font', (4,), {}, '^F$SS4$'),
+    ('set_font', (5,), {}, '^F$SS5$'),
+    ('set_font', (6,), {}, '^F$SS7$'),
+    ('set_font', (7,), {}, '^F$SS8$'),
+    ('set_font', (8,), {}, '^F$SS15$'),
+    ('set_font', (9,), {}, '^F$SS16$'),
+    ('set_font', (10,), {}, '^F$SS24$'),
+    ('set_font', (11,), {}, '^F$SF7$'),
+    ('set_font', (12,), {}, '^F$SF8$'),
+    ('set_font', (13,), {}, '^F$SF10$'),
+    ('set_font', (14,), {}, '^F$SF15$'),
+    ('set_font', (15,), {}, '^F$SF16$'),
+    ('set_font', (16,), {}, '^F$SF24$'),
+    ('set_font', (17,), {}, '^F$SMA$'),
+    ('set_font', (18,), {}, '^F$FX7$'),
+    ('set_font', (19,), {}, '^F$FX15$'),
+    ('set_font', (20,), {}, '^F$FXC$'),
+    ('set_font', (21,), {}, '^F$TM12$'),
+    ('set_font', (22,), {}, '^F$TM16$'),
+    ('set_font', (23,), {}, '^F$TM24$'),
+    ('set_font', (24,), {}, '^F$TT$'),
+    ('set_font', (25,), {}, '^F$ISO7$'),
+    ('set_font', (26,), {}, '^F$CS15$'),
+    ('set_font', (27,), {}, '^F$IM15$'),
+    ('set_font', (99,), {}, '^F$99$'),
+    ('set_font', ('XYZ',), {}, '^F$XYZ$'),
+    ('set_color', ('red',), {}, '^O0'),
+    ('set_color', ('green',), {}, '^O1'),
+    ('set_color', ('yellow',), {}, '^O2'),
+    ('set_color', ('rain',), {}, '^O3'),
+    ('set_color', ('blue',), {}, '^O$BLU$'),
+    ('set_color', ('purple',), {}, '^O$PUR$'),
+    ('set_color', ('white',), {}, '^O$WHT$'),
+    ('set_color', ('pink',), {}, '^O$F:rgb(159,43,104)$'),
+    ('set_color', ('light red',), {}, '^O0'),
+    ('set_color', ('rainbow',), {}, '^O3'),
+    ('set_color', ((1, 2, 3),), {}, '^O$F:rgb(1, 2, 3)$'),
+    ('set_effect', ('explode',), {}, '^E$EXP$'),
+    ('set_effect', ('pac',), {}, '^E$PAC$'),
+    ('set_effect', ('scroll',), {}, '^E$SCU$'),
+    ('set_effect', ('sleft',), {}, '^E$SCL$'),
+    ('set_effect', ('flash',), {}, '^EF'),
+    ('set_effect', ('slide',), {}, '^EC'),
+    ('set_effect', ('H',), {}, '^EH'),
+    ('set_effect', ('fast flash',), {}, '^EF'),
+    ('set_effect', (), {}, '^EH'),
+    ('set_position', ('mid',), {}, '^PM'),
+    ('set_position', ('top',), {}, '^PT'),
+    ('set_position', ('right',), {}, '^PR'),
+    ('set_position', ('left',), {}, '^PL'),
+    ('set_position', ('fill',), {}, '^PF'),
+    ('set_position', ('top left',), {}, '^PT'),
+    ('set_position', (), {}, '^P$0,0,256,32,4$'),
+    ('set_position', (), {'x': 1, 'y': 2, 'w': 3, 'h': 4, 'a': 5},
+     '^P$1,2,3,4,5$'),
+    ('set_text_alignment', ('lt',), {}, '^U0'),
+    ('set_text_alignment', ('ct',), {}, '^U1'),
+    ('set_text_alignment', ('rt',), {}, '^U2'),
+    ('set_text_alignment', ('lm',), {}, '^U3'),
+    ('set_text_alignment', ('rm',), {}, '^U5'),
+    ('set_text_alignment', ('lb',), {}, '^U6'),
+    ('set_text_alignment', ('cb',), {}, '^U7'),
+    ('set_text_alignment', ('rb',), {}, '^U8'),
+    ('set_text_alignment', ('cm',), {}, '^U4'),
+    ('set_text_alignment', ('xlt',), {}, '^U0'),
+    ('add_date_time', ('time24',), {}, '^K19'),
+    ('add_date_time', ('time',), {}, '^K19'),
+    ('add_date_time', ('time12',), {}, '^K18'),
+    ('add_date_time', ('num_date',), {}, '^K10/^K11/^K12'),
+    ('add_date_time', ('date',), {}, '^K10/^K11/^K12'),
+    ('add_date_time', ('full_txt_date',), {}, '^K77, ^K75 ^K00^K6E, ^k03'),
+    ('add_date_time', ('txt_data',), {}, '^K77, ^K75 ^K00^K6E, ^k03'),
+    ('add_date_time', ('other',), {}, ''),
+    ('add_tab_control', ('left',), {'pos': None}, '^T0'),
+    ('add_tab_control', ('left',), {'pos': 12}, '^T$0,12$'),
+    ('add_tab_control', ('right',), {'pos': None}, '^T1'),
+    ('add_tab_control', ('right',), {'pos': 12}, '^T$1,12$'),
+    ('add_tab_control', ('center',), {'pos': None}, '^T2'),
+    ('add_tab_control', ('center',), {'pos': 12}, '^T$2,12$'),
+    ('add_tab_control', ('decimal point',), {'pos': None}, '^T3'),
+    ('add_tab_control', ('decimal point',), {'pos': 12}, '^T$3,12$'),
+    ('set_character_attribute', ('flashON wideON boldON',), {}, '^H135'),
+    ('set_character_attribute', ('flashOFF',), {}, '^H0'),
+    ('set_character_attribute', ('boldOFF wideOFF',), {}, '^H24'),
+    ('set_character_attribute', ('',), {}, '^H'),
+    ('set_pause', (6,), {}, '^J06'),
+    ('add_new_line', (), {}, '^M'),
+    ('add_new_page', (), {}, '^L'),
+    ('append_cmd', (), {}, '^A'),
+    ('set_vspace', (2,), {}, '^U$3,2$'),
+    ('set_hspace', ('3',), {}, '^U$2,3$'),
+    ('set_speed', ('5',), {}, '^I5'),
+    ('set_text', ('Drum 1A ',), {}, 'Drum 1A '),
+    ('write_to_txt', ('msg',), {}, 'A$msg$'),
+    ('write_to_var', ('1A',), {}, 'B$1A$'),
+    ('embed_gif_file', ('logo.png',), {}, '^S$logo.gif$'),
+    ('embed_bmp_file', ('logo',), {}, '^S$logo.bmp$'),
+    ('embed_var_file', ('1A',), {}, '^N$1A$'),
+    ('add_beep', (2,), {}, '^V2'),
+    ('add_countdown', (), {'dt_str': '10182026 235930', 'mins': 5, 'secs': 45},
+     '^R$16, 10-19-2026 00:05:15$'),
+]
+
+# (method, args, complete command)
+COMPLETE_CMDS = [
+    ('play_script', ('drums',), '^B01^AE$cmd$play {drums.sh}^C'),
+    ('play_script', ('danger',), '^B01^AE$cmd$play {danger.sh}^C'),
+    ('play_script', ('warning',), '^B01^AE$cmd$play {warning.sh}^C'),
+    ('play_script', ('info',), '^B01^AE$cmd$play {info.sh}^C'),
+    ('play_script', ('notify',), '^B01^AE$cmd$play {notify.sh}^C'),
+    ('play_script', ('alert',), '^B01^AE$cmd$play {alert.sh}^C'),
+    ('play_script', ('error',), '^B01^AE$cmd$play {error.sh}^C'),
+    ('play_script', ('drums.sh',), '^B01^AE$cmd$play {drums.sh}^C'),
+    ('create_var_file', (64, '1A'), '^B01^ACSM$1A$V0040^C'),
+    ('allocate_memory', (1024, 'msg.txt'), '^B01^ACFMmsg.txt=00000400^C'),
+    ('reset_sign', (), '^B01^ACQR^C'),
+    ('clear_memory', (), '^B01^ACCM^C'),
+    ('set_date', ('10', '18', '2026', '0'), '^B01^ACSD101820260^C'),
+    ('set_time', ('23', '59', '30'), '^B01^ACST235930^C'),
+    ('read_date', (), '^B01^ACRD^C'),
+    ('read_time', (), '^B01^ACRT^C'),
+    ('set_brightness', ('8',), '^B01^ACWFbrightmode=0\r\nbrightness=8\r\n^C'),
+    ('set_sign_address', ('0F',), '^B01^ACSA0F^C'),
+    ('turn_off_sign', (), '^B01^ACPF^C'),
+    ('turn_on_sign', (), '^B01^ACPO^C'),
+    ('get_free_memory', (), '^B01^ACRM^C'),
+    ('list_files', (), '^B01^ACFL*.*^C'),
+    ('read_file', ('drums.sh',), '^B01^ACFRdrums.sh^C'),
+]
+
+
+class LEDSignCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.sign_cmd = LEDSignCommand('01')
+
+    def assertCmd(self, expected):
+        self.assertEqual(self.sign_cmd.cmd_bytes, expected.encode())
+        self.assertEqual(self.sign_cmd.cmd, expected)
+
+    def test_partial_commands(self):
+        for method, args, kwargs, code in PARTIAL_CMDS:
+            with self.subTest(method=method, args=args, kwargs=kwargs):
+                self.sign_cmd.start_cmd()
+                getattr(self.sign_cmd, method)(*args, **kwargs)
+                self.sign_cmd.end_cmd()
+                self.assertCmd('^B01^A' + code + '^C')
+
+    def test_complete_commands(self):
+        for method, args, cmd in COMPLETE_CMDS:
+            with self.subTest(method=method, args=args):
+                getattr(self.sign_cmd, method)(*args)
+                self.assertCmd(cmd)
+
+    def test_batch_cmds(self):
+        self.sign_cmd.reset_sign()
+        reset = self.sign_cmd.freeze()
+        self.sign_cmd.read_time()
+        read_time = self.sign_cmd.freeze()
+
+        self.sign_cmd.batch_cmds([reset, read_time])
+        self.assertCmd('^B01^ACQR^ACRT^C')
+
+    def test_frozen_command_reloads(self):
+        self.sign_cmd.start_cmd()
+        self.sign_cmd.write_to_var('1A')
+        self.sign_cmd.set_text('Venting')
+        self.sign_cmd.end_cmd()
+        template = self.sign_cmd.freeze()
+
+        self.sign_cmd.reset_sign()
+        self.sign_cmd.load(template)
+        self.assertCmd('^B01^AB$1A$Venting^C')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(HERE)
+sys.path.insert(0, SERVER_DIR)
+
+from scheduler import Scheduler, SchedulerFull
+
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(max_timers=4, name='test-scheduler')
+        self.calls = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def record(self, name):
+        self.calls.append(name)
+
+    def test_calls_run_in_due_order(self):
+        self.scheduler.call_later(0.06, self.record, 'c')
+        self.scheduler.call_later(0.02, self.record, 'a')
+        self.scheduler.call_later(0.04, self.record, 'b')
+        self.scheduler.call_later(0.08, self.done.set)
+
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(self.calls, ['a', 'b', 'c'])
+
+    def test_due_calls_run_in_order_scheduled(self):
+        release = threading.Event()
+        self.scheduler.call_later(0, release.wait, 2)   # hold the thread
+        for name in 'ab':
+            self.scheduler.call_later(0, self.record, name)
+        self.scheduler.call_later(0, self.done.set)
+        release.set()
+
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(self.calls, ['a', 'b'])
+
+    def test_cancel(self):
+        handle = self.scheduler.call_later(0.02, self.record, 'cancelled')
+        self.scheduler.call_later(0.04, self.done.set)
+
+        self.assertTrue(handle.cancel())
+        self.assertFalse(handle.cancel())
+        self.assertTrue(self.done.wait(2))
+        self.assertEqual(self.calls, [])
+        self.assertTrue(handle.cancelled)
+
+    def test_cancel_after_run(self):
+        handle = self.scheduler.call_later(0, self.done.set)
+        self.assertTrue(self.done.wait(2))
+        self.assertFalse(handle.cancel())
+        self.assertTrue(handle.done)
+
+    def test_scheduler_full(self):
+        handles = [self.scheduler.call_later(10, self.record, i)
+                   for i in range(4)]
+        self.assertEqual(len(self.scheduler), 4)
+        with self.assertRaises(SchedulerFull):
+            self.scheduler.call_later(10, self.record, 'full')
+
+        handles[0].cancel()     # frees a slot
+        self.scheduler.call_later(10, self.record, 'fits')
+        self.assertEqual(len(self.scheduler), 4)
+
+    def test_remaining(self):
+        handle = self.scheduler.call_later(10, self.record, 'later')
+        self.assertTrue(9 < handle.remaining() <= 10)
+
+    def test_error_in_call_does_not_stop_scheduler(self):
+        self.scheduler.call_later(0, lambda: 1 / 0)
+        self.scheduler.call_later(0.01, self.done.set)
+        self.assertTrue(self.done.wait(2))
+
+    def test_stop_drops_pending_calls(self):
+        self.scheduler.call_later(0.05, self.record, 'dropped')
+        self.scheduler.stop()
+        self.assertFalse(self.scheduler.thread.is_alive())
+        self.assertEqual(self.calls, [])
+
+
+class CopiesTest(unittest.TestCase):
+    def test_dcs_link_copy_matches(self):
+        """scheduler.py is duplicated in DCSLink, the copies must not drift"""
+        paths = [os.path.join(SERVER_DIR, 'scheduler.py'),
+                 os.path.join(os.path.dirname(SERVER_DIR), 'DCSLink',
+                              'scheduler.py')]
+        copies = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                copies.append(f.read())
+        self.assertEqual(copies[0], copies[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from scheduler import default_scheduler, SchedulerFull
+
+LOGGER = logging.getLogger(__name__)
+
+SUSTAINED = None    # confirm rule: every sample in the window is on
+
+
+class AlarmConfirmer:
+    """
+    Confirms or clears alarms that were detected as on by sampling them at
+    times set by the shared scheduler, instead of re-reading each alarm once
+    after a delay.
+
+    All pending alarms are sampled together every 'sample_time' secs by a
+    single timer, which only runs while alarms are pending. Each pending
+    alarm keeps a rolling window of its last 'window' samples and is decided
+    with an N of M rule:
+
+        confirmed   'required' samples in the window are on
+        cleared     enough samples are off that 'required' can no longer
+                    be reached in 'window' samples
+
+    SUSTAINED (required = window) confirms an alarm that stayed on for the
+    whole window and clears it on the first off sample.
+
+    'sample' is called with the alarm id and returns True if the alarm is on.
+    It may block on a PI read, so samples are taken on the confirmer's one
+    worker thread, the scheduler thread only starts the sampling and keeps
+    the windows. Samples should bypass any tag cache, otherwise consecutive
+    samples can be the same cached value.
+
+    'decided' is called on the scheduler thread with the alarm id, True if
+    confirmed or False if cleared, and the time.time() of the deciding
+    sample. It must not block.
+    """
+    def __init__(self, sample, decided, window, required=SUSTAINED,
+                 sample_time=1.0, scheduler=None):
+        """
+        :param window: number of samples kept per alarm, M
+        :param required: number of on samples that confirm an alarm, N
+        :param sample_time: secs between samples
+        """
+        required = window if required is SUSTAINED else required
+        if not 1 <= required <= window:
+            raise ValueError(f'Alarm confirm rule {required} of {window} '
+                             f'samples is invalid')
+
+        self.sample = sample
+        self.decided = decided
+        self.window = window
+        self.required = required
+        self.sample_time = sample_time
+        if scheduler is None:
+            scheduler = default_scheduler()
+        self.scheduler = scheduler
+
+        self.pending = {}       # alarm id -> deque of samples
+        self.handle = None      # TimerHandle of the next sample
+        self.lock = threading.Lock()
+        self.worker = ThreadPoolExecutor(max_workers=1,
+                                         thread_name_prefix='alarm-confirm')
+
+    def __len__(self):
+        return len(self.pending)
+
+    def start(self, alarm_id):
+        """Starts sampling alarm, if it is not already pending.
+
+        :return: True if sampling started, False if the alarm was already
+            pending
+        :raises SchedulerFull: if sampling could not be scheduled
+        """
+        with self.lock:
+            if alarm_id in self.pending:
+                return False
+
+            self._schedule()
+            self.pending[alarm_id] = deque(maxlen=self.window)
+        return True
+
+    def cancel(self, alarm_id):
+        """Stops sampling alarm without deciding it"""
+        with self.lock:
+            self.pending.pop(alarm_id, None)
+
+    def stop(self):
+        """Stops the worker thread, pending alarms are not decided"""
+        with self.lock:
+            if self.handle is not None:
+                self.handle.cancel()
+            self.pending.clear()
+        self.worker.shutdown(wait=False)
+
+    def samples(self, alarm_id):
+        """Returns list of the alarm's samples so far, oldest first"""
+        with self.lock:
+            return list(self.pending.get(alarm_id, []))
+
+    def _schedule(self):
+        """Starts the sample timer if it is not running. Called with lock"""
+        if self.handle is None:
+            self.handle = self.scheduler.call_later(self.sample_time,
+                                                    self._tick)
+
+    def _decide(self, samples):
+        """Applies N of M rule to samples, returns True, False or None if
+        undecided"""
+        on = sum(samples)
+        if on >= self.required:
+            return True
+        if len(samples) - on > self.window - self.required:
+            return False
+        return None
+
+    def _tick(self):
+        """Runs on the scheduler thread, hands sampling to the worker"""
+        with self.lock:
+            alarm_ids = list(self.pending)
+            if not alarm_ids:
+                self.handle = None
+                return
+            # handle stays set while sampling so start() doesn't add a timer
+        self.worker.submit(self._sample_all, alarm_ids)
+
+    def _sample(self, alarm_id):
+        try:
+            return bool(self.sample(alarm_id))
+        except Exception as exc:
+            LOGGER.error(f'Error sampling alarm {alarm_id} - {exc}')
+            return False
+
+    def _sample_all(self, alarm_ids):
+        """Runs on the worker thread, takes one sample of each alarm"""
+        sampled = [(alarm_id, self._sample(alarm_id))
+                   for alarm_id in alarm_ids]
+        now = time.time()
+        try:
+            self.scheduler.call_later(0, self._record, sampled, now)
+        except SchedulerFull:
+            self._record(sampled, now)
+
+    def _record(self, sampled, now):
+        """Adds samples to the alarms' windows and decides alarms"""
+        results = []
+        with self.lock:
+            self.handle = None
+            for alarm_id, on in sampled:
+                samples = self.pending.get(alarm_id)
+                if samples is None:
+                    continue    # cancelled while sampling
+
+                samples.append(on)
+                result = self._decide(samples)
+                if result is not None:
+                    del self.pending[alarm_id]
+                    results.append((alarm_id, result))
+
+            if self.pending:
+                try:
+                    self._schedule()
+                except SchedulerFull:
+                    # can't sample again, clear so alarms are detected again
+                    results.extend((alarm_id, False)
+                                   for alarm_id in self.pending)
+                    self.pending.clear()
+
+        for alarm_id, result in results:
+            self.decided(alarm_id, result, now)
@@ -1,133 +1,204 @@
 import threading
+import time
+from datetime import datetime
+import numpy as np
 from XXXX import *
 from XXXX import PITags
+from scheduler import default_scheduler, SchedulerFull
+from alarm_confirm import AlarmConfirmer, SUSTAINED
+from tag_snapshot import *
+from tag_cache import CachedPITags
+from alarm_table import AlarmTable, NO_ALARMS
 
 
-class AlarmHandler(PITags): 
+class AlarmHandler(SnapshotTags, CachedPITags):
+    SAMPLE_TIME = 1.0               # secs between samples of delayed alarms
+    CONFIRM_SAMPLES = SUSTAINED     # on samples in the delay that confirm
+
     def __init__(self, log):
         PITags.__init__(self)
         self.log = log
 
-        self.states = []
-        for _, _ in enumerate(self.alarms):
-            self.states.append(OFF)
+        self.table = AlarmTable(self.alarms)
+        self.states = self.table.states     # OFF, DELAY or ON of each alarm
+        # time.time() of each alarm's last state change
+        self.changed = np.zeros(len(self.table))
+
+        self.lock = threading.Lock()    # used to change 'states'
+        self.summary = NO_ALARMS    # AlarmSummary of alarms that are ON
+        self.scheduler = default_scheduler()
+        self.confirmer = AlarmConfirmer(
+            self._is_alarm_on, self._end_alarm_delay,
+            window=max(1, round(ALARM_DELAY / self.SAMPLE_TIME)),
+            required=self.CONFIRM_SAMPLES, sample_time=self.SAMPLE_TIME,
+            scheduler=self.scheduler)
+
+    def _publish(self):
+        '''Replaces 'summary' with the flags of the alarms that are ON. Must
+            be called with self.lock held after changing 'states'. Readers
+            take 'summary' without locking, it is never modified.
+        '''
+        summary = self.table.aggregate(self.states == ON)
+        if summary != self.summary:
+            self.summary = summary
+
+    def snapshot_tags(self):
+        return list(zip(self.table.tags, self.table.tag_types))
+
+    def _log_invalid_values(self, raw_values):
+        """Logs alarms whose last value was invalid, not just bad quality
 
-        self.lock = threading.Lock()
+        :param raw_values: raw PI values the alarms were evaluated from
+        """
+        for idx in np.flatnonzero(np.isnan(self.table.values)):
+            raw = raw_values[idx]
+            if not is_bad_quality(raw):
+                self.log.put(f'Unrecongized {self.alarms[idx]["type"]} value '
+                             f'from PI. val: {raw}')
 
-    def _is_alarm_on(self, alarm):
-        val = str(self.get_tag_value(alarm['tag']))
+    def _is_alarm_on(self, state_id):
+        '''Reads PI alarm tag live, bypassing the cycle snapshot and the tag
+            cache, and checks if alarm is on. Used to sample delayed alarms.
+
+            :param state_id: position of alarm in self.alarms
+        '''
         try:
-            if val == 'Bad Input':
-                 return False 
-            
-            if alarm["type"] == 'FIRE' and val not in ['0', '1'] :
-                self.log.put(f'Unrecongized fire value from PI. val: {val}')
-                return False
-
-            # check fire alarm and LEL & H2S alarms on switch deck         
-            if ((alarm["type"] == FIRE and val == '1') or  
-                (alarm["type"] in [H2S, LEL] and 
-                    alarm["deck"] == SWITCH_DECK and 
-                    float(val) > ALARM_THRES_LOW)):  
-                # LEL & H2S alarms  on cut deck -- DISABLED
-                ## or (alarm["deck"] == CUT_DECK and float(val) > ALARM_THRES_HIGH)  
-
-                self.log.put(f'{alarm["type"]} ON -- val: {val}') 
-                return True 
-            
+            raw = self.get_live_tag_value(self.table.tags[state_id])
         except Exception as exc:
-            self.log.put(f'Error checking alarm val: {val}\n{exc}')
-        return False
+            self.log.put(f'Unable to read {self.table.tags[state_id]} - {exc}')
+            return False
+
+        val = decode(raw, self.table.tag_types[state_id])
+        if val is None and not is_bad_quality(raw):
+            self.log.put(f'Unrecongized {self.alarms[state_id]["type"]} value '
+                         f'from PI. val: {raw}')
+
+        return self.table.is_on(state_id, val)
+
+    def _set_state(self, state_id, state, timestamp):
+        """Sets alarm state and the time it changed. Called with self.lock"""
+        if self.states[state_id] != state:
+            self.states[state_id] = state
+            self.changed[state_id] = timestamp
+
+    def _log_change(self, state_id, msg):
+        """Logs msg with the time of the alarm's last state change"""
+        changed = datetime.fromtimestamp(self.changed[state_id])
+        self.log.put(f'{changed.isoformat(timespec="milliseconds")} '
+                     f'{msg} - {self.table.tags[state_id]}')
 
     def _start_alarm_delay(self, state_id, alarm):
-        '''Waits 'ALARM_DELAY' seconds then checks the PI alarm tag value. 
-            If PI value indicates alarm is on then sets alarm state to ON. 
-            this will trigger the annunciator to play an alert. 
+        '''Starts sampling the PI alarm tag value for 'ALARM_DELAY'
+            seconds. If the alarm is already being sampled its delay is left
+            to do the check.
 
-            Assumes that alarm['state'] = DELAY 
+            Assumes that alarm['state'] = DELAY
+            :param state_id: position of alarm in self.states
             :param alarm: dictionary holding the information of one alarm
+            :return: True if a delay is pending, otherwise False
         '''
-        def delay_thread():
-            if DEBUG:
-                r = int(ALARM_DELAY / 20)
-                for i in range(r):
-                    s = ALARM_DELAY -(i * 20)
-                    self.log.put(f'{s} secs till {alarm["type"]} alarms')
-                    exit.wait(20)
-            else:
-                exit.wait(ALARM_DELAY)
-
-            if not exit.is_set():
-                if self._is_alarm_on(alarm): 
-                    with self.lock:
-                        self.states[state_id] = ON     # trigger announcement
-                    return
-
-                self.log.put(f'False alarm - {alarm["tag"]}')
-                self.states[state_id] = OFF
-        # ---------------------------------------------------------------------
-        
-        self.log.put(f'Starting alarm delay for {alarm["tag"]}...')
-        tr = threading.Thread(target=delay_thread)
-        tr.start()
+        if DEBUG:
+            self.log.put(f'{ALARM_DELAY} secs till {alarm["type"]} alarms')
+
+        try:
+            started = self.confirmer.start(state_id)
+        except SchedulerFull:
+            self.log.put(f'Unable to start alarm delay for {alarm["tag"]} '
+                         f'- scheduler full')
+            return False
+
+        if started:
+            self._log_change(state_id, 'Starting alarm delay')
+        else:
+            self._log_change(state_id, 'Alarm delay already running')
+        return True
+
+    def _end_alarm_delay(self, state_id, confirmed, timestamp):
+        '''Called by the confirmer when the samples taken during the delay
+            decide the alarm. If the alarm is confirmed sets alarm state to
+            ON. this will trigger the annunciator to play an alert.
+
+            :param confirmed: True if alarm is on, False if false alarm
+            :param timestamp: time.time() of the deciding sample
+        '''
+        if exit.is_set():
+            return
+
+        with self.lock:
+            if self.states[state_id] != DELAY:
+                return      # cleared by check_alarms() while sampling
+            self._set_state(state_id, ON if confirmed else OFF, timestamp)
+            self._publish()
+
+        if confirmed:
+            self._log_change(state_id,
+                             f'{self.alarms[state_id]["type"]} alarm confirmed')
+        else:
+            self._log_change(state_id, 'False alarm')
 
     def check_alarms(self):
         '''Retrieves & processes gas and fire data from PI.
 
-        If the data from PI indicates an alarm is ON, starts the alarm delay 
-        timer thread which waits 'ALARM_DELAY' seconds before checking the PI
-        alarm value again. This is to prevent false alarms from playing. 
-        Otherwise, it will set alarm state to OFF. 
+        All alarms are evaluated at once against the alarm table. If the data
+        from PI indicates an alarm is ON, starts the alarm delay
+        which samples the PI alarm value for 'ALARM_DELAY' seconds and
+        confirms the alarm by AlarmHandler.CONFIRM_SAMPLES. This is to
+        prevent false alarms from playing.
+        Otherwise, it will set alarm state to OFF.
 
-        If an alarm state has been set as ON it will trigger the annunciator 
-        to play the alert. In order for the alert to be turned off all alarms 
+        If an alarm state has been set as ON it will trigger the annunciator
+        to play the alert. In order for the alert to be turned off all alarms
         which have the same type need to be in the OFF state.
         '''
-        for idx, alarm in enumerate(self.alarms):
-            if self._is_alarm_on(alarm): 
-                # alarm is not on & delay hasn't started yet
-                if self.states[idx] == OFF:   
-                    self._start_alarm_delay(alarm)
-                    self.states[idx] = DELAY
-                continue    # skip turnning off alarm
-           
-            self.states[idx] = OFF
-        # END FOR -------------------------------------------------------------   
+        raw_values = [self._read_raw(tag) for tag in self.table.tags]
+        values = [decode(raw, tag_type) for raw, tag_type in
+                  zip(raw_values, self.table.tag_types)]
+        on = self.table.evaluate(values)
+        now = time.time()
+
+        with self.lock:
+            # alarm is on & delay hasn't started yet
+            started = np.flatnonzero(on & (self.states == OFF))
+            off = ~on & (self.states != OFF)
+            # delays of alarms that went off are dropped, not decided
+            for idx in np.flatnonzero(off & (self.states == DELAY)):
+                self.confirmer.cancel(idx)
+            self.states[started] = DELAY
+            self.states[off] = OFF
+            self.changed[started] = now
+            self.changed[off] = now
+            self._publish()
+
+        for idx in started:
+            alarm = self.alarms[idx]
+            self.log.put(f'{alarm["type"]} ON -- val: {self.table.values[idx]}')
+            if not self._start_alarm_delay(idx, alarm):
+                with self.lock:
+                    self._set_state(idx, OFF, now)  # try again next check
+
+        if np.isnan(self.table.values).any():
+            self._log_invalid_values(raw_values)
 
     def get_alarms_msg(self, msg):
-        """Checks status code of the alarms and alarm message fields 
+        """Checks status code of the alarms and alarm message fields
         accordingly.
 
-        An alarm flag is turned on when any of the alarms that corresponde to 
-        it (alarms with alarm[0][1] = H2S/LEL/FIRE) indicate that they are on 
-        (alarm[1] = 1). 
+        An alarm flag is turned on when any of the alarms that corresponde to
+        it (alarms with alarm[0][1] = H2S/LEL/FIRE) indicate that they are on
+        (alarm[1] = 1).
 
-        An alarm will be turned of when all of the alarms that corresponde to 
-        it (alarms with alarm[0][1] = H2S/LEL/FIRE) indicate that they are off 
+        An alarm will be turned of when all of the alarms that corresponde to
+        it (alarms with alarm[0][1] = H2S/LEL/FIRE) indicate that they are off
         (alarm[1] = 0).
 
-        :param alarms_msg: 
-        """    
-        msg.lel = False
-        msg.fire = False
-        msg.h2s = False
-        msg.deck = NO_DECK
-        msg.active_alarm = False
-
-        for idx, alarm in enumerate(self.alarms):
-            with self.lock:
-                if self.states[idx] == ON:
-                    msg.active_alarm = True
-
-                    if msg.deck == NO_DECK:
-                        msg.deck = alarm['deck']
-                    elif msg.deck != alarm['deck']:
-                        msg.deck = BOTH_DECKS
-
-                    if alarm["type"] == H2S:
-                        msg.h2s = True
-                    elif alarm["type"] == LEL:
-                        msg.lel = True
-                    elif alarm["type"] == FIRE:
-                        msg.fire = True
-            exit.wait(0.1)      # allow time for other threads
\ No newline at end of file
+        Copies the published summary, so does not wait on check_alarms() or
+        alarm delays.
+
+        :param alarms_msg:
+        """
+        summary = self.summary
+        msg.active_alarm = summary.active_alarm
+        msg.h2s = summary.h2s
+        msg.lel = summary.lel
+        msg.fire = summary.fire
+        msg.deck = summary.deck
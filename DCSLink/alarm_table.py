@@ -0,0 +1,99 @@
+import numpy as np
+from collections import namedtuple
+from XXXX import *
+from tag_snapshot import DIGITAL, FLOAT
+
+# alarm type codes, position in ALARM_TYPES
+ALARM_TYPES = [FIRE, H2S, LEL]
+UNKNOWN_TYPE = len(ALARM_TYPES)
+
+# Alarms message flags of the alarms that are ON
+AlarmSummary = namedtuple('AlarmSummary',
+                          ['active_alarm', 'h2s', 'lel', 'fire', 'deck'])
+NO_ALARMS = AlarmSummary(False, False, False, False, NO_DECK)
+
+
+class AlarmTable:
+    """
+    Alarm definitions compiled into parallel arrays, one row per alarm, so
+    all alarms are evaluated against a cycle's tag values with a few array
+    operations instead of one Python call per alarm.
+
+        tags        PI tag of each alarm
+        types       code of alarm type, index into ALARM_TYPES
+        decks       code of alarm deck, index into self.deck_values
+        thresholds  alarm is on when value > threshold. Fire alarms are
+                    digital so their threshold is 0.5. LEL & H2S alarms are
+                    only checked on the switch deck, others never turn on.
+        values      last evaluated value, NaN if bad quality
+        states      OFF, DELAY or ON of each alarm
+    """
+    def __init__(self, alarms):
+        """
+        :param alarms: list of alarm dictionaries with 'tag', 'type' and
+            'deck' keys, e.g. PITags.alarms
+        """
+        self.alarms = alarms
+        self.tags = [alarm['tag'] for alarm in alarms]
+        self.deck_values = list(dict.fromkeys(a['deck'] for a in alarms))
+
+        self.types = np.array(
+            [ALARM_TYPES.index(a['type']) if a['type'] in ALARM_TYPES
+             else UNKNOWN_TYPE for a in alarms], dtype=np.int8)
+        self.tag_types = [DIGITAL if a['type'] == FIRE else FLOAT
+                          for a in alarms]
+        self.decks = np.array(
+            [self.deck_values.index(a['deck']) for a in alarms], dtype=np.int8)
+
+        self.thresholds = np.full(len(alarms), np.inf)
+        self.thresholds[self.types == ALARM_TYPES.index(FIRE)] = 0.5
+        gas = np.isin(self.types, [ALARM_TYPES.index(H2S),
+                                   ALARM_TYPES.index(LEL)])
+        switch_deck = np.array([a['deck'] == SWITCH_DECK for a in alarms],
+                               dtype=bool)
+        self.thresholds[gas & switch_deck] = ALARM_THRES_LOW
+        # LEL & H2S alarms on cut deck -- DISABLED
+        ## self.thresholds[gas & cut_deck] = ALARM_THRES_HIGH
+
+        self.values = np.full(len(alarms), np.nan)
+        self.states = np.full(len(alarms), OFF,
+                              dtype=np.array([OFF, DELAY, ON]).dtype)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def evaluate(self, values):
+        """Stores the alarms' current values and returns which are on.
+
+        :param values: list of decoded tag values in table order, None if bad
+            quality
+        :return: boolean array, True for alarms that are on
+        """
+        self.values = np.array(values, dtype=float)   # None -> NaN
+        return self.values > self.thresholds    # NaN is never on
+
+    def is_on(self, idx, value):
+        """Evaluates a single alarm, e.g. re-checking it after a delay"""
+        return value is not None and value > self.thresholds[idx]
+
+    def aggregate(self, mask):
+        """Returns flags of Alarms message for the alarms in mask.
+
+        :param mask: boolean array of alarms to include, e.g. states == ON
+        :return: AlarmSummary
+        """
+        counts = np.bincount(self.types[mask], minlength=UNKNOWN_TYPE + 1)
+        decks = np.unique(self.decks[mask])
+
+        if len(decks) == 0:
+            deck = NO_DECK
+        elif len(decks) == 1:
+            deck = self.deck_values[decks[0]]
+        else:
+            deck = BOTH_DECKS
+
+        return AlarmSummary(bool(mask.any()),
+                            bool(counts[ALARM_TYPES.index(H2S)]),
+                            bool(counts[ALARM_TYPES.index(LEL)]),
+                            bool(counts[ALARM_TYPES.index(FIRE)]),
+                            deck)
@@ -0,0 +1,90 @@
+import numpy as np
+from collections import namedtuple
+from XXXX import *
+
+# pos: drum list index, name: drum name used in notifications, field: name
+# of the drum's field in the Drums message, unit: coker unit of the drum
+Drum = namedtuple('Drum', ['pos', 'name', 'field', 'unit', 'tags',
+                           'iso_trigger', 'iso_details'])
+
+
+def _default_name(pos):
+    """Drums come in A & B pairs, 1A, 1B, 2A, 2B..."""
+    return f'{pos // 2 + 1}{"AB"[pos % 2]}'
+
+
+def _at(values, pos, default=None):
+    return values[pos] if pos < len(values) else default
+
+
+class DrumRegistry:
+    """
+    Drums of the coker units, configured from the drum tag metadata in
+    PITags.drum_tags. Besides its PI tags a drum's dictionary may set
+
+        'name'          drum name, default 1A, 1B, 2A... by position
+        'unit'          coker unit of the drum, default 1
+        'field'         Drums message field of the drum, default 'D' + name
+        'iso_trigger'   ISO valve state that starts the ISO timer, default
+                        ISO_TIMER_TRIGGERS[pos]
+        'iso_details'   details of the ISO timer, default
+                        ISO_VAVLE_DETAILS[pos]
+
+    Drums without an 'isotimer' tag have no ISO valve and no ISO timer.
+
+    Drums are identified by their position in drum_tags, the same drum list
+    index the handlers are given.
+    """
+    def __init__(self, drum_tags):
+        self.drums = []
+        for pos, tags in enumerate(drum_tags):
+            name = tags.get('name', _default_name(pos))
+            self.drums.append(Drum(
+                pos, name, tags.get('field', 'D' + name), tags.get('unit', 1),
+                tags, tags.get('iso_trigger', _at(ISO_TIMER_TRIGGERS, pos)),
+                tags.get('iso_details', _at(ISO_VAVLE_DETAILS, pos, ''))))
+
+        self.names = [drum.name for drum in self.drums]
+
+        # A & B drums share ISO valves, True for the last drum on each valve
+        last = {drum.tags['isotimer']: drum.pos for drum in self.drums
+                if 'isotimer' in drum.tags}
+        self.valve_tags = list(last)
+        self.last_on_valve = np.zeros(len(self.drums), dtype=bool)
+        self.last_on_valve[list(last.values())] = True
+
+        self._fields = {}   # message type -> list of (pos, field name)
+
+    def __len__(self):
+        return len(self.drums)
+
+    def __iter__(self):
+        return iter(self.drums)
+
+    def __getitem__(self, pos):
+        return self.drums[pos]
+
+    def name(self, pos):
+        """Returns name of drum at pos, 'N' if there is no drum at pos"""
+        if 0 <= pos < len(self.names):
+            return self.names[pos]
+        return 'N'
+
+    def units(self):
+        """Returns dictionary of coker unit to positions of its drums"""
+        units = {}
+        for drum in self.drums:
+            units.setdefault(drum.unit, []).append(drum.pos)
+        return units
+
+    def fields(self, msg):
+        """Returns list of (pos, field name) of the drums that have a field
+        in msg. Worked out once per message type, drums without a field in
+        the message are left out.
+        """
+        fields = self._fields.get(type(msg))
+        if fields is None:
+            fields = [(drum.pos, drum.field) for drum in self.drums
+                      if hasattr(msg, drum.field)]
+            self._fields[type(msg)] = fields
+        return fields
@@ -1,148 +1,163 @@
-from datetime import timedelta, datetime as dt
+import numpy as np
 from XXXX import PITags
 from XXXX import *
-
-class DrumStates(PITags): 
+from tag_snapshot import *
+from tag_cache import CachedPITags
+from drum_registry import DrumRegistry
+from drum_timers import DrumTimers
+from stage_codes import *
+
+# Display priority of timer types, lower is displayed first. Types not listed
+# are displayed after the listed types.
+TIMER_PRIORITIES = {
+    ISO_TIMER: 0,
+    ### Add timer priorities here ###
+}
+
+# 'timers' (all active timers of a drum) is not in older dcs_data.proto
+# schemas, State then only carries the displayed timer
+HAS_TIMERS = 'timers' in dcs_data_pb2.State.DESCRIPTOR.fields_by_name
+
+class DrumStates(SnapshotTags, CachedPITags): 
     def __init__(self, log):
         PITags.__init__(self)
         self.log = log
-        self.iso_valves = { 
-            self.D1_switch: 'N', 
-            self.D2_switch: 'N',
-            self.D3_switch: 'N' 
+        self.drums = DrumRegistry(self.drum_tags)
+        self.iso_valves = dict.fromkeys(self.drums.valve_tags, 'N')
+
+        # timer type -> check returning (duration, details) if drum's timer 
+        # of that type is triggered, otherwise None
+        self.timer_checks = {
+            ISO_TIMER: self._iso_valve_timer,
+            ### Add stage timer checks here ### 
         }
 
         self._init_states()
     
     def _init_states(self):
-        t = dcs_data_pb2.Timer()
-        t.type = NO_TIMER
-
-        self.states = []
-        for _ in range(6): # [ D1A, D1B, D2A, D2B, D3A, D3B ] 
-            self.states.append({'stage': None, 'timer': t})
+        """State of drum at pos is held at pos of the arrays"""
+        n = len(self.drums)
+        self.stages = np.full(n, NO_STAGE, dtype=np.int8)
+        self.timers = DrumTimers(n, TIMER_PRIORITIES)
 
-        t = None
+    def snapshot_tags(self):
+        return [(drum.tags['isotimer'], ENUM) for drum in self.drums
+                if 'isotimer' in drum.tags]
 
     def _check_iso_valve_timer(self, pos):
         """
         *** Since A & B drums share valves, self.iso_valves is only update 
         after B completes check. If A updated self.iso_valves B's trigger 
         condition would always be missed. Every second dictionary in 
-        DRUM_TAGS holds the tags of a B drum, therefore (pos + 1) % 2 == 0 
-        is only True for B drums.
+        DRUM_TAGS holds the tags of a B drum, the registry marks the last 
+        drum on each valve in last_on_valve.
         If timer is tiggered for A it can't be triggered for B so it is safe to 
         update self.iso_valves.
         """
-        val = str(self.get_tag_value(self.drum_tags[pos]['isotimer']))
+        drum = self.drums[pos]
+        valve = drum.tags.get('isotimer')
+        if valve is None:   # drum has no ISO valve
+            return False
+        val = self._read_tag(valve, ENUM)
 
-        if ( self.iso_valves[self.drum_tags[pos]['isotimer']] == 'MIDPOINT' and 
-             val == ISO_TIMER_TRIGGERS[pos]):
+        if ( self.iso_valves[valve] == 'MIDPOINT' and 
+             val == drum.iso_trigger):
 
-            self.iso_valves[self.drum_tags[pos]['isotimer']] = val
+            self.iso_valves[valve] = val
             print(f'pos: {pos} val: {val}')
             return True
             
-        if (pos + 1) % 2 == 0:      # ***
-            self.iso_valves[self.drum_tags[pos]['isotimer']] = val
+        if self.drums.last_on_valve[pos]:      # ***
+            self.iso_valves[valve] = val
 
         return False
 
-    def _clear_timer(self, timer):
-        if ( timer.type != NO_TIMER and
-             dt.now() - dt.strptime(timer.start, "%Y-%m-%dT%H:%M:%S") >= 
-                    timedelta(minutes=timer.duration)):
-            timer.type = NO_TIMER
+    def _iso_valve_timer(self, pos):
+        if self._check_iso_valve_timer(pos):
+            return ISO_DURATION, self.drums[pos].iso_details
+        return None
+
+    def _clear_timers(self):
+        """Removes timers of all drums that have ended"""
+        self.timers.expire()
 
     def _set_timer(self, pos):
-        '''Checks if any conditions for stage timers are met and sets drum 
-        stage accordingly.
+        '''Checks if any conditions for stage timers are met and starts drum 
+        timers accordingly.
 
-        There can only be one active timer for each drum at any given time.
-        Therefore it is important to consider order of checks when adding 
-        new timers 
+        A drum can have any number of active timers, one of each type. The 
+        timer with the highest priority in TIMER_PRIORITIES is displayed.
 
         :parma pos: drum list index 
         '''
-        if self._check_iso_valve_timer(pos):
-            self.states[pos]['timer'].type = ISO_TIMER
-            self.states[pos]['timer'].start = dt.now().strftime("%Y-%m-%dT%H:%M:%S")
-            self.states[pos]['timer'].duration = ISO_DURATION
-            self.states[pos]['timer'].details = ISO_VAVLE_DETAILS[pos]
-
-        ### Add stage timer checks here ### 
+        for timer_type, check in self.timer_checks.items():
+            triggered = check(pos)
+            if triggered is not None:
+                self.timers.start(pos, timer_type, *triggered)
 
-    def _set_stage(self, stage, pos):
-        '''Retrieves cut cycle stage of drum from PI SDK.
+    def _set_stage(self, code, pos):
+        '''Sets cut cycle stage of drum.
 
-        :param stage: current drum cut cycle sequence stage from PI 
+        :param code: stage code of current drum cut cycle sequence stage 
+            from PI, see stage_codes
         :parma pos: drum list index 
 
-        If stage is not in the list of recognized stages the stage of 
-        self.stages[pos] is not updated.
+        If code is not a recognized drum stage (e.g. Transition) the stage 
+        of self.stages[pos] is not updated.
         '''
-        if stage in ['Charging', 'Switching', 'Steam to Frac', 
-            'Vapor Diversion', 'Steam to BD', 'Water Quench', 'Venting',
-            'Draining', 'Cutting', 'O2 Freeing', 'Press Test', 'Back Warming']:
-
-            self.states[pos]['stage'] = stage
-
-    def _set_drum_stage(self, stage, state):  
-        if stage in ['Charging']:
-            state.stage = dcs_data_pb2.State.Stage.ONLINE
-        elif stage in ['Switching']:
-            state.stage = dcs_data_pb2.State.Stage.SWITCH
-        elif stage in ['Steam to Frac', 'Vapor Diversion', 'Steam to BD']:
-            state.stage = dcs_data_pb2.State.Stage.STEAM
-        elif stage in ['Water Quench']:
-            state.stage = dcs_data_pb2.State.Stage.QUENCH
-        elif stage in ['Venting']:
-            state.stage = dcs_data_pb2.State.Stage.VENT
-        elif stage in ['Draining']:
-            state.stage = dcs_data_pb2.State.Stage.DRAIN
-        elif stage in ['Cutting']:
-            state.stage = dcs_data_pb2.State.Stage.CUT
-        elif stage in ['O2 Freeing']:
-            state.stage = dcs_data_pb2.State.Stage.O2FREE
-        elif stage in ['Press Test']:
-            state.stage = dcs_data_pb2.State.Stage.PRESTST
-        elif stage in ['Back Warming']:
-            state.stage = dcs_data_pb2.State.Stage.PREWARM
-        else:
-            state.stage = dcs_data_pb2.State.Stage.UNSET
+        if is_drum_stage(code):
+            self.stages[pos] = code
+
+    def _set_drum_stage(self, code, state):  
+        state.stage = PB_STAGES[code]
 
     def get_drum_stage(self, drum):
-        return self.states[drum]['stage']
+        """Returns stage code of drum, see stage_codes. Use stage_name() 
+        for log text."""
+        return int(self.stages[drum])
 
     def get_drums_msg(self, msg):
         """Sets valves of Drums message from dcs_data_pb2.
+        Each drum is written to its field named in the drum registry, drums 
+        without a field in msg are skipped.
+
+        state.timer is the drum's displayed timer, state.timers holds all of 
+        the drum's active timers, displayed timer first. state.timers is only
+        set if the schema has it, see HAS_TIMERS.
         NOTE: state.timer_start will only be set if there is a active timer
         :param drums: Response message drumss field 
         """
-        for pos, state in enumerate(self.states):
-            if pos == 0:
-                msg.D1A.timer.CopyFrom(state['timer'])
-                self._set_drum_stage(state['stage'], msg.D1A)
-            elif pos == 1:
-                msg.D1B.timer.CopyFrom(state['timer'])
-                self._set_drum_stage(state['stage'], msg.D1B)
-            elif pos == 2:
-                msg.D2A.timer.CopyFrom(state['timer'])
-                self._set_drum_stage(state['stage'], msg.D2A)
-            elif pos == 3:
-                msg.D2B.timer.CopyFrom(state['timer'])
-                self._set_drum_stage(state['stage'], msg.D2B)
-            elif pos == 4:
-                msg.D3A.timer.CopyFrom(state['timer'])
-                self._set_drum_stage(state['stage'], msg.D3A)
-            elif pos == 5:
-                msg.D3B.timer.CopyFrom(state['timer'])
-                self._set_drum_stage(state['stage'], msg.D3B)
+        for pos, field in self.drums.fields(msg):
+            state = getattr(msg, field)
+            timers = self.timers.timers(pos)
+
+            state.timer.Clear()
+            state.timer.type = NO_TIMER
+            if timers:
+                self._set_timer_msg(timers[0], state.timer)
+
+            if HAS_TIMERS:
+                del state.timers[:]
+                for timer in timers:
+                    self._set_timer_msg(timer, state.timers.add())
+
+            self._set_drum_stage(self.stages[pos], state)
+
+    def _set_timer_msg(self, timer, msg):
+        msg.type = timer.type
+        msg.start = timer.start
+        msg.duration = timer.duration
+        msg.details = timer.details
 
     def update_state(self, drum, stage):
+        '''
+        :param stage: PI stage string, or stage code if already decoded 
+        '''
         try:
-            self._clear_timer(self.states[drum]['timer'])
+            self._clear_timers()
             self._set_timer(drum)
+            if not isinstance(stage, int):
+                stage = stage_code(stage, self.log)
             self._set_stage(stage, drum)
 
         except Exception as exc:
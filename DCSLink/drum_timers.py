@@ -0,0 +1,87 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime as dt
+
+# deadline: time.monotonic() the timer ends, start: ISO datetime sent to the
+# annunciator, formatted once when the timer starts, duration: mins
+DrumTimer = namedtuple('DrumTimer', ['type', 'priority', 'deadline', 'start',
+                                     'duration', 'details', 'seq'])
+
+class DrumTimers:
+    """
+    Active timers of all drums. A drum can have any number of timers, one of
+    each type, starting a timer type again replaces it. The timer displayed
+    for a drum is its timer with the lowest priority, then earliest deadline.
+
+    Expiry is driven by one min-heap of deadlines, expire() only looks at
+    timers that are due. Heap entries of replaced or cancelled timers are
+    skipped when they come due.
+    """
+    def __init__(self, n_drums, priorities=None):
+        """
+        :param priorities: dictionary of timer type -> display priority,
+            lower is displayed first. Types not listed are displayed after
+            the listed types.
+        """
+        self.priorities = priorities or {}
+        self.active = [{} for _ in range(n_drums)]  # timer type -> DrumTimer
+        self.heap = []      # (deadline, seq, drum, timer type)
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(timers) for timers in self.active)
+
+    def priority(self, timer_type):
+        return self.priorities.get(timer_type, len(self.priorities))
+
+    def start(self, drum, timer_type, duration, details=''):
+        """Starts timer on drum, replacing its active timer of the same type
+
+        :param duration: mins timer runs for
+        :return: the started DrumTimer
+        """
+        timer = DrumTimer(timer_type, self.priority(timer_type),
+                          time.monotonic() + duration * 60,
+                          dt.now().isoformat(timespec='milliseconds'),
+                          duration, details, next(self.seq))
+        with self.lock:
+            self.active[drum][timer_type] = timer
+            heapq.heappush(self.heap,
+                           (timer.deadline, timer.seq, drum, timer_type))
+        return timer
+
+    def cancel(self, drum, timer_type):
+        """Stops drum's timer of timer_type, returns True if it was active"""
+        with self.lock:
+            return self.active[drum].pop(timer_type, None) is not None
+
+    def expire(self, now=None):
+        """Removes timers whose deadline has passed.
+
+        :return: list of drums that had timers removed
+        """
+        now = time.monotonic() if now is None else now
+        changed = set()
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, seq, drum, timer_type = heapq.heappop(self.heap)
+                timer = self.active[drum].get(timer_type)
+                if timer is not None and timer.seq == seq:
+                    del self.active[drum][timer_type]
+                    changed.add(drum)
+        return sorted(changed)
+
+    def timers(self, drum):
+        """Returns list of drum's active timers, displayed timer first"""
+        with self.lock:
+            timers = list(self.active[drum].values())
+        return sorted(timers, key=lambda timer: (timer.priority, timer.deadline))
+
+    def displayed(self, drum):
+        """Returns drum's displayed DrumTimer, None if it has no timers"""
+        timers = self.timers(drum)
+        return timers[0] if timers else None
@@ -1,27 +1,69 @@
 import threading
+from collections import namedtuple
 from datetime import timedelta, datetime as dt
 from XXXX import PITags
 from XXXX import *
+from tag_snapshot import *
+from tag_cache import CachedPITags
+from drum_registry import DrumRegistry
+from stage_codes import *
+
+ANY = -1    # matches any stage code in a transition
+
+# Drum watchers, a watched drum's completion is checked every cycle
+PILOT = 'pilot'
+BLOWDOWN = 'blowdown'
+
+# code: notify code prefix, type & event: notify fields
+# when: list of (old stage, new stage) codes of transitions that trigger 
+#   notification, see stage_codes
+# watcher: notification is checked every cycle while drum's watcher is on
+# check: name of method called with drum pos, notify only if it returns True
+# action: name of method called with drum pos when notification is set
+# watch / unwatch: watcher turned on / off when notification is set
+NotifyRule = namedtuple('NotifyRule', 
+    ['code', 'type', 'event', 'when', 'watcher', 'check', 'action', 
+     'watch', 'unwatch'], 
+    defaults=((), None, None, None, None, None))
+
+
+class NotificationHandler(SnapshotTags, CachedPITags): 
+    #### ADD NOTIFY rules here. ####
+    #### Note: Rules are in priority order, only the first match is set ####
+    RULES = [
+        # Draining Warining
+        NotifyRule('WD', 'warning', 'draining', when=[(ANY, VENTING)]),
+        # Pilot Warning
+        NotifyRule('WP', 'warning', 'pilot', 
+                   when=[(DRAINING, CUTTING), (TRANSITION, CUTTING)],
+                   watch=PILOT),
+        # Pilot Complete
+        NotifyRule('CP', 'complete', 'pilot', watcher=PILOT, 
+                   check='_is_pilot_complete', unwatch=PILOT),
+        # Cutting Complete
+        NotifyRule('CC', 'complete', 'cut', when=[(CUTTING, TRANSITION)]),
+        # Blowdown Warning
+        NotifyRule('WB', 'warning', 'blowdown', when=[(ANY, PRESS_TEST)],
+                   check='_blowdown_warning', action='_set_last_BW'),
+        # Blowdown Complete
+        NotifyRule('CB', 'complete', 'blowdown', watcher=BLOWDOWN,
+                   check='_is_blowdown_complete', unwatch=BLOWDOWN),
+    ]
+
+    # transitions that turn on a drum's watcher without a notification
+    WATCH_TRANSITIONS = {(PRESS_TEST, TRANSITION): BLOWDOWN}
 
-
-class NotificationHandler(PITags): 
     def __init__(self, log):
         PITags.__init__(self)
         self.log = log 
+        self.drums = DrumRegistry(self.drum_tags)
 
-        self.PC_watcher = False
-        self.PC_check = 1
-
-        self.BC_watcher = False
-        self.drain_valve_states = [ 
-            'Closed', 'Closed', 'Closed', 
-            'Closed', 'Closed', 'Closed'
-        ]
+        self.watchers = [set() for _ in self.drums]    # watchers of each drum
+        self.PC_checks = [1] * len(self.drums)
+        self._compile_rules()
 
-        self.last_BWs = [
-            dt(2022, 1, 1, 1, 1, 1, 0), dt(2022, 1, 1, 1, 1, 1, 0), dt(2022, 1, 1, 1, 1, 1, 0),
-            dt(2022, 1, 1, 1, 1, 1, 0), dt(2022, 1, 1, 1, 1, 1, 0), dt(2022, 1, 1, 1, 1, 1, 0)
-        ]
+        self.drain_valve_states = ['Closed'] * len(self.drums)
+        self.last_BWs = [dt(2022, 1, 1, 1, 1, 1, 0)] * len(self.drums)
 
         self.activation_time = dt.now()
         self.active_notification = False 
@@ -34,22 +76,38 @@ class NotificationHandler(PITags):
 
         self.lock = threading.Lock()
 
-    def _drum_pos_to_name(self, pos):
-        if pos == 0:
-            return '1A'
-        elif pos == 1:
-            return '1B'
-        elif pos == 2:
-            return '2A'
-        elif pos == 3:
-            return '2B'
-        elif pos == 4:
-            return '3A'
-        elif pos == 5:
-            return '3B'
-        else:
-            print('Invalid drum position')
-            return 'N'
+    def _check_transition(self, transition, name):
+        """Raises ValueError if transition is not a pair of stage codes"""
+        if (len(transition) != 2 or 
+            not all(stage == ANY or is_stage_code(stage) 
+                    for stage in transition)):
+            raise ValueError(f'{name} has invalid stage transition '
+                             f'{transition!r}, stages must be stage codes '
+                             f'or ANY')
+
+    def _compile_rules(self):
+        """Indexes RULES by transition and by watcher, keeping the position
+        of each rule in RULES as its priority.
+
+        :raises ValueError: if a transition is not a pair of stage codes
+        """
+        for transition in self.WATCH_TRANSITIONS:
+            self._check_transition(transition, 'WATCH_TRANSITIONS')
+
+        self.transitions = {}   # (old stage, new stage) -> [(priority, rule)]
+        self.watched = {}       # watcher -> [(priority, rule)]
+        for priority, rule in enumerate(self.RULES):
+            for transition in rule.when:
+                self._check_transition(transition, f'Notify rule {rule.code}')
+                self.transitions.setdefault(transition, []).append(
+                    (priority, rule))
+            if rule.watcher is not None:
+                self.watched.setdefault(rule.watcher, []).append(
+                    (priority, rule))
+
+    def snapshot_tags(self):
+        return [(drum.tags[key], tag_type) for drum in self.drums 
+                for key, tag_type in [('BW', INT), ('PC', INT), ('BC', ENUM)]]
 
     def _get_mins_till(self):
         time_till = dt.now() - self.activation_time 
@@ -165,28 +223,38 @@ class NotificationHandler(PITags):
             +self.notify['event']+ " complete. "  
 
     def _blowdown_warning(self, pos):
-        drum_pressure = int(self.get_tag_value(self.drum_tags[pos]['BW']))
+        drum_pressure = self._read_tag(self.drums[pos].tags['BW'], INT)
+        if drum_pressure is None:   # bad quality
+            return False
+
         if drum_pressure > 200 and (dt.now() - self.last_BWs[pos]) > timedelta(minutes=180):
             return True
 
         return False
 
+    def _set_last_BW(self, pos):
+        self.last_BWs[pos] = dt.now()
+
     def _is_pilot_complete(self, pos):
-        stem_pos = int(self.get_tag_value(self.drum_tags[pos]['PC']))
+        stem_pos = self._read_tag(self.drums[pos].tags['PC'], INT)
+        if stem_pos is None:    # bad quality
+            return False
 
-        if ((self.PC_check in [1, 3] and stem_pos < 5) or 
-            (self.PC_check in [2, 4] and stem_pos > 33)):
-            self.PC_check += 1
+        if ((self.PC_checks[pos] in [1, 3] and stem_pos < 5) or 
+            (self.PC_checks[pos] in [2, 4] and stem_pos > 33)):
+            self.PC_checks[pos] += 1
             
-        if self.PC_check >= 5:
-            self.PC_check = 1       # reset 
+        if self.PC_checks[pos] >= 5:
+            self.PC_checks[pos] = 1       # reset 
             return True
 
         return False
     
     def _is_blowdown_complete(self, pos):
         is_complete = False
-        state = str(self.get_tag_value(self.drum_tags[pos]['BC']))
+        state = self._read_tag(self.drums[pos].tags['BC'], ENUM)
+        if state is None:   # bad quality, keep last known state
+            return False
         
         if (self.drain_valve_states[pos] == 'Undefined' and 
             state == 'Closed'):
@@ -236,78 +304,52 @@ class NotificationHandler(PITags):
         
         return 0.0
 
+    def _set_notification(self, rule, drum_pos):
+        with self.lock:
+            if rule.action is not None:
+                getattr(self, rule.action)(drum_pos)
+            self.activation_time = dt.now()    
+            self.active_notification = True
+            self.notify['code'] = rule.code + str(drum_pos)
+            self.notify['type'] = rule.type
+            self.notify['event'] = rule.event
+            self.notify['drum'] = self.drums.name(drum_pos)
+
+            if rule.watch is not None:
+                self.watchers[drum_pos].add(rule.watch)
+            if rule.unwatch is not None:
+                self.watchers[drum_pos].discard(rule.unwatch)
+
     def check_notifications(self, old_stage, new_stage, drum_pos):
-                    #### ADD NOTIFY condition check here. ####
-        #### Note: Consider priorty of notify when inserting to if-else ####  
+        """Sets the highest priority notification in RULES that matches the
+        drum's stage transition or one of the drum's watchers. Only the rules
+        indexed under the transition and the drum's watchers are checked.
+
+        :param old_stage: stage code, or PI stage string, before the update
+        :param new_stage: stage code, or PI stage string, from PI
+        """
         try:
-            if old_stage == 'Press Test' and new_stage == 'Transition':
-                self.BC_watcher = True # turn on watcher
-
-            # Draining Warining
-            if new_stage == 'Venting':
-                with self.lock:
-                    self.activation_time = dt.now()    
-                    self.active_notification = True
-                    self.notify['code'] = 'WD' + str(drum_pos)
-                    self.notify['type'] = 'warning'
-                    self.notify['event'] = 'draining'
-                    self.notify['drum'] = self._drum_pos_to_name(drum_pos)
-
-            # Pilot Warning 
-            elif (old_stage in ['Draining', 'Transition'] and 
-                new_stage == 'Cutting'):
-                with self.lock:
-                    self.activation_time = dt.now()    
-                    self.active_notification = True
-                    self.notify['code'] = 'WP' + str(drum_pos)
-                    self.notify['type'] = 'warning'
-                    self.notify['event'] = 'pilot'
-                    self.notify['drum'] = self._drum_pos_to_name(drum_pos)
-                    self.PC_watcher = True      # turn on watcher
-
-            # Pilot Complete 
-            elif self.PC_watcher and self._is_pilot_complete(drum_pos):
-                with self.lock:
-                    self.activation_time = dt.now()    
-                    self.active_notification = True
-                    self.notify['code'] = 'CP' + str(drum_pos)
-                    self.notify['type'] = 'complete'
-                    self.notify['event'] = 'pilot'
-                    self.notify['drum'] = self._drum_pos_to_name(drum_pos)
-                    self.PC_watcher = False     # turn off watcher
-
-            # Cutting Complete
-            elif old_stage == 'Cutting' and new_stage == 'Transition':
-                with self.lock:
-                    self.activation_time = dt.now()    
-                    self.active_notification = True
-                    self.notify['code'] = 'CC' + str(drum_pos)
-                    self.notify['type'] = 'complete'
-                    self.notify['event'] = 'cut'
-                    self.notify['drum'] = self._drum_pos_to_name(drum_pos)
-
-            # Blowdown Warning
-            elif (new_stage == 'Press Test' and 
-                  self._blowdown_warning(drum_pos)):
-                with self.lock:
-                    self.last_BWs[drum_pos] = dt.now()
-                    self.activation_time = dt.now()    
-                    self.active_notification = True
-                    self.notify['code'] = 'WB' + str(drum_pos)
-                    self.notify['type'] = 'warning'
-                    self.notify['event'] = 'blowdown'
-                    self.notify['drum'] = self._drum_pos_to_name(drum_pos)
-
-            # Blowdown Complete
-            elif self.BC_watcher and self._is_blowdown_complete(drum_pos):
-                with self.lock:
-                    self.activation_time = dt.now()    
-                    self.active_notification = True
-                    self.notify['code'] = 'CB' + str(drum_pos)
-                    self.notify['type'] = 'complete'
-                    self.notify['event'] = 'blowdown'
-                    self.notify['drum'] = self._drum_pos_to_name(drum_pos)
-                    self.BC_watcher = False  # turn off watcher
+            if not isinstance(old_stage, int):
+                old_stage = stage_code(old_stage, self.log)
+            if not isinstance(new_stage, int):
+                new_stage = stage_code(new_stage, self.log)
+
+            watch = self.WATCH_TRANSITIONS.get((old_stage, new_stage))
+            if watch is not None:
+                self.watchers[drum_pos].add(watch)   # turn on watcher
+
+            candidates = []
+            for transition in [(old_stage, new_stage), (ANY, new_stage), 
+                               (old_stage, ANY)]:
+                candidates.extend(self.transitions.get(transition, []))
+            for watcher in self.watchers[drum_pos]:
+                candidates.extend(self.watched.get(watcher, []))
+
+            # checks may have side effects, stop at first match like if-elif
+            for _, rule in sorted(candidates, key=lambda c: c[0]):
+                if rule.check is None or getattr(self, rule.check)(drum_pos):
+                    self._set_notification(rule, drum_pos)
+                    break
 
             self._turn_off_notification()
 
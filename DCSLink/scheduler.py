@@ -0,0 +1,150 @@
+# This module is duplicated in AnnunciatorServer/ and DCSLink/, which are
+# deployed separately. Keep both copies identical, the scheduler tests check
+# that they match.
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SchedulerFull(Exception):
+    """Raised when a timer is scheduled while max_timers are pending"""
+
+
+class TimerHandle:
+    """Returned by Scheduler.call_later(), used to cancel the call"""
+    def __init__(self, scheduler, when, func, args, kwargs):
+        self.scheduler = scheduler
+        self.when = when            # time.monotonic() to run at
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.done = False
+
+    def cancel(self):
+        """Stops the call from running. Has no effect if it already ran.
+
+        :return: True if the call was cancelled
+        """
+        return self.scheduler._cancel(self)
+
+    def remaining(self):
+        """Returns secs until the call runs"""
+        return max(0, self.when - time.monotonic())
+
+
+class Scheduler:
+    """
+    Runs delayed calls from one thread, in order of their due time. Pending
+    calls are held in a heap keyed by time.monotonic() so they are not
+    affected by changes to the system clock.
+
+    Calls are run on the scheduler thread one at a time, so they must be
+    short and must not block, e.g. hand sign commands to the sign writer
+    without waiting on the result.
+
+    At most 'max_timers' calls can be pending at once, call_later() raises
+    SchedulerFull beyond that.
+    """
+    def __init__(self, max_timers=256, name='scheduler'):
+        self.max_timers = max_timers
+        self.heap = []          # [when, seq, handle]
+        self.seq = itertools.count()    # keeps FIFO order for equal times
+        self.pending = 0        # handles in heap that are not cancelled
+        self.cond = threading.Condition()
+        self.running = True
+
+        self.thread = threading.Thread(target=self.run, name=name,
+                                       daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return self.pending
+
+    def call_later(self, delay, func, *args, **kwargs):
+        """Runs func(*args, **kwargs) on the scheduler thread in 'delay' secs.
+
+        :return: TimerHandle of the call
+        :raises SchedulerFull: if max_timers calls are already pending
+        """
+        handle = TimerHandle(self, time.monotonic() + max(0, delay),
+                             func, args, kwargs)
+        with self.cond:
+            if self.pending >= self.max_timers:
+                raise SchedulerFull(f'{self.pending} timers pending')
+
+            heapq.heappush(self.heap, [handle.when, next(self.seq), handle])
+            self.pending += 1
+            # only need to wake thread if new call is now the earliest
+            if self.heap[0][2] is handle:
+                self.cond.notify()
+        return handle
+
+    def _cancel(self, handle):
+        with self.cond:
+            if handle.cancelled or handle.done:
+                return False
+            handle.cancelled = True
+            self.pending -= 1
+
+            # cancelled handles are left in heap until due, compact heap when
+            # most of it is cancelled handles
+            if len(self.heap) > 64 and self.pending < len(self.heap) // 2:
+                self.heap = [e for e in self.heap if not e[2].cancelled]
+                heapq.heapify(self.heap)
+        return True
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    if not self.heap:
+                        self.cond.wait()
+                        continue
+
+                    when, _, handle = self.heap[0]
+                    if handle.cancelled:
+                        heapq.heappop(self.heap)
+                        continue
+
+                    delay = when - time.monotonic()
+                    if delay <= 0:
+                        heapq.heappop(self.heap)
+                        handle.done = True
+                        self.pending -= 1
+                        break
+                    self.cond.wait(delay)
+
+                if not self.running:
+                    break
+
+            try:
+                handle.func(*handle.args, **handle.kwargs)
+            except Exception as exc:
+                LOGGER.error(f'Error in scheduled call {handle.func} - {exc}')
+
+        LOGGER.info(f'Exiting {self.thread.name} thread.')
+
+    def stop(self):
+        """Stops the scheduler thread, pending calls are not run"""
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        if threading.current_thread() is not self.thread:
+            self.thread.join()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+def default_scheduler():
+    """Returns the Scheduler shared by all modules of the program"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Scheduler()
+        return _default
@@ -0,0 +1,89 @@
+import sys
+import threading
+from collections import Counter
+from XXXX import dcs_data_pb2
+
+__all__ = ['NO_STAGE', 'TRANSITION', 'CHARGING', 'SWITCHING',
+           'STEAM_TO_FRAC', 'VAPOR_DIVERSION', 'STEAM_TO_BD', 'WATER_QUENCH',
+           'VENTING', 'DRAINING', 'CUTTING', 'O2_FREEING', 'PRESS_TEST',
+           'BACK_WARMING', 'STAGES', 'PB_STAGES', 'stage_code', 'stage_name',
+           'is_stage_code', 'is_drum_stage', 'unknown_stages']
+
+_Stage = dcs_data_pb2.State.Stage
+
+# Integer code of each PI cut cycle stage string, the code is the position.
+# NO_STAGE is the code of a drum whose stage hasn't been read yet.
+# TRANSITION is reported by PI between stages, it doesn't change the display.
+(NO_STAGE, TRANSITION, CHARGING, SWITCHING, STEAM_TO_FRAC, VAPOR_DIVERSION,
+ STEAM_TO_BD, WATER_QUENCH, VENTING, DRAINING, CUTTING, O2_FREEING,
+ PRESS_TEST, BACK_WARMING) = range(14)
+STAGES = [None, 'Transition',
+          'Charging', 'Switching', 'Steam to Frac', 'Vapor Diversion',
+          'Steam to BD', 'Water Quench', 'Venting', 'Draining', 'Cutting',
+          'O2 Freeing', 'Press Test', 'Back Warming']
+
+# dcs_data_pb2.State.Stage of each stage code
+PB_STAGES = [_Stage.UNSET, _Stage.UNSET,
+             _Stage.ONLINE, _Stage.SWITCH, _Stage.STEAM, _Stage.STEAM,
+             _Stage.STEAM, _Stage.QUENCH, _Stage.VENT, _Stage.DRAIN,
+             _Stage.CUT, _Stage.O2FREE, _Stage.PRESTST, _Stage.PREWARM]
+
+# PI string -> code, variants of a stage string (e.g. padded) are added
+# when first seen so each string is only decoded once
+_codes = {sys.intern(stage): code for code, stage in enumerate(STAGES)
+          if stage is not None}
+MAX_UNKNOWN = 100       # distinct unrecognized strings counted separately
+OTHER_UNKNOWN = '<other>'
+_unknown = Counter()    # unrecognized PI string -> times seen
+_lock = threading.Lock()
+
+
+def stage_code(stage, log=None):
+    """Returns code of PI stage string, None if stage is not recognized.
+
+    Unrecognized strings are counted in unknown_stages(), the first
+    MAX_UNKNOWN distinct strings separately and the rest as OTHER_UNKNOWN.
+    The first time a string is seen it is logged to 'log'.
+
+    :param log: queue of log messages, e.g. the handler's self.log
+    """
+    code = _codes.get(stage)
+    if code is not None:
+        return code
+
+    code = _codes.get(str(stage).strip())
+    first = False
+    with _lock:
+        if code is None:
+            key = stage
+            if key not in _unknown and len(_unknown) >= MAX_UNKNOWN:
+                key = OTHER_UNKNOWN
+            first = _unknown[key] == 0
+            _unknown[key] += 1
+        elif isinstance(stage, str):
+            _codes[sys.intern(stage)] = code
+
+    if first and log is not None:
+        log.put(f'Unrecognized drum stage from PI - {stage!r}')
+    return code
+
+
+def stage_name(code):
+    """Returns PI stage string of code, None for NO_STAGE"""
+    return STAGES[code]
+
+
+def is_stage_code(code):
+    """True if code is one of the stage codes, including NO_STAGE"""
+    return isinstance(code, int) and 0 <= code < len(STAGES)
+
+
+def is_drum_stage(code):
+    """True if code is a cut cycle stage the drum display shows"""
+    return code is not None and code > TRANSITION
+
+
+def unknown_stages():
+    """Returns dictionary of unrecognized PI stage strings to times seen"""
+    with _lock:
+        return dict(_unknown)
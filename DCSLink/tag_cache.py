@@ -0,0 +1,131 @@
+import threading
+import time
+from XXXX import PITags
+
+
+class _Fetch:
+    """A PI read in progress, shared by all threads asking for the tag"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.exc = None
+
+
+class CachedPITags(PITags):
+    """
+    PITags with a cache in front of get_tag_value(). The cache is shared by
+    all handlers, so a tag read by several handlers, or by the A and B drums,
+    within TAG_TTL secs is only read from PI once.
+
+    Threads asking for a tag that is already being read wait for that read
+    instead of starting another. Failed reads are not cached, the error is
+    raised in every waiting thread.
+
+    Counters of cache hits, misses, coalesced reads, live reads and PI read
+    latency are returned by cache_stats().
+
+    get_live_tag_value() reads PI directly, for reads that must see the
+    current value, e.g. alarm confirmation samples. Its value replaces the
+    cached one.
+
+    Handlers also read through a per-cycle TagSnapshot (tag_snapshot), the
+    two layers stack as:
+
+        _read_tag()             snapshot value, if the poll loop sets
+                                one, read through get_tag_value() so up to
+                                TAG_TTL old when the snapshot was taken
+        snapshot miss/stale     get_tag_value(), this cache, up to TAG_TTL
+                                old
+        get_live_tag_value()    PI, only for reads that must be live
+    """
+    TAG_TTL = 1.0       # secs a tag value is reused for
+
+    _cache = {}         # tag -> (time.monotonic() read, value)
+    _in_flight = {}     # tag -> _Fetch
+    _lock = threading.Lock()
+    _stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0,
+              'live': 0, 'fetch_secs': 0.0, 'max_fetch_secs': 0.0}
+
+    @classmethod
+    def set_ttl(cls, ttl):
+        """Sets secs tag values are reused for, 0 disables the cache"""
+        with cls._lock:
+            CachedPITags.TAG_TTL = ttl
+            cls._cache.clear()
+
+    @classmethod
+    def cache_stats(cls):
+        """Returns dictionary of cache counters. 'avg_fetch_secs' is the mean
+        latency of PI reads."""
+        with cls._lock:
+            stats = dict(cls._stats)
+        fetches = stats['misses'] + stats['errors'] + stats['live']
+        stats['avg_fetch_secs'] = stats['fetch_secs'] / fetches if fetches else 0
+        return stats
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._lock:
+            cls._cache.clear()
+
+    def get_live_tag_value(self, tag):
+        """Reads tag from PI, bypassing the cache"""
+        start = time.monotonic()
+        try:
+            value = PITags.get_tag_value(self, tag)
+        finally:
+            elapsed = time.monotonic() - start
+            with CachedPITags._lock:
+                stats = CachedPITags._stats
+                stats['live'] += 1
+                stats['fetch_secs'] += elapsed
+                stats['max_fetch_secs'] = max(stats['max_fetch_secs'], elapsed)
+
+        with CachedPITags._lock:
+            CachedPITags._cache[tag] = (start, value)
+        return value
+
+    def get_tag_value(self, tag):
+        now = time.monotonic()
+        with CachedPITags._lock:
+            cached = CachedPITags._cache.get(tag)
+            if cached is not None and now - cached[0] < CachedPITags.TAG_TTL:
+                CachedPITags._stats['hits'] += 1
+                return cached[1]
+
+            fetch = CachedPITags._in_flight.get(tag)
+            if fetch is not None:
+                CachedPITags._stats['coalesced'] += 1
+                owner = False
+            else:
+                fetch = CachedPITags._in_flight[tag] = _Fetch()
+                owner = True
+
+        if not owner:
+            fetch.done.wait()
+            if fetch.exc is not None:
+                raise fetch.exc
+            return fetch.value
+
+        start = time.monotonic()
+        try:
+            fetch.value = PITags.get_tag_value(self, tag)
+        except Exception as exc:
+            fetch.exc = exc
+        elapsed = time.monotonic() - start
+
+        with CachedPITags._lock:
+            del CachedPITags._in_flight[tag]
+            stats = CachedPITags._stats
+            stats['fetch_secs'] += elapsed
+            stats['max_fetch_secs'] = max(stats['max_fetch_secs'], elapsed)
+            if fetch.exc is None:
+                stats['misses'] += 1
+                CachedPITags._cache[tag] = (start, fetch.value)
+            else:
+                stats['errors'] += 1
+        fetch.done.set()
+
+        if fetch.exc is not None:
+            raise fetch.exc
+        return fetch.value
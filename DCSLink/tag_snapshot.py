@@ -0,0 +1,155 @@
+import time
+from types import MappingProxyType
+
+__all__ = ['DIGITAL', 'INT', 'FLOAT', 'ENUM', 'BAD_VALUES', 'is_bad_quality',
+           'decode', 'TagSnapshot', 'SnapshotTags']
+
+# PI tag value types
+DIGITAL = 'digital'     # 0 or 1, e.g. fire alarm
+INT = 'int'             # e.g. drum pressure, stem position
+FLOAT = 'float'         # e.g. gas concentration
+ENUM = 'enum'           # digital state name, e.g. 'Closed', 'MIDPOINT'
+
+# PI system states returned in place of a value when data quality is bad
+BAD_VALUES = frozenset([
+    'Bad Input', 'Bad', 'I/O Timeout', 'Comm Fail', 'No Data', 'Shutdown',
+    'Scan Off', 'Calc Failed', 'Out of Serv', 'Pt Created', 'Configure',
+])
+
+
+def is_bad_quality(raw):
+    """True if raw PI value is a bad quality system state"""
+    return raw is None or str(raw).strip() in BAD_VALUES
+
+
+def decode(raw, tag_type):
+    """Converts a raw PI value to the tag's declared type.
+
+    :param raw: value returned by PITags.get_tag_value()
+    :param tag_type: one of DIGITAL, INT, FLOAT or ENUM
+    :return: decoded value, or None if bad quality or not a valid value of
+        the type
+    """
+    if is_bad_quality(raw):
+        return None
+
+    try:
+        if tag_type == FLOAT:
+            return float(raw)
+        if tag_type == INT:
+            return int(raw) if isinstance(raw, int) else int(float(raw))
+        if tag_type == DIGITAL:
+            val = int(float(raw))
+            return val if val in [0, 1] and val == float(raw) else None
+        return str(raw).strip()     # ENUM
+
+    except (TypeError, ValueError):
+        return None
+
+
+class TagSnapshot:
+    """
+    Values of PI tags read once at the start of a poll cycle. Handlers
+    evaluate against the snapshot instead of reading PI themselves, so each
+    tag is read once per cycle no matter how many handlers or drums use it.
+
+    Values are decoded to their declared type when the snapshot is taken,
+    bad quality or invalid values are None. The raw values are kept for
+    logging. Tags that could not be read are left out and their exception is
+    kept in 'errors'.
+
+    The snapshot is never modified, a new one is taken every cycle.
+    """
+    def __init__(self, raw_values, types, cycle=0, errors=None):
+        """
+        :param raw_values: dictionary of tag to raw PI value
+        :param types: dictionary of tag to tag type
+        :param errors: dictionary of tag to exception of tags not read
+        """
+        self.raw = MappingProxyType(dict(raw_values))
+        self.values = MappingProxyType({
+            tag: decode(raw, types.get(tag, ENUM))
+            for tag, raw in self.raw.items()})
+        self.errors = MappingProxyType(dict(errors or {}))
+        self.cycle = cycle
+        self.taken = time.monotonic()
+
+    def __contains__(self, tag):
+        return tag in self.values
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, tag, default=None):
+        return self.values.get(tag, default)
+
+    @classmethod
+    def read(cls, reader, tags, cycle=0):
+        """Reads each unique tag in 'tags' once with reader.get_tag_value().
+        Tags that could not be read are left out of the snapshot, so handlers
+        read them again themselves, and their exception is kept in 'errors'.
+
+        :param reader: PITags instance
+        :param tags: iterable of (tag, tag type), may contain duplicates
+        :return: TagSnapshot
+        """
+        types = dict(tags)      # unique, keeps order
+
+        values = {}
+        errors = {}
+        for tag in types:
+            try:
+                values[tag] = reader.get_tag_value(tag)
+            except Exception as exc:
+                errors[tag] = exc
+        return cls(values, types, cycle, errors)
+
+
+class SnapshotTags:
+    """
+    Mixin for PITags handlers. The handler lists the tags it reads each cycle
+    and their types in snapshot_tags() and reads them with _read_tag(), which
+    returns the decoded value from the snapshot set with set_snapshot(), or
+    reads the tag with get_tag_value() if it is not in it or no snapshot has
+    been set.
+
+    A snapshot older than SNAPSHOT_MAX_AGE secs is ignored, so handlers read
+    the tag themselves when the poll loop misses a cycle or stops setting
+    snapshots instead of evaluating an old one.
+
+    Handlers should also be CachedPITags so reads outside the snapshot go
+    through the tag cache.
+    """
+    SNAPSHOT_MAX_AGE = 3.0  # secs, one DCSLink poll period
+
+    snapshot = None
+
+    def set_snapshot(self, snapshot):
+        self.snapshot = snapshot
+
+    def _current_snapshot(self):
+        """Returns the snapshot if it is from the current cycle, else None"""
+        snapshot = self.snapshot
+        if (snapshot is not None and
+            time.monotonic() - snapshot.taken <= self.SNAPSHOT_MAX_AGE):
+            return snapshot
+        return None
+
+    def snapshot_tags(self):
+        """Returns list of (PI tag, tag type) read by handler every cycle"""
+        return []
+
+    def _read_tag(self, tag, tag_type=ENUM):
+        """Returns decoded value of tag, None if bad quality or invalid"""
+        snapshot = self._current_snapshot()
+        if snapshot is not None and tag in snapshot:
+            return snapshot.get(tag)
+        return decode(self.get_tag_value(tag), tag_type)
+
+    def _read_raw(self, tag):
+        """Returns raw value of tag, for handlers that log invalid values"""
+        snapshot = self._current_snapshot()
+        if snapshot is not None and tag in snapshot.raw:
+            return snapshot.raw[tag]
+        return self.get_tag_value(tag)
+
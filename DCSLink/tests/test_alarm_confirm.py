@@ -0,0 +1,133 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alarm_confirm import AlarmConfirmer, SUSTAINED
+from scheduler import Scheduler, SchedulerFull
+
+
+class DecideTest(unittest.TestCase):
+    def confirmer(self, window, required=SUSTAINED):
+        return AlarmConfirmer(None, None, window, required,
+                              scheduler=self.scheduler)
+
+    def setUp(self):
+        self.scheduler = Scheduler(name='test-scheduler')
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_sustained_confirms_when_every_sample_is_on(self):
+        confirmer = self.confirmer(3)
+        self.assertIsNone(confirmer._decide([True, True]))
+        self.assertTrue(confirmer._decide([True, True, True]))
+
+    def test_sustained_clears_on_first_off_sample(self):
+        confirmer = self.confirmer(3)
+        self.assertFalse(confirmer._decide([True, False]))
+        self.assertFalse(confirmer._decide([False]))
+
+    def test_n_of_m(self):
+        confirmer = self.confirmer(4, 2)
+        self.assertIsNone(confirmer._decide([False, True]))
+        self.assertTrue(confirmer._decide([True, False, True]))
+        self.assertIsNone(confirmer._decide([False, False]))
+        self.assertFalse(confirmer._decide([False, False, False]))
+
+    def test_invalid_rule(self):
+        with self.assertRaises(ValueError):
+            self.confirmer(3, 4)
+        with self.assertRaises(ValueError):
+            self.confirmer(3, 0)
+
+
+class SamplingTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler(name='test-scheduler')
+        self.decisions = []
+        self.decided = threading.Event()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def decide(self, alarm_id, confirmed, timestamp):
+        self.decisions.append((alarm_id, confirmed,
+                               threading.current_thread().name))
+        self.decided.set()
+
+    def test_confirms_from_samples_taken_off_scheduler_thread(self):
+        threads = []
+
+        def sample(alarm_id):
+            threads.append(threading.current_thread().name)
+            return True
+
+        confirmer = AlarmConfirmer(sample, self.decide, window=3,
+                                   sample_time=0.01, scheduler=self.scheduler)
+        self.assertTrue(confirmer.start(7))
+        self.assertTrue(self.decided.wait(2))
+        confirmer.stop()
+
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn('test-scheduler', threads)
+        self.assertEqual(self.decisions, [(7, True, 'test-scheduler')])
+        self.assertEqual(len(confirmer), 0)
+
+    def test_cancel_while_sampling(self):
+        sampling = threading.Event()
+        release = threading.Event()
+
+        def sample(alarm_id):
+            sampling.set()
+            release.wait(2)
+            return True
+
+        confirmer = AlarmConfirmer(sample, self.decide, window=1,
+                                   sample_time=0.01, scheduler=self.scheduler)
+        confirmer.start(1)
+        self.assertTrue(sampling.wait(2))
+        confirmer.cancel(1)
+        release.set()
+
+        self.assertFalse(self.decided.wait(0.2))
+        self.assertEqual(len(confirmer), 0)
+        self.assertIsNone(confirmer.handle)
+        confirmer.stop()
+
+    def test_start_pending_alarm(self):
+        confirmer = AlarmConfirmer(lambda alarm_id: True, self.decide,
+                                   window=3, sample_time=10,
+                                   scheduler=self.scheduler)
+        self.assertTrue(confirmer.start(1))
+        self.assertFalse(confirmer.start(1))
+        self.assertEqual(len(confirmer), 1)
+        confirmer.stop()
+
+    def test_start_scheduler_full(self):
+        scheduler = Scheduler(max_timers=1, name='full-scheduler')
+        scheduler.call_later(10, lambda: None)
+        confirmer = AlarmConfirmer(lambda alarm_id: True, self.decide,
+                                   window=3, scheduler=scheduler)
+        with self.assertRaises(SchedulerFull):
+            confirmer.start(1)
+        self.assertEqual(len(confirmer), 0)
+        confirmer.stop()
+        scheduler.stop()
+
+    def test_sample_error_counts_as_off(self):
+        def sample(alarm_id):
+            raise IOError('PI down')
+
+        confirmer = AlarmConfirmer(sample, self.decide, window=2,
+                                   sample_time=0.01, scheduler=self.scheduler)
+        confirmer.start(3)
+        self.assertTrue(self.decided.wait(2))
+        confirmer.stop()
+        self.assertEqual(self.decisions[0][:2], (3, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drum_timers import DrumTimers
+
+ISO, STEAM, OTHER = 1, 2, 3
+PRIORITIES = {ISO: 0, STEAM: 1}
+
+
+class DrumTimersTest(unittest.TestCase):
+    def setUp(self):
+        self.timers = DrumTimers(2, PRIORITIES)
+
+    def test_start(self):
+        timer = self.timers.start(0, ISO, 10, 'details')
+        self.assertEqual(self.timers.timers(0), [timer])
+        self.assertEqual(self.timers.timers(1), [])
+        self.assertEqual(self.timers.displayed(0), timer)
+        self.assertIsNone(self.timers.displayed(1))
+        self.assertEqual(timer.priority, 0)
+        self.assertEqual(timer.details, 'details')
+
+    def test_start_same_type_replaces_timer(self):
+        first = self.timers.start(0, ISO, 10)
+        second = self.timers.start(0, ISO, 20)
+        self.assertEqual(self.timers.timers(0), [second])
+        self.assertNotEqual(first.seq, second.seq)
+        self.assertEqual(len(self.timers), 1)
+
+    def test_priority_ordering(self):
+        other = self.timers.start(0, OTHER, 1)
+        steam = self.timers.start(0, STEAM, 5)
+        iso = self.timers.start(0, ISO, 10)
+        self.assertEqual(self.timers.timers(0), [iso, steam, other])
+        self.assertEqual(self.timers.displayed(0), iso)
+
+    def test_same_priority_earliest_deadline_first(self):
+        timers = DrumTimers(1)      # no priorities, every type is equal
+        later = timers.start(0, ISO, 10)
+        sooner = timers.start(0, STEAM, 5)
+        self.assertEqual(timers.timers(0), [sooner, later])
+
+    def test_unlisted_types_displayed_after_listed(self):
+        self.assertEqual(self.timers.priority(OTHER), len(PRIORITIES))
+        self.assertGreater(self.timers.priority(OTHER),
+                           self.timers.priority(STEAM))
+
+    def test_expire(self):
+        iso = self.timers.start(0, ISO, 1)
+        steam = self.timers.start(1, STEAM, 2)
+
+        self.assertEqual(self.timers.expire(iso.deadline - 1), [])
+        self.assertEqual(self.timers.expire(iso.deadline), [0])
+        self.assertEqual(self.timers.timers(0), [])
+        self.assertEqual(self.timers.timers(1), [steam])
+        self.assertEqual(self.timers.expire(steam.deadline + 1), [1])
+        self.assertEqual(len(self.timers), 0)
+        self.assertEqual(self.timers.heap, [])
+
+    def test_expire_skips_replaced_timer(self):
+        first = self.timers.start(0, ISO, 1)
+        second = self.timers.start(0, ISO, 2)
+
+        # heap entry of the replaced timer comes due but doesn't remove
+        # its replacement
+        self.assertEqual(self.timers.expire(first.deadline), [])
+        self.assertEqual(self.timers.timers(0), [second])
+        self.assertEqual(self.timers.expire(second.deadline), [0])
+
+    def test_expire_skips_cancelled_timer(self):
+        timer = self.timers.start(0, ISO, 1)
+        self.assertTrue(self.timers.cancel(0, ISO))
+        self.assertFalse(self.timers.cancel(0, ISO))
+        self.assertEqual(self.timers.expire(timer.deadline), [])
+        self.assertEqual(self.timers.heap, [])
+
+    def test_expire_uses_monotonic_clock(self):
+        self.timers.start(0, ISO, 0)
+        self.timers.start(1, ISO, 10)
+        self.assertLessEqual(self.timers.displayed(0).deadline,
+                             time.monotonic())
+        self.assertEqual(self.timers.expire(), [0])
+        self.assertEqual(len(self.timers), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -25,6 +25,10 @@ namespace webapi.Controllers
         private readonly ILogger<SignController> _logger;    
         private string client_code = "A";
 
+        // panel -> (display version, display) from last current display request
+        private static readonly Dictionary<string, (string, SignDisplay)> 
+            displayCache = new Dictionary<string, (string, SignDisplay)>();
+
         public SignController(ILogger<SignController> logger)
         {
             _logger = logger;
@@ -338,6 +342,9 @@ namespace webapi.Controllers
         }
 
         /*
+         * Sends the display version last received from the panel. The panel 
+         * replies UNCHANGED if it is still current, so the cached display is 
+         * returned, otherwise it replies <version>,<display code>,<content>.
          * 
          * Return displayCode is -1 if exc occured, -2 if ACK not recieved. 
          */
@@ -345,6 +352,8 @@ namespace webapi.Controllers
         {
             string content = "";
             string code = "";
+            string version = "";
+            SignDisplay? cached = null;
             var (ip, port) = panels[panel];
             byte[] sendBytes;
             byte[] buffer = new byte[1_024];
@@ -353,25 +362,40 @@ namespace webapi.Controllers
             IPEndPoint ipEndPoint = new(IPAddress.Parse(ip), port);
             Socket client = new(ipEndPoint.AddressFamily, SocketType.Stream, ProtocolType.Tcp);
 
+            lock (displayCache)
+            {
+                if (displayCache.TryGetValue(panel, out var entry))
+                    (version, cached) = entry;
+            }
+
             try
             {
                 await client.ConnectAsync(ipEndPoint, timeOut);
                 if (client.Connected)
                 {
-                    // Send A3 => webserver requesting current display
-                    sendBytes = Encoding.UTF8.GetBytes(client_code + "3");
+                    // Send A4 => webserver requesting current display if changed
+                    sendBytes = Encoding.UTF8.GetBytes(client_code + "4" +
+                        version.Length.ToString().PadLeft(3, '0') + version);
                     var bytes_sent = await client.SendAsync(sendBytes, SocketFlags.None, timeOut);
                 
-                    try // Receive display code and content
+                    try // Receive until panel closes connection
                     {
-                        //buffer = new byte[1_024];
-                        received = await client.ReceiveAsync(buffer, SocketFlags.None, timeOut);
-                        code = Encoding.UTF8.GetString(buffer, 0, received);
+                        var resp = new StringBuilder();
+                        while ((received = await client.ReceiveAsync(buffer, SocketFlags.None, timeOut)) > 0)
+                        {
+                            resp.Append(Encoding.UTF8.GetString(buffer, 0, received));
+                        }
 
-                        //buffer = new byte[1_024];
-                        received = await client.ReceiveAsync(buffer, SocketFlags.None, timeOut);
-                        content = Encoding.UTF8.GetString(buffer, 0, received);
+                        if (resp.ToString().Equals("UNCHANGED") && cached != null)
+                        {
+                            client.Shutdown(SocketShutdown.Both);
+                            return cached;
+                        }
 
+                        var parts = resp.ToString().Split(',', 3);
+                        version = parts[0];
+                        code = parts[1];
+                        content = parts[2];
                     }
                     catch (Exception e)
                     {
@@ -387,7 +411,15 @@ namespace webapi.Controllers
                 code = "-1";
             }
 
-            return CreateSignDisplay(panel, code, content);
+            var display = CreateSignDisplay(panel, code, content);
+            lock (displayCache)
+            {
+                if (code.Equals("-1"))
+                    displayCache.Remove(panel);
+                else
+                    displayCache[panel] = (version, display);
+            }
+            return display;
         }
 
         /************************************************************************/